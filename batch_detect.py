@@ -0,0 +1,241 @@
+"""Headless batch detection over folders of snapshots.
+
+Uses the same target-class / confidence rule as IntegratedApp, spread across a process pool.
+Per-image results (boxes, target hit, signal decision) go to JSONL or Parquet. Results are
+cached by image content hash + model + threshold + classes, so re-runs only process new or
+changed images.
+
+Usage:
+  python batch_detect.py --dir D:\\snapshots --model best.pt --out results.jsonl
+  python batch_detect.py --splits valid test --model best.pt --out audit.parquet --workers 8
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dataset import DEFAULT_DATA_YAML, list_images, split_dir
+
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "smart_traffic", "batch_detect.sqlite")
+
+# Per-process state for pool workers
+_worker_model = None
+_worker_cfg: Dict = {}
+
+
+def file_digest(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def model_fingerprint(model_path: Optional[str], backend: str, int8: bool) -> str:
+    if model_path and os.path.exists(model_path):
+        st = os.stat(model_path)
+        ident = f"{os.path.abspath(model_path)}:{st.st_size}:{int(st.st_mtime)}"
+    else:
+        ident = model_path or "auto"
+    return f"{ident}:{backend}:{'int8' if int8 else 'fp'}"
+
+
+class ResultCache:
+    """sqlite-backed map from cache key to the JSON result of one image."""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, record TEXT NOT NULL)")
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict]:
+        out: Dict[str, Dict] = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            for key, record in self.conn.execute(f"SELECT key, record FROM results WHERE key IN ({marks})", chunk):
+                out[key] = json.loads(record)
+        return out
+
+    def put_many(self, items: Iterable[Tuple[str, Dict]]) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO results (key, record) VALUES (?, ?)",
+            ((k, json.dumps(v)) for k, v in items),
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _init_worker(model_path: Optional[str], backend: str, int8: bool, target_classes: List[str], conf: float) -> None:
+    global _worker_model, _worker_cfg
+    from inference_backends import with_backend
+    from model_registry import MODEL_CANDIDATES, load_model
+
+    _worker_model = with_backend(load_model(MODEL_CANDIDATES, model_path), backend, int8)
+    _worker_cfg = {"classes": target_classes, "conf": conf}
+
+
+def _detect_file(path: str) -> Dict:
+    import cv2
+
+    from detections import extract_detections, target_mask
+
+    if _worker_model is None:
+        return {"error": "model unavailable"}
+    img = cv2.imread(path)
+    if img is None:
+        return {"error": "unreadable image"}
+    try:
+        results = _worker_model(img, verbose=False)[0]  # type: ignore[operator]
+    except Exception as e:
+        return {"error": str(e)}
+    dets = extract_detections(results, getattr(_worker_model, "names", None))
+    hits = target_mask(dets, _worker_cfg["classes"], _worker_cfg["conf"])
+    return {
+        "width": int(img.shape[1]),
+        "height": int(img.shape[0]),
+        "boxes": [
+            {"xyxy": [round(v, 1) for v in box], "label": label, "conf": round(conf, 4), "target": hit}
+            for box, label, conf, hit in zip(dets.xyxy.tolist(), dets.labels.tolist(), dets.conf.tolist(), hits.tolist())
+        ],
+        "target_hit": bool(hits.any()),
+        "signal": "GREEN" if hits.any() else "RED",
+    }
+
+
+def collect_images(dirs: List[str], splits: List[str], data_yaml: str) -> List[str]:
+    paths: List[str] = []
+    for d in dirs:
+        paths.extend(list_images(d))
+    for split in splits:
+        d = split_dir(data_yaml, split)
+        if d is None:
+            print(f"Split {split!r} not found via {data_yaml}; skipping.", file=sys.stderr)
+            continue
+        paths.extend(list_images(d))
+    # de-duplicate while keeping order
+    return list(dict.fromkeys(os.path.abspath(p) for p in paths))
+
+
+class ResultWriter:
+    """Stream records to JSONL, or buffer them for a single Parquet write on close."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.parquet = path.lower().endswith(".parquet")
+        self.rows: List[Dict] = []
+        self.fh = None if self.parquet else open(path, "w", encoding="utf-8")
+
+    def write(self, record: Dict) -> None:
+        if self.parquet:
+            self.rows.append(record)
+        else:
+            self.fh.write(json.dumps(record) + "\n")
+
+    def close(self) -> None:
+        if self.fh is not None:
+            self.fh.close()
+            return
+        try:
+            import pandas as pd  # type: ignore
+        except ImportError:
+            raise SystemExit("Parquet output needs pandas and pyarrow (pip install pandas pyarrow)")
+        rows = [dict(r, boxes=json.dumps(r.get("boxes", []))) for r in self.rows]
+        pd.DataFrame(rows).to_parquet(self.path, index=False)
+
+
+def run_batch(paths: List[str], out_path: str, model_path: Optional[str], target_classes: List[str], conf: float,
+              backend: str = "torch", int8: bool = False, workers: int = 0, cache_path: Optional[str] = DEFAULT_CACHE) -> Dict:
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    settings = f"{model_fingerprint(model_path, backend, int8)}|conf={conf}|classes={','.join(sorted(c.lower() for c in target_classes))}"
+    settings_hash = hashlib.sha256(settings.encode("utf-8")).hexdigest()[:16]
+
+    t0 = time.perf_counter()
+    # Hashing is I/O bound and hashlib releases the GIL, so threads are enough here
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(32, workers * 4)) as pool:
+        digests = list(pool.map(file_digest, paths))
+    keys = [f"{d}:{settings_hash}" for d in digests]
+
+    cache = ResultCache(cache_path) if cache_path else None
+    cached = cache.get_many(keys) if cache else {}
+    todo = [(p, k) for p, k in zip(paths, keys) if k not in cached]
+
+    writer = ResultWriter(out_path)
+    stats = {"images": len(paths), "cached": len(paths) - len(todo), "processed": 0, "errors": 0, "green": 0}
+
+    def emit(path: str, digest_key: str, record: Dict) -> None:
+        row = {"path": path, "sha256": digest_key.split(":", 1)[0], **record}
+        writer.write(row)
+        stats["green"] += record.get("signal") == "GREEN"
+        stats["errors"] += "error" in record
+
+    for path, key in zip(paths, keys):
+        if key in cached:
+            emit(path, key, cached[key])
+
+    if todo:
+        ctx = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=ctx, initializer=_init_worker,
+            initargs=(model_path, backend, int8, target_classes, conf),
+        ) as pool:
+            fresh: List[Tuple[str, Dict]] = []
+            chunksize = max(1, min(64, len(todo) // (workers * 4) or 1))
+            for (path, key), record in zip(todo, pool.map(_detect_file, [p for p, _ in todo], chunksize=chunksize)):
+                emit(path, key, record)
+                stats["processed"] += 1
+                if "error" not in record:
+                    fresh.append((key, record))
+                if cache and len(fresh) >= 256:
+                    cache.put_many(fresh)
+                    fresh = []
+            if cache and fresh:
+                cache.put_many(fresh)
+
+    writer.close()
+    if cache:
+        cache.close()
+    stats["seconds"] = round(time.perf_counter() - t0, 2)
+    return stats
+
+
+def parse_args():
+    from inference_backends import BACKENDS
+
+    p = argparse.ArgumentParser(description="Batch YOLO detection + signal decision over image folders")
+    p.add_argument("--dir", action="append", default=[], help="Image directory to scan recursively (repeatable)")
+    p.add_argument("--splits", nargs="*", default=[], help="Dataset splits from data.yaml to include (train/valid/test)")
+    p.add_argument("--data", type=str, default=DEFAULT_DATA_YAML, help="Dataset yaml for --splits")
+    p.add_argument("--model", type=str, default=None, help="Path to YOLO model .pt")
+    p.add_argument("--backend", choices=BACKENDS, default="torch")
+    p.add_argument("--int8", action="store_true")
+    p.add_argument("--classes", type=str, default="emergency", help="Comma-separated target class names (default: 'emergency')")
+    p.add_argument("--conf", type=float, default=0.75, help="Confidence threshold for a target hit (default: 0.75)")
+    p.add_argument("--workers", type=int, default=0, help="Worker processes (default: CPU count - 1)")
+    p.add_argument("--out", type=str, default="detections.jsonl", help="Output file (.jsonl or .parquet)")
+    p.add_argument("--cache", type=str, default=DEFAULT_CACHE, help="Result cache database")
+    p.add_argument("--no-cache", action="store_true", help="Ignore and don't update the result cache")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    classes = [c.strip() for c in args.classes.split(",") if c.strip()]
+    paths = collect_images(args.dir, args.splits, args.data)
+    if not paths:
+        raise SystemExit("No images found; pass --dir and/or --splits.")
+    stats = run_batch(paths, args.out, args.model, classes, args.conf, backend=args.backend, int8=args.int8,
+                      workers=args.workers, cache_path=None if args.no_cache else args.cache)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
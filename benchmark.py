@@ -0,0 +1,251 @@
+"""Headless throughput benchmark for the detection paths.
+
+Runs the detect_demo and IntegratedApp detection paths without any window, on a synthetic
+or recorded clip, and reports FPS, p50/p95/p99 per-stage latency (decode, inference,
+post-process, draw) and peak RSS for every model checkpoint / input size / batch size
+combination. Each combination runs in a fresh process so peak RSS is not inherited from
+earlier runs.
+
+Usage:
+  python benchmark.py                                   # default checkpoints, synthetic clip
+  python benchmark.py --models yolov8n.pt best.pt --imgsz 320 640 --batch 1 4
+  python benchmark.py --clip path\\to\\video.mp4 --frames 300 --json bench.json
+"""
+import argparse
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+STAGES = ["decode", "inference", "postprocess", "draw"]
+PATHS = ["detect_demo", "integrated"]
+
+
+@dataclass
+class BenchConfig:
+    model: str
+    imgsz: int
+    batch: int
+    path: str
+    clip: Optional[str] = None  # None -> synthetic
+    frames: int = 200
+    warmup: int = 10
+    width: int = 1280
+    height: int = 720
+    classes: List[str] = field(default_factory=lambda: ["emergency"])
+    conf: float = 0.75
+
+
+@dataclass
+class BenchResult:
+    config: BenchConfig
+    frames: int = 0
+    fps: float = 0.0
+    # stage -> {"p50": ms, "p95": ms, "p99": ms}, measured per batch
+    latency_ms: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    peak_rss_mb: Optional[float] = None
+    error: Optional[str] = None
+
+
+class SyntheticClip:
+    """Deterministic moving-box clip so runs are comparable without a video file."""
+
+    def __init__(self, width: int, height: int, seed: int = 0) -> None:
+        rng = np.random.default_rng(seed)
+        self.background = rng.integers(40, 90, size=(height, width, 3), dtype=np.uint8)
+        self.width, self.height = width, height
+        self.t = 0
+
+    def read(self):
+        frame = self.background.copy()
+        x = (self.t * 7) % max(1, self.width - 200)
+        y = self.height // 2
+        cv2.rectangle(frame, (x, y), (x + 200, y + 110), (255, 255, 255), -1)
+        cv2.rectangle(frame, (x + 10, y + 10), (x + 60, y + 40), (0, 0, 255), -1)
+        self.t += 1
+        return True, frame
+
+    def release(self) -> None:
+        pass
+
+
+def open_clip(cfg: BenchConfig):
+    if cfg.clip is None:
+        return SyntheticClip(cfg.width, cfg.height)
+    cap = cv2.VideoCapture(cfg.clip)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open clip: {cfg.clip}")
+    return cap
+
+
+def read_frame(cap):
+    ok, frame = cap.read()
+    if not ok and isinstance(cap, cv2.VideoCapture):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        ok, frame = cap.read()
+    if not ok:
+        raise RuntimeError("Clip produced no frames")
+    return frame
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+    except ImportError:
+        pass
+    try:
+        import psutil  # type: ignore
+
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024.0 * 1024.0)
+    except Exception:
+        return None
+
+
+def run_config(cfg: BenchConfig) -> BenchResult:
+    """Benchmark one configuration in the current process."""
+    from detections import extract_detections, target_mask
+
+    result = BenchResult(config=cfg)
+    try:
+        from ultralytics import YOLO  # type: ignore
+
+        model = YOLO(cfg.model)
+    except Exception as e:
+        result.error = f"model load failed: {e}"
+        return result
+    names = getattr(model, "names", None)
+
+    if cfg.path == "detect_demo":
+        from detect_demo import draw_banner, draw_detection_boxes
+
+        def draw(frame, dets) -> None:
+            draw_detection_boxes(frame, dets)
+            draw_banner(frame, "EMERGENCY VEHICLE DETECTED", color=(0, 0, 255))
+            cv2.putText(frame, "Keys: [E]=Toggle Emergency Banner  [Q]=Quit", (12, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    else:
+        from integrated_demo import draw_boxes as draw  # type: ignore[assignment]
+
+    cap = open_clip(cfg)
+    timings: Dict[str, List[float]] = {s: [] for s in STAGES}
+    total_batches = cfg.warmup + int(np.ceil(cfg.frames / cfg.batch))
+    measured_frames = 0
+    start = 0.0
+    try:
+        for i in range(total_batches):
+            if i == cfg.warmup:
+                start = time.perf_counter()
+            t0 = time.perf_counter()
+            batch = [read_frame(cap) for _ in range(cfg.batch)]
+            t1 = time.perf_counter()
+            results = model(batch, imgsz=cfg.imgsz, verbose=False)
+            t2 = time.perf_counter()
+            dets = [extract_detections(r, names) for r in results]
+            if cfg.path == "integrated":
+                for d in dets:
+                    target_mask(d, cfg.classes, cfg.conf).any()
+            t3 = time.perf_counter()
+            for frame, d in zip(batch, dets):
+                draw(frame, d)
+            t4 = time.perf_counter()
+            if i >= cfg.warmup:
+                for stage, dt in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+                    timings[stage].append(dt * 1000.0)
+                measured_frames += len(batch)
+        elapsed = time.perf_counter() - start
+    except Exception as e:
+        result.error = str(e)
+        return result
+    finally:
+        cap.release()
+
+    result.frames = measured_frames
+    result.fps = measured_frames / elapsed if elapsed > 0 else 0.0
+    for stage, values in timings.items():
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]) if values else (0.0, 0.0, 0.0)
+        result.latency_ms[stage] = {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+    result.peak_rss_mb = peak_rss_mb()
+    return result
+
+
+def run_isolated(cfg: BenchConfig) -> BenchResult:
+    ctx = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(run_config, cfg).result()
+
+
+def format_table(results: List[BenchResult]) -> str:
+    header = f"{'path':<12}{'model':<16}{'imgsz':>6}{'batch':>6}{'fps':>8}"
+    for stage in STAGES:
+        header += f"{stage + ' p50/p95/p99 ms':>30}"
+    header += f"{'peak RSS MB':>13}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        c = r.config
+        row = f"{c.path:<12}{c.model:<16}{c.imgsz:>6}{c.batch:>6}"
+        if r.error:
+            lines.append(row + f"  ERROR: {r.error}")
+            continue
+        row += f"{r.fps:>8.1f}"
+        for stage in STAGES:
+            q = r.latency_ms[stage]
+            row += f"{q['p50']:.1f}/{q['p95']:.1f}/{q['p99']:.1f}".rjust(30)
+        row += f"{r.peak_rss_mb:>13.0f}" if r.peak_rss_mb is not None else f"{'n/a':>13}"
+        lines.append(row)
+    return "\n".join(lines)
+
+
+def parse_args():
+    from detect_demo import MODEL_CANDIDATES
+
+    p = argparse.ArgumentParser(description="Headless benchmark for the detection and signal pipeline")
+    p.add_argument("--models", nargs="+", default=list(MODEL_CANDIDATES), help="Model checkpoints to compare (default: detect_demo's candidate list)")
+    p.add_argument("--imgsz", nargs="+", type=int, default=[640], help="Inference input sizes")
+    p.add_argument("--batch", nargs="+", type=int, default=[1], help="Batch sizes")
+    p.add_argument("--paths", nargs="+", choices=PATHS, default=PATHS, help="Detection paths to exercise")
+    p.add_argument("--clip", type=str, default=None, help="Recorded clip to decode (default: synthetic frames)")
+    p.add_argument("--frames", type=int, default=200, help="Measured frames per configuration")
+    p.add_argument("--warmup", type=int, default=10, help="Untimed warm-up batches per configuration")
+    p.add_argument("--size", type=str, default="1280x720", help="Synthetic frame size WxH")
+    p.add_argument("--classes", type=str, default="emergency", help="Comma-separated target classes for the integrated path")
+    p.add_argument("--conf", type=float, default=0.75, help="Confidence threshold for the integrated path")
+    p.add_argument("--in-process", action="store_true", help="Run all configurations in this process (peak RSS becomes cumulative)")
+    p.add_argument("--json", type=str, default=None, help="Also write results to this JSON file")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    classes = [c.strip() for c in args.classes.split(",") if c.strip()]
+    configs = [
+        BenchConfig(model=m, imgsz=sz, batch=b, path=path, clip=args.clip, frames=args.frames,
+                    warmup=args.warmup, width=width, height=height, classes=classes, conf=args.conf)
+        for path, m, sz, b in itertools.product(args.paths, args.models, args.imgsz, args.batch)
+    ]
+
+    results: List[BenchResult] = []
+    for cfg in configs:
+        print(f"Running {cfg.path} model={cfg.model} imgsz={cfg.imgsz} batch={cfg.batch} ...", flush=True)
+        results.append(run_config(cfg) if args.in_process else run_isolated(cfg))
+
+    print()
+    print(format_table(results))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
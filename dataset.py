@@ -0,0 +1,90 @@
+"""Helpers for the Roboflow dataset described by data.yaml."""
+import os
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+DEFAULT_DATA_YAML = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data.yaml")
+
+
+def load_data_yaml(path: str = DEFAULT_DATA_YAML) -> Dict:
+    try:
+        import yaml  # type: ignore
+    except ImportError:
+        yaml = None
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if yaml is not None:
+        return yaml.safe_load(text) or {}
+
+    # Minimal fallback for the flat keys Roboflow writes (train/val/test/nc/names)
+    data: Dict = {}
+    for line in text.splitlines():
+        if not line or line.startswith((" ", "\t", "#")) or ":" not in line:
+            continue
+        key, value = (part.strip() for part in line.split(":", 1))
+        if value.startswith("[") and value.endswith("]"):
+            data[key] = [v.strip().strip("'\"") for v in value[1:-1].split(",") if v.strip()]
+        elif value.isdigit():
+            data[key] = int(value)
+        elif value:
+            data[key] = value
+    return data
+
+
+def split_dir(data_yaml: str, split: str) -> Optional[str]:
+    """Resolve the image directory of a split ('train', 'val'/'valid', 'test').
+
+    Roboflow exports write ``../valid/images`` although the folders sit next to data.yaml,
+    so the path is tried as written and then with the leading ``../`` dropped.
+    """
+    data = load_data_yaml(data_yaml)
+    key = "val" if split in ("val", "valid") else split
+    rel = data.get(key)
+    if not rel:
+        return None
+    root = os.path.dirname(os.path.abspath(data_yaml))
+    if data.get("path"):
+        root = os.path.join(root, str(data["path"]))
+    candidates = [os.path.join(root, rel)]
+    if rel.startswith("../"):
+        candidates.append(os.path.join(root, rel[3:]))
+    for c in candidates:
+        if os.path.isdir(c):
+            return os.path.normpath(c)
+    return None
+
+
+def list_images(directory: str) -> List[str]:
+    out: List[str] = []
+    for dirpath, _, files in os.walk(directory):
+        out.extend(os.path.join(dirpath, f) for f in files if f.lower().endswith(IMAGE_EXTS))
+    return sorted(out)
+
+
+def split_images(data_yaml: str, split: str) -> List[str]:
+    d = split_dir(data_yaml, split)
+    return list_images(d) if d else []
+
+
+def label_path(image_path: str) -> str:
+    """YOLO label file for an image: .../images/x.jpg -> .../labels/x.txt"""
+    head, fname = os.path.split(image_path)
+    parent, leaf = os.path.split(head)
+    labels_dir = os.path.join(parent, "labels") if leaf == "images" else head
+    return os.path.join(labels_dir, os.path.splitext(fname)[0] + ".txt")
+
+
+def letterbox(img, size: int = 640, color=(114, 114, 114)):
+    """Resize keeping aspect ratio and pad to size x size. Returns (image, scale, (pad_x, pad_y))."""
+    h, w = img.shape[:2]
+    scale = min(size / float(h), size / float(w))
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    if (new_w, new_h) != (w, h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    out = np.full((size, size, 3), color, dtype=np.uint8)
+    out[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = img
+    return out, scale, (pad_x, pad_y)
@@ -1,31 +1,58 @@
+import argparse
+import asyncio
+import math
 import threading
 import time
 import tkinter as tk
-from dataclasses import dataclass
-from typing import List
+from typing import Dict, List, Optional, Set, Tuple
 
+from fleet_state import FleetState
+from traffic_model import IntersectionState
+from event_bus import EmergencyEvent, EventBus, LatencyTracker, add_bus_key_arg, format_latency, serve_bus
+from event_store import SIGNAL_GREEN, SIGNAL_RED, EventWriter, add_store_args
+from telemetry import TelemetryService
+from traffic_sim import Simulation, linear_simulation, random_grid_routes
 
-@dataclass
-class IntersectionState:
-    name: str
-    distance_cm: float
-    green_on: bool
-    # Once vehicle has passed (<10cm), mark cleared to prevent re-green flicker
-    cleared: bool = False
+FRAME_MS = 33  # repaint at most once per display frame (~30 FPS)
+GRID_THRESHOLD = 100  # above this many nodes, draw one canvas grid instead of cards
+GRID_CELL = 16
+SEQUENCE_TICK_S = 0.12
+SEQUENCE_HOLD_TICKS = 4  # GREEN held ~0.6 s at the stop line before the vehicle counts as passed
 
 
 class TrafficDemoApp:
-    def __init__(self, root: tk.Tk) -> None:
+    def __init__(self, root: tk.Tk, use_engine: bool = False, speed: float = 1.0, nodes: int = 3,
+                 vehicles: int = 0, store: Optional[EventWriter] = None) -> None:
         self.root = root
         self.root.title("Smart Traffic Management - Emergency Vehicle Demo")
         self.is_running = False
         self.reset_requested = False
+        # Optionally drive the cards from the discrete-event engine instead of the sleep loop
+        self.use_engine = use_engine
+        self.speed = speed
+        self._sim: Optional[Simulation] = None
+        self._sim_t0 = 0.0
+        self.vehicles = vehicles
 
         self.intersections: List[IntersectionState] = [
-            IntersectionState(name="Node 1", distance_cm=120.0, green_on=False),
-            IntersectionState(name="Node 2", distance_cm=220.0, green_on=False),
-            IntersectionState(name="Node 3", distance_cm=320.0, green_on=False),
+            IntersectionState(name=f"Node {idx + 1}", distance_cm=100.0 * (idx + 1) + 20.0, green_on=False)
+            for idx in range(nodes)
         ]
+        self.use_grid = nodes > GRID_THRESHOLD
+        self.grid_cols = max(1, math.ceil(math.sqrt(nodes * 16 / 9)))
+
+        # Dirty tracking: any thread marks nodes, the Tk thread repaints them once per frame
+        self._rendered: List[Optional[Tuple]] = [None] * nodes
+        self._dirty: Set[int] = set()
+        self._dirty_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._active: Set[int] = set()  # engine nodes with a vehicle approaching
+        self.bus: Optional[EventBus] = None
+        self._awaiting_paint: Dict[int, EmergencyEvent] = {}  # bus events not yet on screen
+        self.latency = LatencyTracker()
+        self.last_repaint_ms = 0.0
+        # Signal state and distance of every update are appended here for later queries
+        self.store = store
 
         self._build_ui()
         self._render_all()
@@ -46,6 +73,28 @@ class TrafficDemoApp:
         self.cards_frame = tk.Frame(self.root)
         self.cards_frame.pack(padx=12, pady=12, fill=tk.X)
 
+        if self.use_grid:
+            self._build_grid()
+        else:
+            self._build_cards()
+
+        controls = tk.Frame(self.root)
+        controls.pack(padx=12, pady=(0, 12), fill=tk.X)
+
+        self.start_btn = tk.Button(controls, text="Start Ambulance", command=self.start_demo)
+        self.start_btn.pack(side=tk.LEFT)
+
+        self.reset_btn = tk.Button(controls, text="Reset", command=self.reset_demo)
+        self.reset_btn.pack(side=tk.LEFT, padx=(8, 0))
+
+        note = tk.Label(
+            self.root,
+            text="Tip: Start screen recording, click 'Start Ambulance', and narrate the behavior.",
+            font=("Segoe UI", 9, "italic"),
+        )
+        note.pack(padx=12, pady=(0, 12), anchor="w")
+
+    def _build_cards(self) -> None:
         self.cards: List[tk.Frame] = []
         self.state_labels: List[tk.Label] = []
         self.distance_labels: List[tk.Label] = []
@@ -81,34 +130,130 @@ class TrafficDemoApp:
             green.create_oval(4, 4, 26, 26, fill="#070", outline="")
             self.green_lights.append(green)
 
-        controls = tk.Frame(self.root)
-        controls.pack(padx=12, pady=(0, 12), fill=tk.X)
-
-        self.start_btn = tk.Button(controls, text="Start Ambulance", command=self.start_demo)
-        self.start_btn.pack(side=tk.LEFT)
-
-        self.reset_btn = tk.Button(controls, text="Reset", command=self.reset_demo)
-        self.reset_btn.pack(side=tk.LEFT, padx=(8, 0))
-
-        note = tk.Label(
-            self.root,
-            text="Tip: Start screen recording, click 'Start Ambulance', and narrate the behavior.",
-            font=("Segoe UI", 9, "italic"),
+    def _build_grid(self) -> None:
+        # One canvas with a rectangle per node; hundreds of card widgets make every
+        # repaint (and even moving the window) sluggish, canvas items stay cheap
+        rows = math.ceil(len(self.intersections) / self.grid_cols)
+        self.grid_canvas = tk.Canvas(
+            self.cards_frame, width=self.grid_cols * GRID_CELL, height=rows * GRID_CELL,
+            bg="#111", highlightthickness=0,
         )
-        note.pack(padx=12, pady=(0, 12), anchor="w")
+        self.grid_canvas.pack(anchor="w")
+        self.grid_items: List[int] = []
+        for idx in range(len(self.intersections)):
+            r, c = divmod(idx, self.grid_cols)
+            x, y = c * GRID_CELL, r * GRID_CELL
+            self.grid_items.append(self.grid_canvas.create_rectangle(
+                x + 1, y + 1, x + GRID_CELL - 1, y + GRID_CELL - 1, fill="#700", outline=""))
+        self.grid_status = tk.Label(self.cards_frame, text="", font=("Segoe UI", 9), anchor="w")
+        self.grid_status.pack(fill=tk.X, pady=(6, 0))
+        self._green_count = 0
+        self._hover: Optional[int] = None
+        self.grid_canvas.bind("<Motion>", self._on_grid_hover)
+
+    def _on_grid_hover(self, event) -> None:
+        col, row = event.x // GRID_CELL, event.y // GRID_CELL
+        idx = row * self.grid_cols + col
+        self._hover = idx if 0 <= col < self.grid_cols and 0 <= idx < len(self.intersections) else None
+        self._update_grid_status()
+
+    def _update_grid_status(self) -> None:
+        text = f"GREEN {self._green_count}/{len(self.intersections)}   repaint {self.last_repaint_ms:.1f} ms"
+        if self._hover is not None:
+            st = self.intersections[self._hover]
+            text += f"   {st.name}: {st.distance_cm:.0f} cm, {'GREEN' if st.green_on else 'RED'}"
+        self.grid_status.config(text=text)
+
+    def _render_key(self, st: IntersectionState) -> Tuple:
+        # What is actually on screen for a node; the grid only shows the signal
+        if self.use_grid:
+            return (st.green_on,)
+        return (st.green_on, round(st.distance_cm))
+
+    def _paint(self, idx: int, st: IntersectionState) -> None:
+        if self.use_grid:
+            self.grid_canvas.itemconfig(self.grid_items[idx], fill="#0f0" if st.green_on else "#700")
+            return
+        self.distance_labels[idx].config(text=f"Distance: {st.distance_cm:.0f} cm")
+        self.state_labels[idx].config(text=f"State: {'GREEN' if st.green_on else 'RED'}")
+
+        # Update light visuals
+        if st.green_on:
+            self.green_lights[idx].itemconfig(1, fill="#0f0")
+            self.red_lights[idx].itemconfig(1, fill="#700")
+        else:
+            self.green_lights[idx].itemconfig(1, fill="#070")
+            self.red_lights[idx].itemconfig(1, fill="#f00")
+
+    def _render(self, indices) -> None:
+        """Repaint the given nodes, skipping any whose on-screen values did not change."""
+        t0 = time.perf_counter()
+        for idx in indices:
+            st = self.intersections[idx]
+            key = self._render_key(st)
+            prev = self._rendered[idx]
+            if key == prev:
+                continue
+            self._rendered[idx] = key
+            self._paint(idx, st)
+            if self.use_grid:
+                self._green_count += st.green_on - bool(prev and prev[0])
+        self.last_repaint_ms = (time.perf_counter() - t0) * 1000.0
+        if self.use_grid:
+            self._update_grid_status()
 
     def _render_all(self) -> None:
-        for idx, st in enumerate(self.intersections):
-            self.distance_labels[idx].config(text=f"Distance: {st.distance_cm:.0f} cm")
-            self.state_labels[idx].config(text=f"State: {'GREEN' if st.green_on else 'RED'}")
-
-            # Update light visuals
-            if st.green_on:
-                self.green_lights[idx].itemconfig(1, fill="#0f0")
-                self.red_lights[idx].itemconfig(1, fill="#700")
-            else:
-                self.green_lights[idx].itemconfig(1, fill="#070")
-                self.red_lights[idx].itemconfig(1, fill="#f00")
+        self._render(range(len(self.intersections)))
+
+    def _mark_dirty(self, idx: int) -> None:
+        """Queue node idx for the next repaint; safe to call from any thread."""
+        with self._dirty_lock:
+            self._dirty.add(idx)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        # Bursts of updates between frames collapse into a single after() callback
+        self.root.after(FRAME_MS, self._flush)
+
+    def _flush(self) -> None:
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+            awaiting, self._awaiting_paint = self._awaiting_paint, {}
+            self._flush_scheduled = False
+        self._render(sorted(dirty))
+        if awaiting:
+            # The signal counts as actuated once it is drawn
+            self.root.update_idletasks()
+            for event in awaiting.values():
+                self._report_actuation(event.actuated())
+
+    def follow_bus(self, bus: EventBus) -> None:
+        """Switch intersections from emergency events on the bus (node N drives card N)."""
+        self.bus = bus
+        bus.subscribe(self._on_bus_event)
+
+    def _on_bus_event(self, event: EmergencyEvent) -> None:
+        idx = event.node - 1
+        if not 0 <= idx < len(self.intersections):
+            return
+        self.intersections[idx].green_on = event.active
+        self._record(idx)
+        with self._dirty_lock:
+            self._awaiting_paint[idx] = event
+            self._dirty.add(idx)
+        # Signal changes are rare and latency-critical: paint now rather than at the next frame
+        self.root.after(0, self._flush)
+
+    def _record(self, idx: int) -> None:
+        if self.store is not None:
+            st = self.intersections[idx]
+            self.store.append_state(idx + 1, SIGNAL_GREEN if st.green_on else SIGNAL_RED, st.distance_cm)
+
+    def _report_actuation(self, event: EmergencyEvent) -> None:
+        lat = self.latency.record(event)
+        print(f"Node {event.node} {'GREEN' if event.active else 'RED'} ({event.source or 'bus'}): {format_latency(lat)}", flush=True)
+        if self.bus is not None:
+            self.bus.publish(event)
 
     def start_demo(self) -> None:
         if self.is_running:
@@ -116,8 +261,75 @@ class TrafficDemoApp:
         self.is_running = True
         self.reset_requested = False
         self.start_btn.config(state=tk.DISABLED)
+        if self.use_engine:
+            self._sim = self._build_simulation()
+            self._sim.listeners.append(self._on_sim_change)
+            self._active.clear()
+            self._sim_t0 = time.monotonic()
+            self.root.after(0, self._engine_tick, self._sim)
+            return
         threading.Thread(target=self._run_sequence, daemon=True).start()
 
+    def _build_simulation(self) -> Simulation:
+        if not self.use_grid:
+            return linear_simulation(self.intersections)
+        # Large networks: random emergency trips over the grid shown on the canvas
+        n = len(self.intersections)
+        rows = math.ceil(n / self.grid_cols)
+        sim = Simulation(self.intersections, leg_length=lambda a, b: 100.0)
+        random_grid_routes(sim, rows, self.grid_cols, self.vehicles or max(1, n // 4), 120.0, n_nodes=n)
+        return sim
+
+    def _on_sim_change(self, idx: int) -> None:
+        self._active.add(idx)
+        with self._dirty_lock:
+            self._dirty.add(idx)
+
+    def _engine_tick(self, sim: Simulation) -> None:
+        if sim is not self._sim or self.reset_requested:
+            return  # reset, or superseded by a newer run
+        sim.run_until((time.monotonic() - self._sim_t0) * self.speed)
+        # Only nodes with a vehicle on approach move between events; listeners cover the rest
+        moved = []
+        for idx in list(self._active):
+            d = sim.node_distance(idx)
+            if d is None:
+                self._active.discard(idx)
+                continue
+            self.intersections[idx].distance_cm = d
+            moved.append(idx)
+        with self._dirty_lock:
+            self._dirty.update(moved)
+        self._flush()
+        if sim.pending:
+            self.root.after(FRAME_MS, self._engine_tick, sim)
+        else:
+            self._sim = None
+            self.is_running = False
+            self.start_btn.config(state=tk.NORMAL)
+
+    def start_telemetry(self, sources: List[str], listen: Optional[str] = None, binary: bool = False) -> None:
+        """Drive the cards from live sensor readings (telemetry.py) instead of the demo loop.
+        Node ids in the telemetry map to cards in order, starting at 1."""
+        states = {idx + 1: st for idx, st in enumerate(self.intersections)}
+        self.telemetry = TelemetryService(states, on_batch=self._on_telemetry)
+        self.start_btn.config(state=tk.DISABLED)
+
+        async def ingest() -> None:
+            if listen:
+                host, port = listen.rsplit(":", 1)
+                await self.telemetry.listen(host, int(port), binary=binary)
+            for spec in sources:
+                await self.telemetry.add_source(spec, binary=binary)
+            await self.telemetry.run()
+
+        threading.Thread(target=asyncio.run, args=(ingest(),), daemon=True).start()
+
+    def _on_telemetry(self, nodes: List[int]) -> None:
+        for node in nodes:
+            if 1 <= node <= len(self.intersections):
+                self._mark_dirty(node - 1)
+
     def reset_demo(self) -> None:
         self.reset_requested = True
         self.is_running = False
@@ -129,52 +341,64 @@ class TrafficDemoApp:
         self.start_btn.config(state=tk.NORMAL)
 
     def _run_sequence(self) -> None:
+        # The approach / GREEN / clear rule runs as FleetState's array step; only the node the
+        # ambulance is approaching moves (speed 1), and its values are copied onto the card's state
+        fleet = FleetState.from_states(self.intersections, hold_ticks=SEQUENCE_HOLD_TICKS)
+        fleet.speed[:] = 0.0
         try:
             # Simulate ambulance approaching each node in order
-            for idx, st in enumerate(self.intersections):
-                # Approach phase: from current distance down to 5 cm
-                while st.distance_cm > 5.0 and not self.reset_requested:
-                    # Move faster when far, slower when near for dramatic effect
-                    step = 8.0 if st.distance_cm > 80 else 4.0 if st.distance_cm > 40 else 2.0
-                    st.distance_cm = max(5.0, st.distance_cm - step)
-
-                    # Control rule: if distance < 20 and not yet cleared, go green
-                    if st.distance_cm < 20.0 and not st.green_on and not st.cleared:
-                        st.green_on = True
-                    # If at/past the stop line, briefly show green then return to red and mark cleared
-                    if st.distance_cm <= 10.0 and st.green_on and not st.cleared:
-                        # Briefly keep green, then switch back to red to simulate vehicle passing
-                        self._render_all_async()
-                        time.sleep(0.6)
-                        st.green_on = False
-                        st.cleared = True
-
-                    self._render_all_async()
-                    time.sleep(0.12)
+            for idx in range(len(fleet)):
+                fleet.speed[idx] = 1.0
+                while not fleet.cleared[idx] and not self.reset_requested:
+                    fleet.step()
+                    fleet.copy_to(idx, self.intersections[idx])
+                    self._record(idx)
+                    self._mark_dirty(idx)
+                    time.sleep(SEQUENCE_TICK_S)
+                fleet.speed[idx] = 0.0
 
                 if self.reset_requested:
                     break
 
-                # Ensure final state after pass
-                st.distance_cm = 8.0
-                st.green_on = False
-                # Keep cleared True so it doesn't re-green in this cycle
-                self._render_all_async()
-
                 # Brief pause before next node starts reacting
                 time.sleep(0.6)
         finally:
             self.is_running = False
             self._enable_start_async()
 
-    def _render_all_async(self) -> None:
-        self.root.after(0, self._render_all)
-
     def _enable_start_async(self) -> None:
         self.root.after(0, lambda: self.start_btn.config(state=tk.NORMAL))
 
 
+def parse_args():
+    p = argparse.ArgumentParser(description="Emergency vehicle traffic signal dashboard")
+    p.add_argument("--engine", action="store_true", help="Drive the demo from the discrete-event simulator (traffic_sim.py)")
+    p.add_argument("--speed", type=float, default=1.0, help="Simulation speed multiplier with --engine (default: 1.0)")
+    p.add_argument("--nodes", type=int, default=3, help=f"Number of intersections; above {GRID_THRESHOLD} they are drawn as a grid (default: 3)")
+    p.add_argument("--vehicles", type=int, default=0, help="Emergency vehicles for --engine on a grid (default: nodes / 4)")
+    p.add_argument("--bus-listen", type=str, default=None, help="Host the emergency event bus on HOST:PORT; detectors publish to it with --bus")
+    add_bus_key_arg(p)
+    p.add_argument("--telemetry", action="append", default=[], help="Show live sensor readings from this source (see telemetry.py); repeatable")
+    p.add_argument("--telemetry-listen", type=str, default=None, help="HOST:PORT to accept sensor connections on")
+    p.add_argument("--telemetry-binary", action="store_true", help="Sensors use the binary frame format")
+    add_store_args(p)
+    return p.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
     root = tk.Tk()
-    app = TrafficDemoApp(root)
+    store = EventWriter(args.store) if args.store else None
+    app = TrafficDemoApp(root, use_engine=args.engine, speed=args.speed, nodes=args.nodes, vehicles=args.vehicles, store=store)
+    if args.bus_listen:
+        bus = EventBus()
+        try:
+            serve_bus(bus, args.bus_listen, args.bus_key)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        app.follow_bus(bus)
+    if args.telemetry or args.telemetry_listen:
+        app.start_telemetry(args.telemetry, args.telemetry_listen, args.telemetry_binary)
     root.mainloop()
+    if store is not None:
+        store.close()
@@ -1,58 +1,81 @@
-import sys
+import argparse
+import math
+import queue
+import threading
 import time
-from typing import Optional
+from typing import List, Optional
 
 import cv2
+import numpy as np
 
+from detect_server import add_detect_key_arg, connect_detector
+from detections import Detections, extract_detections, vehicle_mask
+from event_bus import EmergencyEvent, EventBus, add_bus_key_arg, connect_bus, format_latency
+from event_store import SIGNAL_GREEN, SIGNAL_RED, EventWriter, add_store_args
+from inference_backends import BACKENDS, with_backend
+from metrics import StageMetrics, add_metrics_args, draw_hud, start_exporters
+from model_registry import MODEL_CANDIDATES, BackgroundLoader, load_model
+from motion_gate import MotionGate, parse_regions
+from offline_video import add_offline_args, process_video
+from overlay import draw_banner, draw_boxes
+from roi_tiling import TiledDetector, add_roi_args, draw_zones, roi_from_args
+from tracking import EmergencyConfirmer, IoUTracker, parse_k_of_n
 
-def try_load_yolo() -> Optional[object]:
-    try:
-        from ultralytics import YOLO  # type: ignore
-    except Exception:
-        return None
 
-    # Try a few common lightweight checkpoints present in recent Ultralytics releases
-    candidates = [
-        "yolo11n.pt",  # 2024+
-        "yolov10n.pt", # mid-2024
-        "yolov8n.pt",  # widely available
-    ]
-    for ckpt in candidates:
-        try:
-            model = YOLO(ckpt)
-            return model
-        except Exception:
-            continue
-    return None
+def try_load_yolo(model_path: Optional[str] = None, backend: str = "torch", int8: bool = False) -> Optional[object]:
+    # Remembers which of the candidates resolved so later launches load it directly
+    return with_backend(load_model(MODEL_CANDIDATES, model_path), backend, int8)
 
 
-def draw_banner(frame, text: str, color=(0, 0, 255)) -> None:
-    h, w = frame.shape[:2]
-    overlay = frame.copy()
-    cv2.rectangle(overlay, (0, 0), (w, 50), color, thickness=-1)
-    alpha = 0.35
-    cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
-    cv2.putText(frame, text, (12, 32), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2, cv2.LINE_AA)
+VEHICLE_NAMES = set(["car", "truck", "bus", "motorcycle", "bicycle"])
+
+
+def draw_detection_boxes(frame, dets: Detections, track_ids: Optional[List[int]] = None) -> None:
+    """Draw extracted detections onto frame, emphasizing vehicle classes. track_ids, one per
+    box, are prefixed to the captions as '#<id>'."""
+    if len(dets) == 0:
+        return
+    is_vehicle = vehicle_mask(dets, VEHICLE_NAMES)
+    boxes = dets.xyxy.astype(np.int32)
+    texts = [f"{label or f'id{cls_id}'} {conf:.2f}"
+             for cls_id, conf, label in zip(dets.cls.tolist(), dets.conf.tolist(), dets.labels.tolist())]
+    if track_ids is not None:
+        texts = [f"#{tid} {text}" for tid, text in zip(track_ids, texts)]
+    # Emphasize vehicles; show a stronger color and thicker box
+    for group, color, thickness in ((~is_vehicle, (0, 255, 0), 2), (is_vehicle, (0, 200, 255), 3)):
+        if group.any():
+            draw_boxes(frame, boxes[group], color, thickness, [t for t, g in zip(texts, group.tolist()) if g])
+
+
+def read_looping(cap: cv2.VideoCapture):
+    """Read the next frame, rewinding video files at EOF. Returns None if no frame is available."""
+    ok, frame = cap.read()
+    if not ok:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # loop video; if webcam, it keeps streaming
+        ok, frame = cap.read()
+        if not ok:
+            return None
+    return frame
 
 
-def run_simulated_detection(cap: cv2.VideoCapture) -> None:
+def run_simulated_detection(cap: cv2.VideoCapture, metrics: Optional[StageMetrics] = None, hud: bool = False) -> None:
     """Fallback mode: no YOLO. Lets you toggle an 'EMERGENCY VEHICLE DETECTED' overlay.
     Controls:
       - E: toggle emergency banner
       - Q: quit
       - Space: pause/resume
     """
+    metrics = metrics or StageMetrics("simulated")
     emergency = False
     paused = False
 
     while True:
+        t_frame = t = time.perf_counter()
         if not paused:
-            ok, frame = cap.read()
-            if not ok:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # loop video; if webcam, it keeps streaming
-                ok, frame = cap.read()
-                if not ok:
-                    break
+            frame = read_looping(cap)
+            if frame is None:
+                break
+            t = metrics.lap("read", t)
 
         # Draw an example bounding box to simulate detection when emergency is on
         if emergency:
@@ -66,9 +89,14 @@ def run_simulated_detection(cap: cv2.VideoCapture) -> None:
             draw_banner(frame, "EMERGENCY VEHICLE DETECTED", color=(0, 0, 255))
 
         cv2.putText(frame, "Keys: [E]=Toggle Emergency  [Space]=Pause  [Q]=Quit", (12, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        if hud:
+            draw_hud(frame, metrics)
+        t = metrics.lap("draw", t)
         cv2.imshow("Detection Demo (Simulated)", frame)
 
         key = cv2.waitKey(1) & 0xFF
+        metrics.lap("display", t)
+        metrics.frame_done(t_frame)
         if key in (ord('q'), ord('Q')):
             break
         if key == ord('e') or key == ord('E'):
@@ -80,61 +108,90 @@ def run_simulated_detection(cap: cv2.VideoCapture) -> None:
     cv2.destroyAllWindows()
 
 
-def run_yolo_detection(cap: cv2.VideoCapture, model: object) -> None:
+def run_yolo_detection(cap: cv2.VideoCapture, model: object, gate: Optional[MotionGate] = None,
+                       tracker: Optional[IoUTracker] = None, detect_every: int = 1,
+                       confirmer: Optional[EmergencyConfirmer] = None, bus: Optional[EventBus] = None,
+                       node: int = 1, metrics: Optional[StageMetrics] = None, hud: bool = False,
+                       tiler: Optional[TiledDetector] = None, store: Optional[EventWriter] = None) -> None:
     """YOLO mode: runs real detections (COCO). COCO doesn't have 'ambulance' label, so we
     highlight vehicles (car, truck, bus, motorcycle). You can still toggle the emergency banner.
+    With a motion gate, static frames reuse the last detections instead of running the model.
+    With a tracker, the model runs every detect_every frames and track boxes are extrapolated
+    in between; a confirmer raises the banner once a target track is confirmed k-of-n.
+    With a bus, every change of the banner decision is published as an event for node.
+    Stage timings go to metrics; hud draws FPS and per-stage latency on the frame.
+    With a tiler, only the tiles covering its lane / stop-line zones go to the model.
+    With a store, every detector run and every change of the decision is logged for node.
     """
     try:
         names = model.names  # type: ignore[attr-defined]
     except Exception:
         names = None
 
-    vehicle_names = set(["car", "truck", "bus", "motorcycle", "bicycle"])
     emergency = False
+    confirmed = False
+    published = False
+    dets = Detections.empty()
+    frame_idx = 0
+    metrics = metrics or StageMetrics()
 
     while True:
-        ok, frame = cap.read()
-        if not ok:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            ok, frame = cap.read()
-            if not ok:
-                break
+        t_frame = t = time.perf_counter()
+        frame = read_looping(cap)
+        if frame is None:
+            break
+        t = metrics.lap("read", t)
+        trace = {"capture": time.monotonic()}
 
         # Run inference
         try:
-            results = model(frame, verbose=False)[0]  # type: ignore[operator]
-            # Draw boxes
-            for box in results.boxes:  # type: ignore[attr-defined]
-                cls_id = int(box.cls[0]) if hasattr(box, 'cls') else -1
-                conf = float(box.conf[0]) if hasattr(box, 'conf') else 0.0
-                xyxy = box.xyxy[0].tolist() if hasattr(box, 'xyxy') else None
-                if xyxy is None:
-                    continue
-                x1, y1, x2, y2 = map(int, xyxy)
-                label = names[cls_id] if names and 0 <= cls_id < len(names) else f"id{cls_id}"
-                color = (0, 255, 0)
-
-                # Emphasize vehicles; show a stronger color and thicker box
-                is_vehicle = label in vehicle_names
-                if is_vehicle:
-                    color = (0, 200, 255)
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2 if not is_vehicle else 3)
-                cv2.putText(frame, f"{label} {conf:.2f}", (x1, max(20, y1 - 8)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-
-                # If you want to mark first detected vehicle as emergency for demo, uncomment:
-                # emergency = emergency or is_vehicle
+            detector_turn = frame_idx % detect_every == 0
+            if detector_turn and gate is not None:
+                detector_turn = gate.should_infer(frame)
+                t = metrics.lap("gate", t)
+            if detector_turn:
+                if tiler is not None:
+                    dets = tiler.detect(frame)
+                else:
+                    results = model(frame, verbose=False)[0]  # type: ignore[operator]
+                    dets = extract_detections(results, names)
+                trace["inference"] = time.monotonic()
+                t = metrics.lap("inference", t)
+                if tracker is not None:
+                    updated = tracker.update(dets)
+                    if confirmer is not None:
+                        confirmed = confirmer.observe(tracker, updated)
+            elif tracker is not None:
+                tracker.predict()  # between detector runs, and on runs the motion gate skipped
+            shown = tracker.to_detections() if tracker is not None else dets
+            t = metrics.lap("postprocess", t)
+            if tiler is not None:
+                draw_zones(frame, tiler)
+            draw_detection_boxes(frame, shown, tracker.track_ids if tracker is not None else None)
         except Exception:
             # If something goes wrong with inference, fallback to simulated overlay controls
-            run_simulated_detection(cap)
+            run_simulated_detection(cap, metrics, hud)
             return
+        frame_idx += 1
 
-        if emergency:
+        if store is not None and detector_turn:
+            store.append_detections(node, dets, signal=SIGNAL_GREEN if published else SIGNAL_RED)
+        if (emergency or confirmed) != published:
+            published = emergency or confirmed
+            _publish_decision(published, emergency, confirmed, tracker, confirmer, bus, store, node, trace)
+
+        if emergency or confirmed:
             draw_banner(frame, "EMERGENCY VEHICLE DETECTED", color=(0, 0, 255))
 
         cv2.putText(frame, "Keys: [E]=Toggle Emergency Banner  [Q]=Quit", (12, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        if hud:
+            draw_hud(frame, metrics, ("read", "inference", "postprocess", "draw", "display"))
+        t = metrics.lap("draw", t)
         cv2.imshow("Detection Demo (YOLO)", frame)
 
         key = cv2.waitKey(1) & 0xFF
+        metrics.lap("display", t)
+        metrics.frame_done(t_frame)
         if key in (ord('q'), ord('Q')):
             break
         if key == ord('e') or key == ord('E'):
@@ -144,16 +201,386 @@ def run_yolo_detection(cap: cv2.VideoCapture, model: object) -> None:
     cv2.destroyAllWindows()
 
 
+def _publish_decision(active: bool, manual: bool, confirmed: bool, tracker: Optional[IoUTracker],
+                      confirmer: Optional[EmergencyConfirmer], bus: Optional[EventBus], store: Optional[EventWriter],
+                      node: int, trace: dict) -> None:
+    """Log and publish a change of the banner decision for node."""
+    if store is not None:
+        store.append_state(node, SIGNAL_GREEN if active else SIGNAL_RED)
+    if bus is not None:
+        label = "manual" if manual else ""
+        if confirmed and tracker is not None:
+            ids = set(confirmer.confirmed_ids())  # type: ignore[union-attr]
+            label = next((t.label for t in tracker.tracks if t.track_id in ids), label)
+        bus.publish(EmergencyEvent(node, active, source="detect_demo", label=label, trace=trace).stamp("decision"))
+
+
+def _put_latest(q: queue.Queue, item) -> None:
+    """Put item on a bounded queue, discarding any stale item still waiting to be consumed."""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
+def _capture_loop(cap: cv2.VideoCapture, out: queue.Queue, stop: threading.Event, pace_fps: float = 0.0,
+                  metrics: Optional[StageMetrics] = None) -> None:
+    """Capture stage: keep only the newest (frame, capture time) in out; a None sentinel marks
+    end of stream."""
+    period = 1.0 / pace_fps if pace_fps > 0 else 0.0
+    next_t = time.perf_counter()
+    while not stop.is_set():
+        t = time.perf_counter()
+        frame = read_looping(cap)
+        if frame is None:
+            break
+        if metrics is not None:
+            metrics.lap("read", t)
+        _put_latest(out, (frame, time.monotonic()))
+        if period:
+            next_t += period
+            delay = next_t - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_t = time.perf_counter()
+    _put_latest(out, None)
+
+
+def run_yolo_detection_pipelined(cap: cv2.VideoCapture, model: object, pace_fps: float = 0.0,
+                                 gate: Optional[MotionGate] = None, tiler: Optional[TiledDetector] = None,
+                                 store: Optional[EventWriter] = None, node: int = 1,
+                                 tracker: Optional[IoUTracker] = None, detect_every: int = 1,
+                                 confirmer: Optional[EmergencyConfirmer] = None, bus: Optional[EventBus] = None,
+                                 metrics: Optional[StageMetrics] = None, hud: bool = False) -> None:
+    """Pipelined YOLO mode: capture, inference and render run as separate stages joined by
+    single-slot queues. Capture always overwrites the pending frame, so inference works on the
+    newest frame instead of draining a backlog. Set pace_fps for video files so they play at
+    their native rate rather than being decoded as fast as possible.
+    Gating, tracking, confirmation, the bus and the store work as in run_yolo_detection; the
+    decision is made and published from the inference stage, the E key from the render stage.
+    """
+    try:
+        names = model.names  # type: ignore[attr-defined]
+    except Exception:
+        names = None
+
+    metrics = metrics or StageMetrics()
+    frames: queue.Queue = queue.Queue(maxsize=1)
+    results_q: queue.Queue = queue.Queue(maxsize=1)
+    stop = threading.Event()
+    failed = threading.Event()
+    manual = threading.Event()  # the E key, toggled on the render thread
+
+    def inference_stage() -> None:
+        dets = Detections.empty()
+        confirmed = published = False
+        frame_idx = 0
+        while not stop.is_set():
+            try:
+                item = frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            frame, captured = item
+            t = time.perf_counter()
+            trace = {"capture": captured}
+            try:
+                detector_turn = frame_idx % detect_every == 0
+                if detector_turn and gate is not None:
+                    detector_turn = gate.should_infer(frame)
+                    t = metrics.lap("gate", t)
+                if detector_turn:
+                    if tiler is not None:
+                        dets = tiler.detect(frame)
+                    else:
+                        results = model(frame, verbose=False)[0]  # type: ignore[operator]
+                        dets = extract_detections(results, names)
+                    trace["inference"] = time.monotonic()
+                    t = metrics.lap("inference", t)
+                    if tracker is not None:
+                        updated = tracker.update(dets)
+                        if confirmer is not None:
+                            confirmed = confirmer.observe(tracker, updated)
+                elif tracker is not None:
+                    tracker.predict()
+                shown = tracker.to_detections() if tracker is not None else dets
+                track_ids = tracker.track_ids if tracker is not None else None
+            except Exception:
+                failed.set()
+                break
+            frame_idx += 1
+            emergency = manual.is_set()
+            if store is not None and detector_turn:
+                store.append_detections(node, dets, signal=SIGNAL_GREEN if published else SIGNAL_RED)
+            if (emergency or confirmed) != published:
+                published = emergency or confirmed
+                _publish_decision(published, emergency, confirmed, tracker, confirmer, bus, store, node, trace)
+            metrics.lap("postprocess", t)
+            _put_latest(results_q, (frame, shown, track_ids, published))
+        _put_latest(results_q, None)
+
+    workers = [
+        threading.Thread(target=_capture_loop, args=(cap, frames, stop, pace_fps, metrics), daemon=True),
+        threading.Thread(target=inference_stage, daemon=True),
+    ]
+    for t in workers:
+        t.start()
+
+    # Render stage stays on the main thread: HighGUI windows are not thread-safe
+    while True:
+        try:
+            item = results_q.get(timeout=0.005)
+        except queue.Empty:
+            item = False  # nothing new; keep the window responsive
+        if item is None:
+            break
+        t_frame = t = time.perf_counter()
+        if item is not False:
+            frame, shown, track_ids, active = item
+            if tiler is not None:
+                draw_zones(frame, tiler)
+            draw_detection_boxes(frame, shown, track_ids)
+            if active:
+                draw_banner(frame, "EMERGENCY VEHICLE DETECTED", color=(0, 0, 255))
+            cv2.putText(frame, "Keys: [E]=Toggle Emergency Banner  [Q]=Quit", (12, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            if hud:
+                draw_hud(frame, metrics, ("read", "inference", "postprocess", "draw", "display"))
+            t = metrics.lap("draw", t)
+            cv2.imshow("Detection Demo (YOLO, pipelined)", frame)
+
+        key = cv2.waitKey(1) & 0xFF
+        if item is not False:
+            metrics.lap("display", t)
+            metrics.frame_done(t_frame)
+        if key in (ord('q'), ord('Q')):
+            break
+        if key == ord('e') or key == ord('E'):
+            if manual.is_set():
+                manual.clear()
+            else:
+                manual.set()
+
+    stop.set()
+    for t in workers:
+        t.join(timeout=2.0)
+
+    if failed.is_set():
+        # Same fallback as the sequential loop
+        cv2.destroyAllWindows()
+        run_simulated_detection(cap, metrics, hud)
+        return
+
+    cap.release()
+    cv2.destroyAllWindows()
+
+
+def _mosaic(tiles: List, tile_w: int = 640, tile_h: int = 360):
+    """Lay frames out on a near-square grid for a single preview window."""
+    cols = int(math.ceil(math.sqrt(len(tiles))))
+    rows = int(math.ceil(len(tiles) / cols))
+    canvas = np.zeros((rows * tile_h, cols * tile_w, 3), dtype=np.uint8)
+    for i, tile in enumerate(tiles):
+        if tile is None:
+            continue
+        r, c = divmod(i, cols)
+        canvas[r * tile_h:(r + 1) * tile_h, c * tile_w:(c + 1) * tile_w] = cv2.resize(tile, (tile_w, tile_h), interpolation=cv2.INTER_AREA)
+    return canvas
+
+
+def run_multi_source_detection(caps: List[cv2.VideoCapture], model: object, pace_fps: Optional[List[float]] = None,
+                               store: Optional[EventWriter] = None) -> None:
+    """Multi-camera YOLO mode: each source has its own capture thread, and once per tick the
+    newest frame from every source that produced one is sent through a single batched model
+    call. Results are drawn back onto their own stream and shown together in one grid window.
+    With a store, each camera's detections are logged as node 1..N in source order.
+    Controls:
+      - 1..9: toggle the emergency banner for that camera
+      - E: toggle the emergency banner for all cameras
+      - Q: quit
+    """
+    try:
+        names = model.names  # type: ignore[attr-defined]
+    except Exception:
+        names = None
+
+    n = len(caps)
+    pace_fps = pace_fps or [0.0] * n
+    inputs: List[queue.Queue] = [queue.Queue(maxsize=1) for _ in range(n)]
+    stop = threading.Event()
+    workers = [
+        threading.Thread(target=_capture_loop, args=(cap, q, stop, fps), daemon=True)
+        for cap, q, fps in zip(caps, inputs, pace_fps)
+    ]
+    for t in workers:
+        t.start()
+
+    emergency = [False] * n
+    live = [True] * n
+    tiles: List = [None] * n
+
+    while any(live):
+        # Gather one fresh frame per stream; streams with nothing new sit this tick out
+        batch_ids: List[int] = []
+        batch: List = []
+        for i, q in enumerate(inputs):
+            if not live[i]:
+                continue
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                continue
+            if item is None:
+                live[i] = False
+                continue
+            batch_ids.append(i)
+            batch.append(item[0])
+
+        if batch:
+            try:
+                results = model(batch, verbose=False)  # type: ignore[operator]
+            except Exception as e:
+                print(f"Batched inference failed: {e}")
+                break
+            for i, frame, res in zip(batch_ids, batch, results):
+                dets = extract_detections(res, names)
+                draw_detection_boxes(frame, dets)
+                if store is not None:
+                    store.append_detections(i + 1, dets, signal=SIGNAL_GREEN if emergency[i] else SIGNAL_RED)
+                if emergency[i]:
+                    draw_banner(frame, f"CAM {i + 1}: EMERGENCY VEHICLE DETECTED", color=(0, 0, 255))
+                cv2.putText(frame, f"CAM {i + 1}", (12, frame.shape[0] - 14), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+                tiles[i] = frame
+            grid = _mosaic(tiles)
+            cv2.putText(grid, "Keys: [1-9]=Toggle Camera Emergency  [E]=Toggle All  [Q]=Quit", (12, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            cv2.imshow(f"Detection Demo (YOLO, {n} cameras)", grid)
+        else:
+            time.sleep(0.002)
+
+        key = cv2.waitKey(1) & 0xFF
+        if key in (ord('q'), ord('Q')):
+            break
+        if key == ord('e') or key == ord('E'):
+            flag = not all(emergency)
+            emergency = [flag] * n
+        if ord('1') <= key <= ord('9') and key - ord('1') < n:
+            emergency[key - ord('1')] = not emergency[key - ord('1')]
+
+    stop.set()
+    for t in workers:
+        t.join(timeout=2.0)
+    for cap in caps:
+        cap.release()
+    cv2.destroyAllWindows()
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Emergency vehicle detection demo (webcam or video file)")
+    p.add_argument("sources", nargs="*", help="Video file paths or camera indices (default: webcam 0). Two or more sources enable batched multi-camera mode")
+    p.add_argument("--pipelined", action="store_true", help="Run capture, inference and display on separate threads, always inferring on the newest frame")
+    p.add_argument("--model", type=str, default=None, help="Path to a YOLO .pt checkpoint (default: first available small public model)")
+    p.add_argument("--backend", choices=BACKENDS, default="torch", help="Inference backend; onnx/openvino export the model on first use (default: torch)")
+    p.add_argument("--int8", action="store_true", help="Use INT8 post-training quantization with the onnx/openvino backend")
+    p.add_argument("--detect-server", type=str, default=None, help="HOST:PORT of a running detect_server.py to use instead of loading a model here")
+    add_detect_key_arg(p)
+    p.add_argument("--motion-gate", action="store_true", help="Skip inference on static frames and reuse the last detections")
+    p.add_argument("--gate-regions", type=str, default=None, help="Regions watched by the motion gate as 'x1,y1,x2,y2;...' in frame fractions (default: whole frame, or the --roi-config zones)")
+    p.add_argument("--gate-threshold", type=float, default=0.005, help="Fraction of watched pixels that must change to run inference (default: 0.005)")
+    p.add_argument("--gate-refresh", type=float, default=1.0, help="Force a full inference at least every N seconds (default: 1.0)")
+    add_roi_args(p)
+    p.add_argument("--detect-every", type=int, default=1, help="Run the detector every N frames and track boxes in between (default: 1)")
+    p.add_argument("--classes", type=str, default="", help="Comma-separated classes that raise the emergency banner once confirmed by tracking (e.g. 'emergency')")
+    p.add_argument("--conf", type=float, default=0.75, help="Confidence threshold for --classes (default: 0.75)")
+    p.add_argument("--confirm", type=str, default="3/5", help="Emergency needs k of the last n detector runs on a track, as k/n (default: 3/5)")
+    p.add_argument("--bus", type=str, default=None, help="HOST:PORT of an event bus (e.g. demo_dashboard --bus-listen) to publish emergency decisions on")
+    add_bus_key_arg(p)
+    p.add_argument("--node", type=int, default=1, help="Intersection this camera reports for (default: 1)")
+    p.add_argument("--hud", action="store_true", help="Overlay FPS and per-stage latency on the video")
+    add_metrics_args(p)
+    add_store_args(p)
+    p.add_argument("--offline", type=str, default=None, metavar="PREFIX",
+                   help="Process the video file headless and write PREFIX.mp4, PREFIX_timeline.jsonl and PREFIX_events.json")
+    add_offline_args(p)
+    return p.parse_args()
+
+
+def run_multi_source(sources: List, loader: BackgroundLoader, store: Optional[EventWriter] = None) -> None:
+    caps: List[cv2.VideoCapture] = []
+    fps: List[float] = []
+    for src in sources:
+        cap = cv2.VideoCapture(src)
+        if not cap.isOpened():
+            print(f"Could not open video source {src!r}; skipping it.")
+            continue
+        caps.append(cap)
+        # Only files need pacing; cameras deliver at their own rate
+        fps.append((cap.get(cv2.CAP_PROP_FPS) or 0.0) if isinstance(src, str) else 0.0)
+    if not caps:
+        print("Error: No video sources available.")
+        return
+
+    model = loader.get()
+    if model is None:
+        print("Multi-camera mode needs YOLO; showing the first source in simulated mode.")
+        for cap in caps[1:]:
+            cap.release()
+        run_simulated_detection(caps[0])
+        return
+    run_multi_source_detection(caps, model, pace_fps=fps, store=store)
+
+
 def main() -> None:
     """Usage:
       python detect_demo.py              # webcam
       python detect_demo.py path\to\video.mp4
+      python detect_demo.py path\to\video.mp4 --pipelined
+      python detect_demo.py cam_north.mp4 cam_south.mp4 0 1   # batched multi-camera
+      python detect_demo.py incident.mp4 --offline out\incident  # headless, parallel, annotated copy
     
     Press 'E' to toggle the EMERGENCY banner for a clear recording cue.
     If Ultralytics is installed and a small model is available, real detections will be shown.
     Otherwise, simulated bounding boxes will be used.
     """
-    source = 0 if len(sys.argv) < 2 else sys.argv[1]
+    args = parse_args()
+    sources = [int(s) if s.isdigit() else s for s in args.sources] or [0]
+    if args.offline:
+        if len(sources) != 1 or not isinstance(sources[0], str):
+            raise SystemExit("--offline needs exactly one video file")
+        classes = [c.strip() for c in args.classes.split(",") if c.strip()] or ["emergency"]
+        stats = process_video(sources[0], args.model, classes, args.conf, args.backend, args.int8, args.workers,
+                              args.chunk_seconds, args.stride, args.batch, args.confirm,
+                              timeline_path=f"{args.offline}_timeline.jsonl", events_path=f"{args.offline}_events.json",
+                              out_video=f"{args.offline}.mp4")
+        print(stats)
+        return
+    # Load and warm up the model while the capture device opens
+    if args.detect_server:
+        # Live webcams only want the newest frame; video files must have every frame answered
+        live = all(isinstance(s, int) for s in sources)
+        loader = BackgroundLoader(lambda: connect_detector(args.detect_server, latest_only=live, key=args.detect_key)).start()
+    else:
+        loader = BackgroundLoader(lambda: try_load_yolo(args.model, args.backend, args.int8)).start()
+    store = EventWriter(args.store) if args.store else None
+    try:
+        run_live(args, sources, loader, store)
+    finally:
+        if store is not None:
+            store.close()
+
+
+def run_live(args, sources: List, loader: BackgroundLoader, store: Optional[EventWriter] = None) -> None:
+    if len(sources) > 1:
+        if args.roi_config:
+            print("--roi-config describes one camera; ignoring it for multiple sources.")
+        run_multi_source(sources, loader, store)
+        return
+    source = sources[0]
 
     try:
         cap = cv2.VideoCapture(source)
@@ -167,11 +594,45 @@ def main() -> None:
             print("Error: No camera available.")
             return
 
-    model = try_load_yolo()
+    roi = roi_from_args(args)
+    gate = None
+    if args.motion_gate:
+        # With lane zones configured, motion elsewhere (sidewalks, sky) should not wake the model
+        regions = parse_regions(args.gate_regions) or ([z.bounds() for z in roi["zones"]] if roi else [])
+        gate = MotionGate(regions=regions, min_changed_fraction=args.gate_threshold, max_skip_s=args.gate_refresh)
+
+    metrics = StageMetrics()
+    dumper = start_exporters(metrics, args)
+
+    model = loader.get()
+    tiler = TiledDetector(model, **roi) if model is not None and roi else None
     if model is None:
-        run_simulated_detection(cap)
+        run_simulated_detection(cap, metrics, args.hud)
     else:
-        run_yolo_detection(cap, model)
+        tracker = confirmer = None
+        targets = [c.strip() for c in args.classes.split(",") if c.strip()]
+        if args.detect_every > 1 or targets:
+            tracker = IoUTracker()
+        if targets:
+            k, n = parse_k_of_n(args.confirm)
+            confirmer = EmergencyConfirmer(targets, args.conf, k=k, n=n)
+        bus = None
+        if args.bus:
+            bus = connect_bus(args.bus, args.bus_key)
+            bus.subscribe(lambda ev: print(f"Node {ev.node} {'GREEN' if ev.active else 'RED'}: {format_latency(ev.latency_ms())}"),
+                          node=args.node, kind="actuated")
+        loop_args = dict(gate=gate, tracker=tracker, detect_every=max(1, args.detect_every), confirmer=confirmer,
+                         bus=bus, node=args.node, metrics=metrics, hud=args.hud, tiler=tiler, store=store)
+        if args.pipelined:
+            # Webcams are paced by the device; files would otherwise be decoded flat out
+            fps = cap.get(cv2.CAP_PROP_FPS) if isinstance(source, str) else 0.0
+            run_yolo_detection_pipelined(cap, model, pace_fps=fps or 0.0, **loop_args)
+        else:
+            run_yolo_detection(cap, model, **loop_args)
+    if gate is not None:
+        print(f"Motion gate skipped {gate.skip_ratio:.0%} of {gate.frames} frames.")
+    if dumper is not None:
+        dumper.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,509 @@
+"""Local detection server: one pool of model workers shared by every front-end.
+
+Each detect_demo / integrated_demo instance otherwise loads its own model, so N cameras mean
+N copies of the weights and N processes fighting over the same cores. Here the server owns
+``--workers`` model processes. Clients (``RemoteDetector``) write frames into a
+``multiprocessing.shared_memory`` ring they own and only send the slot number and shape over
+the socket. The worker reads the frame in place from shared memory, so frames are never
+pickled or copied through a pipe. Detections come back as packed float32/int32 arrays.
+
+A single scheduler thread hands work to idle workers only, taking frames round-robin across
+clients, up to ``--batch`` at a time for one batched model call. Queues therefore never build
+up inside a worker. A client that sets ``latest_only`` (live webcams) has its older
+still-queued frames dropped in favour of the newest one; ``result`` raises ``FrameDropped``
+for those, and a model-style call resubmits them.
+
+The default key is public, so only loopback addresses are served with it; listening on any
+other address needs ``--key`` (or ``SMART_TRAFFIC_DETECT_KEY``) on both ends. Workers only
+attach to shared-memory rings named with the clients' ``SHM_PREFIX``.
+
+Usage:
+  python detect_server.py --listen 127.0.0.1:6080 --workers 2 --model best.pt --backend openvino
+  python detect_demo.py cam1.mp4 --detect-server 127.0.0.1:6080
+  python integrated_demo.py --detect-server 127.0.0.1:6080
+"""
+import argparse
+import functools
+import itertools
+import json
+import multiprocessing as mp
+import os
+import secrets
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from event_bus import is_loopback, parse_address
+from inference_backends import BACKENDS
+
+AUTHKEY = b"smart-traffic-detect"  # default for loopback only; it is public
+DETECT_KEY_ENV = "SMART_TRAFFIC_DETECT_KEY"
+SHM_PREFIX = "stdet_"  # clients' rings; workers attach to nothing else
+# Result message: seq, box count, status; then xyxy float32 (n, 4), conf float32 (n,), cls int32 (n,)
+RESULT = struct.Struct("<IIB")
+CLIENT = struct.Struct("<I")  # worker -> server prefix naming the client a result belongs to
+OK, DROPPED, FAILED = 0, 1, 2
+RESULT_TIMEOUT_S = 30.0  # a dead worker never answers; give up instead of blocking forever
+
+
+class FrameDropped(RuntimeError):
+    """The server superseded this frame with a newer one from the same latest_only client."""
+
+
+def detect_authkey(key: Optional[str] = None) -> Optional[bytes]:
+    """User-supplied secret from key or the environment, or None when there is none."""
+    key = key or os.environ.get(DETECT_KEY_ENV)
+    return key.encode("utf-8") if key else None
+
+
+def pack_result(seq: int, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, status: int = OK) -> bytes:
+    n = int(conf.shape[0])
+    return b"".join((
+        RESULT.pack(seq, n, status),
+        np.ascontiguousarray(xyxy, dtype=np.float32).tobytes(),
+        np.ascontiguousarray(conf, dtype=np.float32).tobytes(),
+        np.ascontiguousarray(cls, dtype=np.int32).tobytes(),
+    ))
+
+
+def unpack_result(data: bytes, offset: int = 0) -> Tuple[int, int, np.ndarray, np.ndarray, np.ndarray]:
+    seq, n, status = RESULT.unpack_from(data, offset)
+    pos = offset + RESULT.size
+    xyxy = np.frombuffer(data, dtype=np.float32, count=n * 4, offset=pos).reshape(n, 4)
+    conf = np.frombuffer(data, dtype=np.float32, count=n, offset=pos + n * 16)
+    cls = np.frombuffer(data, dtype=np.int32, count=n, offset=pos + n * 20)
+    return seq, status, xyxy, conf, cls
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Open a segment created by another process without taking ownership of it."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # Before 3.13 attaching registers the segment with this process's resource tracker,
+        # which would unlink it (and warn) when this process exits; the creator owns it
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+    except Exception:
+        pass
+    return shm
+
+
+def _load_model(model_path: Optional[str], backend: str, int8: bool):
+    from inference_backends import with_backend
+    from model_registry import MODEL_CANDIDATES, load_model
+
+    return with_backend(load_model(MODEL_CANDIDATES, model_path), backend, int8)
+
+
+def _worker_main(conn: Connection, load_fn: Callable[[], object], threads: int) -> None:
+    """Model worker: receives batches of frame locations, answers with one packed result each,
+    then an empty message meaning "idle again"."""
+    import cv2
+
+    from detections import extract_detections
+    from model_registry import warm_up
+
+    cv2.setNumThreads(1)
+    try:
+        import torch  # type: ignore
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    model = load_fn()
+    if model is None:
+        conn.send_bytes(json.dumps({"error": "model unavailable"}).encode("utf-8"))
+        return
+    warm_up(model)
+    names = getattr(model, "names", None) or {}
+    names = dict(enumerate(names)) if isinstance(names, (list, tuple)) else names
+    conn.send_bytes(json.dumps({"names": {str(k): str(v) for k, v in names.items()}}).encode("utf-8"))
+
+    segments: "OrderedDict[str, shared_memory.SharedMemory]" = OrderedDict()
+    while True:
+        try:
+            jobs = json.loads(conn.recv_bytes().decode("utf-8"))
+        except (EOFError, OSError):
+            break
+        frames = []
+        try:
+            for job in jobs:
+                shm = segments.get(job["shm"])
+                if shm is None:
+                    # Fails if the client already left and removed its ring
+                    shm = segments[job["shm"]] = attach_shared_memory(job["shm"])
+                    if len(segments) > 32:  # rings of clients that left or grew
+                        segments.popitem(last=False)[1].close()
+                segments.move_to_end(job["shm"])
+                frames.append(np.ndarray(tuple(job["shape"]), dtype=np.uint8, buffer=shm.buf, offset=job["offset"]))
+            results = model(frames, verbose=False)  # type: ignore[operator]
+            replies = []
+            for job, res in zip(jobs, results):
+                dets = extract_detections(res, names)
+                replies.append(pack_result(job["seq"], dets.xyxy, dets.conf, dets.cls))
+        except Exception:
+            empty = np.zeros(0, dtype=np.float32)
+            replies = [pack_result(job["seq"], empty, empty, empty, FAILED) for job in jobs]
+        del frames  # release the buffer views before the segments can be closed
+        for job, reply in zip(jobs, replies):
+            conn.send_bytes(CLIENT.pack(job["client"]) + reply)
+        conn.send_bytes(b"")
+
+
+@dataclass
+class _ClientState:
+    conn: Connection
+    latest_only: bool = False
+    shm: str = ""
+    slot_bytes: int = 0
+    pending: Deque[Dict] = field(default_factory=deque)
+    send_lock: threading.Lock = field(default_factory=threading.Lock)
+    frames: int = 0
+    dropped: int = 0
+
+    def send(self, data: bytes) -> None:
+        with self.send_lock:
+            try:
+                self.conn.send_bytes(data)
+            except OSError:
+                pass  # its reader thread notices the disconnect
+
+
+class DetectionServer:
+    def __init__(self, address: Tuple[str, int], load_fn: Callable[[], object], workers: int = 2, batch: int = 4,
+                 threads: Optional[int] = None, authkey: Optional[bytes] = None) -> None:
+        """
+        load_fn: picklable callable returning the model, run once in every worker process
+        workers: model processes; each holds one copy of the weights
+        batch: most frames handed to one worker per model call
+        threads: intra-op threads per worker (default: cores split evenly between workers)
+        authkey: shared secret; without one only loopback addresses are accepted
+        """
+        if authkey is None:
+            if not is_loopback(address[0]):
+                raise ValueError(f"Refusing to serve detections on {address[0]} with the public default key; "
+                                 f"pass --key or set {DETECT_KEY_ENV}")
+            authkey = AUTHKEY
+        self.batch = batch
+        threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        ctx = mp.get_context("spawn")  # fork would copy the parent's threads and sockets
+        self._workers: List[Tuple[mp.Process, Connection]] = []
+        for _ in range(workers):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_worker_main, args=(child, load_fn, threads), daemon=True)
+            proc.start()
+            child.close()
+            self._workers.append((proc, parent))
+        hellos = [json.loads(conn.recv_bytes().decode("utf-8")) for _, conn in self._workers]
+        failed = [h["error"] for h in hellos if "error" in h]
+        if failed:
+            self.close()
+            raise RuntimeError(f"Detection workers failed to start: {failed[0]}")
+        self.names: Dict[str, str] = hellos[0]["names"]
+
+        self._clients: Dict[int, _ClientState] = {}
+        self._client_ids = itertools.count(1)
+        self._idle: Deque[int] = deque(range(workers))
+        self._rr = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        for w in range(workers):
+            threading.Thread(target=self._worker_loop, args=(w,), daemon=True).start()
+        threading.Thread(target=self._schedule_loop, daemon=True).start()
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                return  # listener closed
+            except Exception:
+                continue  # failed handshake
+            threading.Thread(target=self._client_loop, args=(conn,), daemon=True).start()
+
+    def _client_loop(self, conn: Connection) -> None:
+        cid = next(self._client_ids)
+        state = _ClientState(conn)
+        with self._cond:
+            self._clients[cid] = state
+        state.send(json.dumps({"names": self.names, "workers": len(self._workers)}).encode("utf-8"))
+        try:
+            while True:
+                msg = json.loads(conn.recv_bytes().decode("utf-8"))
+                op = msg.get("op")
+                if op == "hello":
+                    state.latest_only = bool(msg.get("latest_only", False))
+                elif op == "ring":
+                    if not str(msg["shm"]).startswith(SHM_PREFIX):
+                        break  # not a client ring; never let a worker attach to it
+                    state.shm, state.slot_bytes = msg["shm"], int(msg["slot_bytes"])
+                elif op == "frame":
+                    job = {"client": cid, "seq": msg["seq"], "shm": state.shm,
+                           "offset": int(msg["slot"]) * state.slot_bytes, "shape": msg["shape"]}
+                    with self._cond:
+                        stale = list(state.pending) if state.latest_only else []
+                        if stale:
+                            state.pending.clear()
+                            state.dropped += len(stale)
+                        state.pending.append(job)
+                        self._cond.notify()
+                    empty = np.zeros(0, dtype=np.float32)
+                    for old in stale:  # frees the client's slot
+                        state.send(pack_result(old["seq"], empty, empty, empty, DROPPED))
+        except (EOFError, OSError, ValueError):
+            pass
+        finally:
+            with self._cond:
+                self._clients.pop(cid, None)
+            conn.close()
+
+    def _take_jobs(self) -> List[Dict]:
+        """Up to batch pending frames, one client at a time in rotation (call with _cond held)."""
+        ids = sorted(cid for cid, c in self._clients.items() if c.pending)
+        if not ids:
+            return []
+        start = next((i for i, cid in enumerate(ids) if cid > self._rr), 0)
+        ids = ids[start:] + ids[:start]
+        jobs: List[Dict] = []
+        while len(jobs) < self.batch and ids:
+            for cid in list(ids):
+                state = self._clients[cid]
+                jobs.append(state.pending.popleft())
+                self._rr = cid
+                if not state.pending:
+                    ids.remove(cid)
+                if len(jobs) >= self.batch:
+                    break
+        return jobs
+
+    def _schedule_loop(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    jobs = self._take_jobs() if self._idle else []
+                    if jobs:
+                        break
+                    self._cond.wait()
+                w = self._idle.popleft()
+            try:
+                self._workers[w][1].send_bytes(json.dumps(jobs).encode("utf-8"))
+            except OSError:
+                return  # worker gone; the pool is shutting down
+
+    def _worker_loop(self, w: int) -> None:
+        conn = self._workers[w][1]
+        while True:
+            try:
+                data = conn.recv_bytes()
+            except (EOFError, OSError):
+                return
+            if not data:
+                with self._cond:
+                    self._idle.append(w)
+                    self._cond.notify()
+                continue
+            (cid,) = CLIENT.unpack_from(data)
+            with self._cond:
+                state = self._clients.get(cid)
+                if state is not None:
+                    state.frames += 1
+            if state is not None:
+                state.send(data[CLIENT.size:])
+
+    def stats(self) -> Dict[int, Dict[str, int]]:
+        with self._cond:
+            return {cid: {"frames": c.frames, "dropped": c.dropped, "queued": len(c.pending)}
+                    for cid, c in self._clients.items()}
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if hasattr(self, "listener"):
+            self.listener.close()
+        for proc, conn in self._workers:
+            conn.close()
+            proc.join(timeout=2.0)
+            if proc.is_alive():
+                proc.terminate()
+
+
+class _Boxes:
+    __slots__ = ("xyxy", "conf", "cls")
+
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray) -> None:
+        self.xyxy, self.conf, self.cls = xyxy, conf, cls
+
+
+class RemoteResult:
+    """Stands in for an ultralytics Results object: ``.boxes.xyxy/.conf/.cls`` and ``.names``."""
+
+    def __init__(self, boxes: _Boxes, names: Dict[int, str], status: int = OK) -> None:
+        self.boxes = boxes
+        self.names = names
+        self.status = status
+
+
+class RemoteDetector:
+    """Model-shaped client of a DetectionServer: ``detector(frame_or_frames, verbose=False)``
+    returns one RemoteResult per frame, so it can replace the YOLO object in the demos.
+    Like the model it replaces, use it from one thread at a time."""
+
+    def __init__(self, spec: str, slots: int = 4, latest_only: bool = False, timeout: float = RESULT_TIMEOUT_S,
+                 authkey: Optional[bytes] = None) -> None:
+        """
+        slots: frames that can be in flight at once (shared-memory ring size)
+        latest_only: let the server drop this client's queued frames when a newer one arrives
+        timeout: seconds to wait for any one result before raising TimeoutError
+        """
+        self.conn = Client(parse_address(spec), authkey=authkey or AUTHKEY)
+        hello = json.loads(self.conn.recv_bytes().decode("utf-8"))
+        self.names: Dict[int, str] = {int(k): v for k, v in hello["names"].items()}
+        self.workers = int(hello["workers"])
+        self.slots = slots
+        self.timeout = timeout
+        self.latest_only = latest_only
+        self.conn.send_bytes(json.dumps({"op": "hello", "latest_only": latest_only}).encode("utf-8"))
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._slot_bytes = 0
+        self._free: Deque[int] = deque()
+        self._in_flight: Dict[int, int] = {}  # seq -> slot
+        self._results: Dict[int, RemoteResult] = {}
+        self._seq = itertools.count(1)
+
+    def _ensure_ring(self, nbytes: int) -> None:
+        if self._shm is not None and nbytes <= self._slot_bytes:
+            return
+        while self._in_flight:  # the old ring is still being read
+            self._receive()
+        self._release_ring()
+        self._slot_bytes = -(-nbytes // 4096) * 4096
+        self._shm = shared_memory.SharedMemory(name=SHM_PREFIX + secrets.token_hex(8), create=True,
+                                               size=self._slot_bytes * self.slots)
+        self._free = deque(range(self.slots))
+        self.conn.send_bytes(json.dumps({"op": "ring", "shm": self._shm.name, "slot_bytes": self._slot_bytes}).encode("utf-8"))
+
+    def _release_ring(self) -> None:
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def _receive(self) -> None:
+        if not self.conn.poll(self.timeout):
+            raise TimeoutError(f"No answer from the detection server in {self.timeout:.0f} s")
+        data = self.conn.recv_bytes()
+        seq, status, xyxy, conf, cls = unpack_result(data)
+        self._free.append(self._in_flight.pop(seq))
+        # Copies: the views into the message bytes are read-only
+        self._results[seq] = RemoteResult(_Boxes(xyxy.copy(), conf.copy(), cls.copy()), self.names, status)
+
+    def submit(self, frame: np.ndarray) -> int:
+        """Copy frame into a free ring slot and queue it; returns its sequence number.
+        Blocks only when every slot is still waiting for a result."""
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        self._ensure_ring(frame.nbytes)
+        while not self._free:
+            self._receive()
+        slot = self._free.popleft()
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf, offset=slot * self._slot_bytes)[...] = frame  # type: ignore[union-attr]
+        seq = next(self._seq)
+        self._in_flight[seq] = slot
+        self.conn.send_bytes(json.dumps({"op": "frame", "seq": seq, "slot": slot, "shape": list(frame.shape)}).encode("utf-8"))
+        return seq
+
+    def result(self, seq: int) -> RemoteResult:
+        while seq not in self._results:
+            self._receive()
+        res = self._results.pop(seq)
+        if res.status == FAILED:
+            raise RuntimeError("Inference failed on the detection server")
+        if res.status == DROPPED:
+            raise FrameDropped(f"Frame {seq} was superseded by a newer one")
+        return res
+
+    def __call__(self, source, verbose: bool = False) -> List[RemoteResult]:
+        frames = source if isinstance(source, (list, tuple)) else [source]
+        if self.latest_only:
+            # Queued together, each frame would supersede the one before it
+            return [self._detect_one(f) for f in frames]
+        seqs = [self.submit(f) for f in frames]
+        return [self.result(s) for s in seqs]
+
+    def _detect_one(self, frame: np.ndarray) -> RemoteResult:
+        try:
+            return self.result(self.submit(frame))
+        except FrameDropped:
+            # Only a newer frame from this client supersedes one, and none is queued now
+            return self.result(self.submit(frame))
+
+    def close(self) -> None:
+        self.conn.close()
+        self._release_ring()
+
+
+def connect_detector(spec: str, latest_only: bool = False, key: Optional[str] = None) -> Optional[RemoteDetector]:
+    """RemoteDetector for "host:port", or None (with a message) when no server answers."""
+    try:
+        return RemoteDetector(spec, latest_only=latest_only, authkey=detect_authkey(key))
+    except OSError as e:
+        print(f"Could not reach the detection server at {spec}: {e}")
+        return None
+
+
+def add_detect_key_arg(p) -> None:
+    p.add_argument("--detect-key", type=str, default=None,
+                   help=f"Shared secret of the detection server, if it was started with one (default: ${DETECT_KEY_ENV})")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Serve one pool of detection workers to all local front-ends")
+    p.add_argument("--listen", type=str, default="127.0.0.1:6080", help="HOST:PORT to accept clients on (default: 127.0.0.1:6080)")
+    p.add_argument("--model", type=str, default=None, help="Path to a YOLO .pt checkpoint (default: first available small public model)")
+    p.add_argument("--backend", choices=BACKENDS, default="torch", help="Inference backend; onnx/openvino export the model on first use (default: torch)")
+    p.add_argument("--int8", action="store_true", help="Use INT8 post-training quantization with the onnx/openvino backend")
+    p.add_argument("--workers", type=int, default=2, help="Model worker processes (default: 2)")
+    p.add_argument("--batch", type=int, default=4, help="Most frames per model call (default: 4)")
+    p.add_argument("--threads", type=int, default=None, help="Threads per worker (default: cores / workers)")
+    p.add_argument("--key", type=str, default=None,
+                   help=f"Shared secret for clients; required to listen on a non-loopback address (default: ${DETECT_KEY_ENV})")
+    p.add_argument("--stats", type=float, default=10.0, help="Print per-client counters every N seconds; 0 disables (default: 10)")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    load_fn = functools.partial(_load_model, args.model, args.backend, args.int8)
+    try:
+        server = DetectionServer(parse_address(args.listen), load_fn, args.workers, args.batch, args.threads,
+                                 detect_authkey(args.key))
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"Detection server on {args.listen}: {args.workers} workers, batch {args.batch}")
+    try:
+        while True:
+            time.sleep(args.stats or 3600.0)
+            if args.stats:
+                for cid, s in server.stats().items():
+                    print(f"  client {cid}: {s['frames']} frames, {s['dropped']} dropped, {s['queued']} queued")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
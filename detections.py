@@ -0,0 +1,103 @@
+"""Vectorized post-processing for YOLO results shared by detect_demo and integrated_demo.
+
+Box coordinates, class ids and confidences are pulled out of ``results.boxes`` as whole
+arrays once per frame; class-name mapping and filtering are then plain NumPy masks instead
+of per-box tensor indexing.
+"""
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+
+
+@dataclass
+class Detections:
+    xyxy: np.ndarray  # (N, 4) float32, pixel coordinates
+    cls: np.ndarray  # (N,) int64 class ids, -1 when unknown
+    conf: np.ndarray  # (N,) float32
+    labels: np.ndarray  # (N,) str, "" when the class id has no name
+
+    def __len__(self) -> int:
+        return int(self.cls.shape[0])
+
+    def select(self, mask: np.ndarray) -> "Detections":
+        return Detections(self.xyxy[mask], self.cls[mask], self.conf[mask], self.labels[mask])
+
+    @staticmethod
+    def empty() -> "Detections":
+        return Detections(
+            np.zeros((0, 4), dtype=np.float32),
+            np.zeros((0,), dtype=np.int64),
+            np.zeros((0,), dtype=np.float32),
+            np.zeros((0,), dtype=str),
+        )
+
+
+def _to_numpy(value) -> np.ndarray:
+    # torch tensors (possibly on GPU) or anything array-like
+    if hasattr(value, "cpu"):
+        value = value.cpu()
+    if hasattr(value, "numpy"):
+        return value.numpy()
+    return np.asarray(value)
+
+
+_label_tables: dict = {}
+
+
+def label_table(names) -> np.ndarray:
+    """Class id -> name lookup array for a model's ``names`` (dict or list). Cached per object."""
+    key = id(names)
+    cached = _label_tables.get(key)
+    if cached is not None and cached[0] is names:
+        return cached[1]
+    if isinstance(names, dict):
+        size = max((int(k) for k in names), default=-1) + 1
+        table = np.full(size, "", dtype=object)
+        for k, v in names.items():
+            table[int(k)] = str(v)
+    else:
+        table = np.array([str(v) for v in names], dtype=object)
+    table = table.astype(str) if table.size else np.zeros((0,), dtype=str)
+    _label_tables[key] = (names, table)
+    return table
+
+
+def map_labels(cls: np.ndarray, names) -> np.ndarray:
+    if not names:
+        return np.full(cls.shape, "", dtype=str)
+    table = label_table(names)
+    valid = (cls >= 0) & (cls < table.shape[0])
+    labels = np.full(cls.shape, "", dtype=table.dtype)
+    labels[valid] = table[cls[valid]]
+    return labels
+
+
+def extract_detections(results, names=None) -> Detections:
+    """Convert one ultralytics ``Results`` object into a ``Detections`` of NumPy arrays."""
+    boxes = getattr(results, "boxes", None)
+    if boxes is None or getattr(boxes, "xyxy", None) is None:
+        return Detections.empty()
+    xyxy = _to_numpy(boxes.xyxy).astype(np.float32, copy=False).reshape(-1, 4)
+    n = xyxy.shape[0]
+    cls_raw = getattr(boxes, "cls", None)
+    conf_raw = getattr(boxes, "conf", None)
+    cls = _to_numpy(cls_raw).astype(np.int64).reshape(-1) if cls_raw is not None else np.full(n, -1, dtype=np.int64)
+    conf = _to_numpy(conf_raw).astype(np.float32, copy=False).reshape(-1) if conf_raw is not None else np.zeros(n, dtype=np.float32)
+    if names is None:
+        names = getattr(results, "names", None)
+    return Detections(xyxy, cls, conf, map_labels(cls, names))
+
+
+def target_mask(dets: Detections, target_classes: Iterable[str], conf_threshold: float) -> np.ndarray:
+    """Boxes whose (case-insensitive) label is a target class with conf >= conf_threshold."""
+    targets = [c.lower() for c in target_classes]
+    if not targets or len(dets) == 0:
+        return np.zeros(len(dets), dtype=bool)
+    return np.isin(np.char.lower(dets.labels), targets) & (dets.conf >= conf_threshold)
+
+
+def vehicle_mask(dets: Detections, vehicle_names: Iterable[str]) -> np.ndarray:
+    if len(dets) == 0:
+        return np.zeros(0, dtype=bool)
+    return np.isin(dets.labels, list(vehicle_names))
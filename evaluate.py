@@ -0,0 +1,353 @@
+"""Evaluate the emergency model on a data.yaml split and pick the --conf threshold.
+
+The split is decoded and letterboxed once into a memory-mapped uint8 array under the cache
+directory, together with its ground-truth boxes mapped into letterbox pixels. Later runs (after
+a retrain, an export or INT8 quantization) only batch the cached images through the model.
+Since the cached images already have the model's input size, predicted boxes come back in the
+same coordinates as the ground truth.
+
+Matching is vectorized over the whole split. Every prediction is paired with the ground-truth
+boxes of its own image and class, and TP flags for all ten IoU thresholds (0.50:0.95) come from
+one sort. The report has:
+  - mAP50 and mAP50-95 per class (COCO 101-point interpolation)
+  - box precision / recall / F1 per confidence threshold at IoU 0.5
+  - trigger rates: the share of images with / without a target that would turn the signal
+    GREEN under integrated_demo's rule (any target box with conf >= threshold)
+  - a recommended --conf: best box F1, or, with --max-false-trigger and negative images in the
+    split, the lowest threshold whose false trigger rate stays within the limit
+
+Usage:
+  python evaluate.py --model best.pt                          # val split; builds the cache once
+  python evaluate.py --model best.pt --backend openvino --int8 --split test
+  python evaluate.py --model best.pt --curves pr.csv --json report.json --max-false-trigger 0.01
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from dataset import DEFAULT_DATA_YAML, label_path, letterbox, load_data_yaml, split_images
+from detections import extract_detections
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "smart_traffic", "eval")
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+CONF_GRID = np.round(np.arange(0.01, 1.0, 0.01), 2)
+
+
+@dataclass
+class DecodedSplit:
+    images: np.ndarray  # (N, S, S, 3) uint8 letterboxed BGR, memory-mapped
+    paths: List[str]
+    gt_xyxy: np.ndarray  # (M, 4) float32, letterbox pixels
+    gt_cls: np.ndarray  # (M,) int64
+    gt_img: np.ndarray  # (M,) int64 index into images
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+
+def read_labels(path: str, w: int, h: int, scale: float, pad: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """YOLO label file -> (xyxy in letterbox pixels, cls). Polygon rows are reduced to their bounds."""
+    xyxy: List[List[float]] = []
+    cls: List[int] = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [line.split() for line in f if line.strip()]
+    except FileNotFoundError:
+        rows = []
+    for row in rows:
+        v = [float(x) for x in row[1:]]
+        if len(v) == 4:
+            cx, cy, bw, bh = v
+            box = [cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2]
+        elif len(v) >= 6:
+            xs, ys = v[0::2], v[1::2]
+            box = [min(xs), min(ys), max(xs), max(ys)]
+        else:
+            continue
+        xyxy.append(box)
+        cls.append(int(row[0]))
+    out = np.array(xyxy, dtype=np.float32).reshape(-1, 4)
+    out *= np.array([w, h, w, h], dtype=np.float32) * scale
+    out += np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)
+    return out, np.array(cls, dtype=np.int64)
+
+
+def _manifest_key(paths: Sequence[str], imgsz: int) -> str:
+    """Changes whenever an image or label file is added, removed or rewritten."""
+    h = hashlib.sha1(str(imgsz).encode())
+    for p in paths:
+        for f in (p, label_path(p)):
+            try:
+                st = os.stat(f)
+                h.update(f"{f}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+            except FileNotFoundError:
+                h.update(f"{f}|-\n".encode())
+    return h.hexdigest()[:16]
+
+
+def load_split(data_yaml: str = DEFAULT_DATA_YAML, split: str = "val", imgsz: int = 640,
+               cache_dir: str = DEFAULT_CACHE_DIR, workers: Optional[int] = None) -> DecodedSplit:
+    """Decoded, letterboxed split from the cache, building it (decoding in a thread pool) if missing."""
+    paths = split_images(data_yaml, split)
+    if not paths:
+        raise RuntimeError(f"No images found for split {split!r} via {data_yaml}")
+    folder = os.path.join(cache_dir, f"{split}-{imgsz}-{_manifest_key(paths, imgsz)}")
+    images_file, meta_file = os.path.join(folder, "images.npy"), os.path.join(folder, "meta.npz")
+    shape = (len(paths), imgsz, imgsz, 3)
+    if not os.path.exists(meta_file):
+        os.makedirs(folder, exist_ok=True)
+        images = np.lib.format.open_memmap(images_file + ".tmp", mode="w+", dtype=np.uint8, shape=shape)
+        gts: List[Tuple[np.ndarray, np.ndarray]] = [(np.zeros((0, 4), np.float32), np.zeros(0, np.int64))] * len(paths)
+
+        def decode(i: int) -> None:
+            img = cv2.imread(paths[i])
+            if img is None:
+                images[i] = 114  # unreadable file: a blank letterbox with no labels
+                return
+            boxed, scale, pad = letterbox(img, imgsz)
+            images[i] = boxed
+            gts[i] = read_labels(label_path(paths[i]), img.shape[1], img.shape[0], scale, pad)
+
+        # cv2.imread / resize release the GIL, so threads decode in parallel
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            list(pool.map(decode, range(len(paths))))
+        images.flush()
+        del images
+        os.replace(images_file + ".tmp", images_file)
+        counts = np.array([g[1].shape[0] for g in gts], dtype=np.int64)
+        np.savez(meta_file + ".tmp.npz", paths=np.array(paths), gt_xyxy=np.concatenate([g[0] for g in gts]),
+                 gt_cls=np.concatenate([g[1] for g in gts]), gt_img=np.repeat(np.arange(len(paths)), counts))
+        os.replace(meta_file + ".tmp.npz", meta_file)
+    meta = np.load(meta_file)
+    return DecodedSplit(np.load(images_file, mmap_mode="r"), meta["paths"].tolist(), meta["gt_xyxy"],
+                        meta["gt_cls"], meta["gt_img"])
+
+
+def predict(model, split: DecodedSplit, batch: int = 16, min_conf: float = 0.001) -> Dict[str, np.ndarray]:
+    """Batched inference over the cached images; predictions as flat arrays with an image index."""
+    xyxy, cls, conf, img = [], [], [], []
+    imgsz = split.images.shape[1]
+    for start in range(0, len(split), batch):
+        frames = [np.asarray(f) for f in split.images[start:start + batch]]
+        results = model(frames, verbose=False, conf=min_conf, imgsz=imgsz)  # type: ignore[operator]
+        for i, res in enumerate(results):
+            dets = extract_detections(res)
+            xyxy.append(dets.xyxy)
+            cls.append(dets.cls)
+            conf.append(dets.conf)
+            img.append(np.full(len(dets), start + i, dtype=np.int64))
+    return {
+        "xyxy": np.concatenate(xyxy) if xyxy else np.zeros((0, 4), np.float32),
+        "cls": np.concatenate(cls) if cls else np.zeros(0, np.int64),
+        "conf": np.concatenate(conf) if conf else np.zeros(0, np.float32),
+        "img": np.concatenate(img) if img else np.zeros(0, np.int64),
+    }
+
+
+def match_predictions(pred: Dict[str, np.ndarray], split: DecodedSplit,
+                      iou_thresholds: np.ndarray = IOU_THRESHOLDS) -> np.ndarray:
+    """(P, T) bool: prediction p is a true positive at IoU threshold t.
+
+    Every prediction is paired with each ground-truth box of the same image. Per threshold the
+    candidate pairs are taken by descending IoU, and each prediction and ground-truth box is used
+    at most once (the same rule ultralytics' validator applies per image).
+    """
+    n_pred, n_thr = pred["cls"].shape[0], iou_thresholds.shape[0]
+    tp = np.zeros((n_pred, n_thr), dtype=bool)
+    if n_pred == 0 or split.gt_cls.shape[0] == 0:
+        return tp
+    # Ground truth grouped by image: each prediction pairs with the range [g_start, g_start + g_count)
+    g_order = np.argsort(split.gt_img, kind="stable")
+    g_count = np.bincount(split.gt_img, minlength=len(split))
+    g_start = np.concatenate(([0], np.cumsum(g_count)[:-1]))
+    per_pred = g_count[pred["img"]]
+    p_idx = np.repeat(np.arange(n_pred), per_pred)
+    offset = np.arange(p_idx.shape[0]) - np.repeat(np.cumsum(per_pred) - per_pred, per_pred)
+    g_idx = g_order[g_start[pred["img"]][p_idx] + offset]
+    same = pred["cls"][p_idx] == split.gt_cls[g_idx]
+    p_idx, g_idx = p_idx[same], g_idx[same]
+
+    a, b = pred["xyxy"][p_idx], split.gt_xyxy[g_idx]
+    iw = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+    ih = np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]) + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - inter
+    iou = inter / np.maximum(union, 1e-9)
+
+    by_iou = np.argsort(-iou, kind="stable")
+    p_idx, g_idx, iou = p_idx[by_iou], g_idx[by_iou], iou[by_iou]
+    for t, thr in enumerate(iou_thresholds):
+        ok = iou >= thr
+        p, g = p_idx[ok], g_idx[ok]
+        # Best pair per prediction first, then the best of those per ground-truth box
+        _, first = np.unique(p, return_index=True)
+        first = np.sort(first)
+        _, keep = np.unique(g[first], return_index=True)
+        tp[p[first][keep], t] = True
+    return tp
+
+
+def average_precision(recall: np.ndarray, precision: np.ndarray) -> float:
+    """COCO 101-point interpolated AP of one PR curve (points ordered by falling confidence)."""
+    envelope = np.maximum.accumulate(np.concatenate((precision, [0.0]))[::-1])[::-1]
+    idx = np.searchsorted(recall, np.linspace(0, 1, 101), side="left")
+    return float(np.where(idx < recall.shape[0], envelope[np.minimum(idx, recall.shape[0])], 0.0).mean())
+
+
+def evaluate(pred: Dict[str, np.ndarray], split: DecodedSplit, names: Sequence[str],
+             targets: Sequence[str], conf_grid: np.ndarray = CONF_GRID) -> Dict:
+    """mAP per class, box PR curve and image trigger rates over conf_grid for the target classes."""
+    tp = match_predictions(pred, split)
+    order = np.argsort(-pred["conf"], kind="stable")
+    conf, cls, tp = pred["conf"][order], pred["cls"][order], tp[order]
+
+    per_class: Dict[str, Dict[str, float]] = {}
+    for c in np.unique(np.concatenate((split.gt_cls, cls))).tolist():
+        n_gt = int((split.gt_cls == c).sum())
+        rows = cls == c
+        if n_gt == 0:
+            continue
+        ctp = np.cumsum(tp[rows], axis=0)
+        cfp = np.cumsum(~tp[rows], axis=0)
+        recall = ctp / n_gt
+        precision = ctp / np.maximum(ctp + cfp, 1)
+        ap = [average_precision(recall[:, t], precision[:, t]) for t in range(IOU_THRESHOLDS.shape[0])]
+        name = names[c] if 0 <= c < len(names) else str(c)
+        per_class[name] = {"ap50": ap[0], "ap50_95": float(np.mean(ap)), "instances": n_gt}
+
+    # Box precision / recall of the target classes at IoU 0.5 for every threshold of the grid
+    wanted = [i for i, n in enumerate(names) if n.lower() in {t.lower() for t in targets}]
+    is_target = np.isin(cls, wanted)
+    n_gt = int(np.isin(split.gt_cls, wanted).sum())
+    t_conf, t_tp = conf[is_target], tp[is_target, 0]
+    # conf is sorted descending: the predictions kept at threshold c are a prefix
+    kept = np.searchsorted(-t_conf, -conf_grid, side="right")
+    ctp = np.concatenate(([0], np.cumsum(t_tp)))[kept]
+    precision = np.where(kept > 0, ctp / np.maximum(kept, 1), 1.0)
+    recall = ctp / max(n_gt, 1)
+    f1 = 2 * precision * recall / np.maximum(precision + recall, 1e-9)
+
+    # Trigger rule of integrated_demo: an image turns GREEN if its best target box clears --conf
+    n_img = len(split)
+    best = np.zeros(n_img, dtype=np.float32)
+    np.maximum.at(best, pred["img"][order][is_target], t_conf)
+    positive = np.zeros(n_img, dtype=bool)
+    positive[split.gt_img[np.isin(split.gt_cls, wanted)]] = True
+    triggered = best[None, :] >= conf_grid[:, None]
+    n_pos, n_neg = int(positive.sum()), int((~positive).sum())
+    pos_rate = triggered[:, positive].sum(axis=1) / max(n_pos, 1)
+    neg_rate = triggered[:, ~positive].sum(axis=1) / max(n_neg, 1)
+
+    maps = [v["ap50"] for v in per_class.values()], [v["ap50_95"] for v in per_class.values()]
+    return {
+        "images": n_img, "positive_images": n_pos, "negative_images": n_neg, "instances": int(split.gt_cls.shape[0]),
+        "map50": float(np.mean(maps[0])) if maps[0] else 0.0, "map50_95": float(np.mean(maps[1])) if maps[1] else 0.0,
+        "per_class": per_class,
+        "curve": {"conf": conf_grid, "precision": precision, "recall": recall, "f1": f1,
+                  "trigger_pos": pos_rate, "trigger_neg": neg_rate},
+    }
+
+
+def recommend_conf(report: Dict, max_false_trigger: Optional[float] = None) -> Tuple[float, str]:
+    """(threshold, reason) from the curves of evaluate()."""
+    c = report["curve"]
+    if max_false_trigger is not None and report["negative_images"]:
+        ok = np.flatnonzero(c["trigger_neg"] <= max_false_trigger)
+        if ok.size:
+            i = int(ok[0])
+            return float(c["conf"][i]), (f"lowest threshold with false triggers <= {max_false_trigger:.1%} "
+                                         f"(GREEN on {c['trigger_pos'][i]:.1%} of target images)")
+    # Ties go to the higher threshold: same F1 with fewer boxes near the decision boundary
+    i = int(len(c["f1"]) - 1 - np.argmax(c["f1"][::-1]))
+    return float(c["conf"][i]), f"best box F1 {c['f1'][i]:.3f} at IoU 0.5 (P {c['precision'][i]:.3f}, R {c['recall'][i]:.3f})"
+
+
+def write_curves(path: str, report: Dict) -> None:
+    c = report["curve"]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("conf,precision,recall,f1,trigger_pos,trigger_neg\n")
+        for row in zip(*(c[k].tolist() for k in ("conf", "precision", "recall", "f1", "trigger_pos", "trigger_neg"))):
+            f.write(",".join(f"{v:.4f}" for v in row) + "\n")
+
+
+def format_report(report: Dict, current_conf: float, recommended: Tuple[float, str]) -> str:
+    lines = [f"{report['images']} images ({report['positive_images']} with a target, {report['negative_images']} without), "
+             f"{report['instances']} boxes",
+             f"mAP50 {report['map50']:.3f}  mAP50-95 {report['map50_95']:.3f}"]
+    for name, v in report["per_class"].items():
+        lines.append(f"  {name:<16}AP50 {v['ap50']:.3f}  AP50-95 {v['ap50_95']:.3f}  ({v['instances']} boxes)")
+    c = report["curve"]
+    lines.append(f"{'conf':>6}{'P':>8}{'R':>8}{'F1':>8}{'GREEN|target':>14}{'GREEN|none':>12}")
+    shown = sorted({0.25, 0.5, 0.6, 0.7, 0.8, 0.9, round(current_conf, 2), round(recommended[0], 2)})
+    for i in np.searchsorted(c["conf"], np.array(shown) - 1e-9).tolist():
+        if i >= c["conf"].shape[0]:
+            continue
+        mark = " <- current" if abs(c["conf"][i] - current_conf) < 1e-6 else ""
+        mark += " <- recommended" if abs(c["conf"][i] - recommended[0]) < 1e-6 else ""
+        lines.append(f"{c['conf'][i]:>6.2f}{c['precision'][i]:>8.3f}{c['recall'][i]:>8.3f}{c['f1'][i]:>8.3f}"
+                     f"{c['trigger_pos'][i]:>14.1%}{c['trigger_neg'][i]:>12.1%}{mark}")
+    lines.append(f"Recommended --conf {recommended[0]:.2f}: {recommended[1]}")
+    return "\n".join(lines)
+
+
+def parse_args():
+    from inference_backends import BACKENDS
+
+    p = argparse.ArgumentParser(description="Evaluate the emergency model on a dataset split and recommend --conf")
+    p.add_argument("--model", type=str, required=True, help="YOLO checkpoint (.pt) to evaluate")
+    p.add_argument("--backend", choices=BACKENDS, default="torch", help="Evaluate the onnx/openvino export instead (default: torch)")
+    p.add_argument("--int8", action="store_true", help="Evaluate the INT8 quantized export")
+    p.add_argument("--data", type=str, default=DEFAULT_DATA_YAML, help="Dataset yaml")
+    p.add_argument("--split", type=str, default="val", help="Split to evaluate: train/val/test (default: val)")
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--batch", type=int, default=16, help="Images per model call (default: 16)")
+    p.add_argument("--classes", type=str, default="emergency", help="Comma-separated target classes that trigger GREEN (default: 'emergency')")
+    p.add_argument("--conf", type=float, default=0.75, help="Threshold currently deployed, marked in the table (default: 0.75)")
+    p.add_argument("--max-false-trigger", type=float, default=None,
+                   help="Recommend the lowest threshold that turns GREEN on at most this share of images without a target")
+    p.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR, help="Where decoded splits are kept")
+    p.add_argument("--curves", type=str, default=None, help="Write the per-threshold curves to this CSV")
+    p.add_argument("--json", type=str, default=None, help="Write the full report to this JSON file")
+    return p.parse_args()
+
+
+def main() -> None:
+    from inference_backends import load_backend
+
+    args = parse_args()
+    t0 = time.perf_counter()
+    split = load_split(args.data, args.split, args.imgsz, args.cache_dir)
+    t_load = time.perf_counter()
+    model = load_backend(args.model, args.backend, args.int8, args.data, args.imgsz)
+    if model is None:
+        raise SystemExit("Could not load the model (is ultralytics installed?)")
+    t_model = time.perf_counter()
+    pred = predict(model, split, args.batch)
+    t_pred = time.perf_counter()
+    names = [str(n) for n in load_data_yaml(args.data).get("names", [])]
+    report = evaluate(pred, split, names, [c.strip() for c in args.classes.split(",") if c.strip()])
+    recommended = recommend_conf(report, args.max_false_trigger)
+    t_eval = time.perf_counter()
+
+    print(format_report(report, args.conf, recommended))
+    print(f"Split load {t_load - t0:.2f} s, inference {t_pred - t_model:.2f} s "
+          f"({(t_pred - t_model) / max(len(split), 1) * 1000:.1f} ms/img), matching {(t_eval - t_pred) * 1000:.0f} ms")
+    if args.curves:
+        write_curves(args.curves, report)
+    if args.json:
+        report["recommended_conf"], report["recommended_reason"] = recommended
+        report["curve"] = {k: v.tolist() for k, v in report["curve"].items()}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
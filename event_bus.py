@@ -0,0 +1,318 @@
+"""Publish/subscribe bus for "emergency detected at node X" events.
+
+Detectors publish ``EmergencyEvent``s; signal controllers subscribe and actuate. Each event
+carries trace timestamps for capture, inference, decision and actuation, all taken from
+``time.monotonic()``, which is system-wide, so stamps from different processes on the same
+machine can be compared. Frame-to-green latency is ``actuation - capture``.
+
+``EventBus`` delivers in-process, synchronously on the publisher's thread. ``serve_bus``
+exposes a bus on a local socket (``multiprocessing.connection``, so it also works on
+Windows) and ``RemoteBus`` connects to it from another process with the same
+publish/subscribe interface. Events travel as JSON, never pickles.
+
+Any client that passes the connection handshake can publish GREEN, so the built-in key only
+protects loopback addresses. Binding to any other host requires a shared secret, given with
+``--bus-key`` or the SMART_TRAFFIC_BUS_KEY environment variable on every process.
+
+Usage (controller and detector in separate processes):
+  python demo_dashboard.py --bus-listen 127.0.0.1:6070
+  python detect_demo.py --bus 127.0.0.1:6070 --node 2
+  python event_bus.py --connect 127.0.0.1:6070   # print events and latency breakdowns
+"""
+import argparse
+import ipaddress
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+AUTHKEY = b"smart-traffic-bus"  # default for loopback only; it is public
+BUS_KEY_ENV = "SMART_TRAFFIC_BUS_KEY"
+STAGES = ("capture", "inference", "decision", "actuation")
+
+_seq = itertools.count(1)
+
+
+@dataclass
+class EmergencyEvent:
+    node: int
+    active: bool  # True: emergency vehicle detected, request GREEN; False: clear
+    source: str = ""
+    label: str = ""
+    conf: float = 0.0
+    kind: str = "detect"  # "detect" from detectors, "actuated" echoed back by controllers
+    seq: int = field(default_factory=lambda: next(_seq))
+    trace: Dict[str, float] = field(default_factory=dict)
+
+    def stamp(self, stage: str, t: Optional[float] = None) -> "EmergencyEvent":
+        self.trace[stage] = time.monotonic() if t is None else t
+        return self
+
+    def latency_ms(self) -> Dict[str, float]:
+        """Per-stage deltas plus frame-to-signal ("total") for the stages present."""
+        out: Dict[str, float] = {}
+        prev = None
+        for stage in STAGES:
+            t = self.trace.get(stage)
+            if t is None:
+                continue
+            if prev is not None:
+                out[f"{prev[0]}->{stage}"] = (t - prev[1]) * 1000.0
+            prev = (stage, t)
+        if "capture" in self.trace and prev is not None and prev[0] != "capture":
+            out["total"] = (prev[1] - self.trace["capture"]) * 1000.0
+        return out
+
+    def actuated(self) -> "EmergencyEvent":
+        """Copy of this event stamped with the actuation time, for echoing back on the bus."""
+        return EmergencyEvent(self.node, self.active, self.source, self.label, self.conf, "actuated",
+                              self.seq, dict(self.trace)).stamp("actuation")
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, text: str) -> "EmergencyEvent":
+        return cls(**json.loads(text))
+
+
+Handler = Callable[[EmergencyEvent], None]
+
+
+class EventBus:
+    def __init__(self) -> None:
+        self._subs: List[Tuple[Optional[int], Optional[str], Handler]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler: Handler, node: Optional[int] = None, kind: Optional[str] = "detect") -> Callable[[], None]:
+        """Call handler for events (of one node / kind, or all when None); returns an unsubscribe function."""
+        entry = (node, kind, handler)
+        with self._lock:
+            self._subs = self._subs + [entry]
+
+        def unsubscribe() -> None:
+            with self._lock:
+                self._subs = [s for s in self._subs if s is not entry]
+
+        return unsubscribe
+
+    def publish(self, event: EmergencyEvent) -> None:
+        for node, kind, handler in self._subs:  # copy-on-write list, no lock on the hot path
+            if (node is None or node == event.node) and (kind is None or kind == event.kind):
+                handler(event)
+
+
+def parse_address(spec: str) -> Tuple[str, int]:
+    host, port = spec.rsplit(":", 1)
+    return host, int(port)
+
+
+def bus_authkey(key: Optional[str] = None) -> Optional[bytes]:
+    """User-supplied secret from key or the environment, or None when there is none."""
+    key = key or os.environ.get(BUS_KEY_ENV)
+    return key.encode("utf-8") if key else None
+
+
+def is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback if host else False
+    except (OSError, ValueError):
+        return False
+
+
+def add_bus_key_arg(p) -> None:
+    p.add_argument("--bus-key", type=str, default=None,
+                   help=f"Shared secret for the event bus; required to listen on a non-loopback address (default: ${BUS_KEY_ENV})")
+
+
+class BusServer:
+    """Bridges a local EventBus to other processes: events received from any client are
+    published locally and forwarded to every other client, and local events go to all clients."""
+
+    def __init__(self, bus: EventBus, address: Tuple[str, int], authkey: Optional[bytes] = None) -> None:
+        """
+        bus: local bus to bridge
+        address: (host, port) to listen on
+        authkey: shared secret; without one only loopback addresses are accepted
+        """
+        if authkey is None:
+            if not is_loopback(address[0]):
+                raise ValueError(f"Refusing to serve the event bus on {address[0]!r} with the public default key; "
+                                 f"pass --bus-key or set {BUS_KEY_ENV}")
+            authkey = AUTHKEY
+        self.bus = bus
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self._clients: List[Connection] = []
+        self._lock = threading.Lock()
+        self._relaying = threading.local()
+        bus.subscribe(self._forward_local, kind=None)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                return  # listener closed
+            except Exception:
+                continue  # failed handshake
+            with self._lock:
+                self._clients.append(conn)
+            threading.Thread(target=self._client_loop, args=(conn,), daemon=True).start()
+
+    def _client_loop(self, conn: Connection) -> None:
+        try:
+            while True:
+                text = conn.recv_bytes().decode("utf-8")
+                self._send_all(text, skip=conn)
+                event = EmergencyEvent.from_json(text)
+                self._relaying.event = event  # already forwarded; don't send it again
+                try:
+                    self.bus.publish(event)
+                finally:
+                    self._relaying.event = None
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._lock:
+                if conn in self._clients:
+                    self._clients.remove(conn)
+            conn.close()
+
+    def _forward_local(self, event: EmergencyEvent) -> None:
+        if event is not getattr(self._relaying, "event", None):
+            self._send_all(event.to_json())
+
+    def _send_all(self, text: str, skip: Optional[Connection] = None) -> None:
+        data = text.encode("utf-8")
+        with self._lock:
+            clients = list(self._clients)
+        for conn in clients:
+            if conn is skip:
+                continue
+            try:
+                conn.send_bytes(data)
+            except OSError:
+                pass  # its reader thread notices and drops it
+
+    def close(self) -> None:
+        self.listener.close()
+        with self._lock:
+            for conn in self._clients:
+                conn.close()
+
+
+def serve_bus(bus: EventBus, spec: str, key: Optional[str] = None) -> BusServer:
+    return BusServer(bus, parse_address(spec), bus_authkey(key))
+
+
+class RemoteBus(EventBus):
+    """EventBus in another process: publish sends to the server, subscribers get every event
+    the server relays (from other clients or from the server's own process)."""
+
+    def __init__(self, spec: str, authkey: Optional[bytes] = None) -> None:
+        super().__init__()
+        self.conn = Client(parse_address(spec), authkey=authkey or AUTHKEY)
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._recv_loop, daemon=True).start()
+
+    def _recv_loop(self) -> None:
+        try:
+            while True:
+                super().publish(EmergencyEvent.from_json(self.conn.recv_bytes().decode("utf-8")))
+        except (EOFError, OSError):
+            pass
+
+    def publish(self, event: EmergencyEvent) -> None:
+        super().publish(event)  # local subscribers first, no round trip
+        data = event.to_json().encode("utf-8")
+        with self._send_lock:
+            self.conn.send_bytes(data)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def connect_bus(spec: Optional[str], key: Optional[str] = None) -> EventBus:
+    """RemoteBus for "host:port", or a fresh in-process bus when spec is empty."""
+    return RemoteBus(spec, bus_authkey(key)) if spec else EventBus()
+
+
+class LatencyTracker:
+    """Collects frame-to-signal latency from actuated events."""
+
+    def __init__(self, keep: int = 1000) -> None:
+        self.keep = keep
+        self.samples: List[Dict[str, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, event: EmergencyEvent) -> Dict[str, float]:
+        lat = event.latency_ms()
+        with self._lock:
+            self.samples.append(lat)
+            del self.samples[:-self.keep]
+        return lat
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            samples = list(self.samples)
+        keys = sorted({k for s in samples for k in s})
+        out = {}
+        for k in keys:
+            vals = np.array([s[k] for s in samples if k in s])
+            out[k] = {"n": int(vals.size), "p50": float(np.percentile(vals, 50)),
+                      "p95": float(np.percentile(vals, 95)), "max": float(vals.max())}
+        return out
+
+
+def format_latency(lat: Dict[str, float]) -> str:
+    return "  ".join(f"{k} {v:.1f} ms" for k, v in lat.items())
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Watch the emergency event bus and report frame-to-green latency")
+    p.add_argument("--connect", type=str, default=None, help="HOST:PORT of a running bus (e.g. the dashboard's --bus-listen)")
+    p.add_argument("--listen", type=str, default=None, help="Host the bus here instead (HOST:PORT)")
+    add_bus_key_arg(p)
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if not args.connect and not args.listen:
+        raise SystemExit("Pass --connect HOST:PORT or --listen HOST:PORT.")
+    bus = connect_bus(args.connect, args.bus_key) if args.connect else EventBus()
+    if args.listen:
+        try:
+            serve_bus(bus, args.listen, args.bus_key)
+        except ValueError as e:
+            raise SystemExit(str(e))
+    tracker = LatencyTracker()
+
+    def show(event: EmergencyEvent) -> None:
+        state = "EMERGENCY" if event.active else "clear"
+        line = f"[{event.kind}] node {event.node} {state} from {event.source or '?'} #{event.seq}"
+        if event.kind == "actuated":
+            line += "  " + format_latency(tracker.record(event))
+        print(line, flush=True)
+
+    bus.subscribe(show, kind=None)
+    try:
+        while True:
+            time.sleep(10.0)
+            for k, s in tracker.summary().items():
+                print(f"  {k:<22} n={s['n']:<5} p50 {s['p50']:.1f} ms  p95 {s['p95']:.1f} ms  max {s['max']:.1f} ms")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
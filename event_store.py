@@ -0,0 +1,442 @@
+"""Append-only columnar log of detections and signal changes, queried through memmaps.
+
+Every detection a camera produces and every signal change or distance reading the
+controllers see becomes one row:
+  ts (unix seconds), node, cls (class code, -1 for signal/distance rows), conf,
+  x1 y1 x2 y2 (box in frame pixels), signal (-1 unknown, 0 red, 1 green), distance (cm)
+
+Rows are collected in preallocated column buffers under a lock, so appending a frame's
+detections costs a few slice assignments. A writer thread flushes full buffers, or any
+pending rows every ``flush_s``, by appending each column to its own raw file in a UTC-hour
+partition. Every writer (one per process) owns its segment of the partition and its own
+class table, so several cameras and demos can share one ROOT:
+  ROOT/writers/<writer>.json              class names of that writer, list index = cls code
+  ROOT/2026-10-17T14/<writer>/ts.f8       node.i4  cls.i2  conf.f4  x1.f4 ... distance.f4
+
+Files are only ever appended to. Readers map them with ``np.memmap``, prune partitions by
+their hour, and take the shortest column as the row count, so a flush caught halfway
+through is simply not visible yet. Class codes are translated to one table across
+writers while scanning.
+
+Usage:
+  python detect_demo.py cam1.mp4 --store events/ --node 1
+  python event_store.py events/ summary
+  python event_store.py events/ peak-hours --classes car,truck,bus --since 2026-10-01
+  python event_store.py events/ preemptions --since 2026-10-17T08:00
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("ts", "<f8"), ("node", "<i4"), ("cls", "<i2"), ("conf", "<f4"),
+    ("x1", "<f4"), ("y1", "<f4"), ("x2", "<f4"), ("y2", "<f4"),
+    ("signal", "i1"), ("distance", "<f4"),
+)
+SIGNAL_UNKNOWN, SIGNAL_RED, SIGNAL_GREEN = -1, 0, 1
+NO_CLASS = -1
+WRITERS_DIR = "writers"
+PARTITION_FORMAT = "%Y-%m-%dT%H"
+
+
+def column_file(name: str, dtype: str) -> str:
+    return f"{name}.{np.dtype(dtype).kind}{np.dtype(dtype).itemsize}"
+
+
+def partition_name(hour: int) -> str:
+    return datetime.fromtimestamp(hour * 3600, tz=timezone.utc).strftime(PARTITION_FORMAT)
+
+
+def partition_hour(name: str) -> Optional[int]:
+    try:
+        return int(datetime.strptime(name, PARTITION_FORMAT).replace(tzinfo=timezone.utc).timestamp()) // 3600
+    except ValueError:
+        return None
+
+
+def _new_buffers(capacity: int) -> Dict[str, np.ndarray]:
+    return {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS}
+
+
+class EventWriter:
+    def __init__(self, root: str, capacity: int = 8192, flush_s: float = 1.0) -> None:
+        """
+        root: store directory (created if missing)
+        capacity: rows buffered before a flush is handed to the writer thread
+        flush_s: pending rows are flushed at least this often
+        """
+        self.root = root
+        os.makedirs(os.path.join(root, WRITERS_DIR), exist_ok=True)
+        self.capacity = capacity
+        self.flush_s = flush_s
+        # Unique among writers sharing root, across processes, threads and restarts
+        self.writer_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.classes: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._save_classes()
+        self._buf = _new_buffers(capacity)
+        self._n = 0
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=16)
+        self._repaired: set = set()
+        self.rows_written = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # -- hot path ------------------------------------------------------------------------
+    def _class_codes(self, labels) -> np.ndarray:
+        """Codes for a sequence of labels; unseen names are added to this writer's table (rare)."""
+        codes = self._codes
+        out = [codes.get(name) for name in labels]
+        if None in out:
+            for i, name in enumerate(labels):
+                if out[i] is None:
+                    out[i] = codes.get(name)
+                    if out[i] is None:
+                        out[i] = codes[name] = len(self.classes)
+                        self.classes.append(name)
+                        self._save_classes()
+        return np.array(out, dtype=np.int16)
+
+    def _save_classes(self) -> None:
+        path = classes_path(self.root, self.writer_id)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.classes, f)
+        os.replace(tmp, path)
+
+    def append_detections(self, node: int, dets, signal: int = SIGNAL_UNKNOWN, distance: float = float("nan"),
+                          ts: Optional[float] = None) -> None:
+        """One row per box of a detections.Detections, all stamped ts (default: now)."""
+        n = len(dets)
+        if n == 0:
+            return
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            cls = self._class_codes(dets.labels.tolist())
+            values = {"ts": ts, "node": node, "cls": cls, "conf": dets.conf, "x1": dets.xyxy[:, 0], "y1": dets.xyxy[:, 1],
+                      "x2": dets.xyxy[:, 2], "y2": dets.xyxy[:, 3], "signal": signal, "distance": distance}
+            full = self._append(n, values)
+        self._enqueue(full)
+
+    def append_state(self, node: int, signal: int, distance: float = float("nan"), conf: float = float("nan"),
+                     ts: Optional[float] = None) -> None:
+        """One signal-change / distance row for node."""
+        nan = float("nan")
+        values = {"ts": time.time() if ts is None else ts, "node": node, "cls": NO_CLASS, "conf": conf,
+                  "x1": nan, "y1": nan, "x2": nan, "y2": nan, "signal": signal, "distance": distance}
+        with self._lock:
+            full = self._append(1, values)
+        self._enqueue(full)
+
+    def _append(self, n: int, values: Dict) -> List[Dict[str, np.ndarray]]:
+        """Copy rows into the buffer (lock held); returns the buffers that filled up on the way."""
+        full = []
+        start = 0
+        while start < n:
+            if self._n == self.capacity:
+                full.append(self._take())
+            take = min(n - start, self.capacity - self._n)
+            for name, _ in COLUMNS:
+                v = values[name]
+                self._buf[name][self._n:self._n + take] = v[start:start + take] if isinstance(v, np.ndarray) else v
+            self._n += take
+            start += take
+        return full
+
+    def _take(self) -> Optional[Dict[str, np.ndarray]]:
+        """Swap out the filled rows and start a fresh buffer (lock held); None when empty."""
+        if not self._n:
+            return None
+        batch = {name: col[:self._n] for name, col in self._buf.items()}
+        self._buf = _new_buffers(self.capacity)
+        self._n = 0
+        return batch
+
+    def _enqueue(self, batches: List[Dict[str, np.ndarray]]) -> None:
+        """Hand batches to the writer thread, outside the lock: when the disk falls behind only
+        the appender that filled a buffer waits on the bounded queue, not every appender."""
+        for batch in batches:
+            self._queue.put(batch)
+
+    def flush(self) -> None:
+        with self._lock:
+            batch = self._take()
+        if batch is not None:
+            self._enqueue([batch])
+
+    # -- writer thread -------------------------------------------------------------------
+    def _run(self) -> None:
+        while True:
+            try:
+                batch = self._queue.get(timeout=self.flush_s)
+            except queue.Empty:
+                self.flush()
+                continue
+            if batch is None:
+                return
+            self._write(batch)
+
+    def _partition_dir(self, hour: int) -> str:
+        path = os.path.join(self.root, partition_name(hour), self.writer_id)
+        if path not in self._repaired:
+            os.makedirs(path, exist_ok=True)
+            repair_partition(path)
+            self._repaired.add(path)
+        return path
+
+    def _write(self, batch: Dict[str, np.ndarray]) -> None:
+        hours = (batch["ts"] // 3600).astype(np.int64)
+        for hour in np.unique(hours).tolist():
+            rows = hours == hour
+            whole = bool(rows.all())
+            path = self._partition_dir(hour)
+            for name, dtype in COLUMNS:
+                with open(os.path.join(path, column_file(name, dtype)), "ab") as f:
+                    f.write((batch[name] if whole else batch[name][rows]).tobytes())
+            self.rows_written += int(rows.sum())
+
+    def close(self) -> None:
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+
+def classes_path(root: str, writer_id: str) -> str:
+    return os.path.join(root, WRITERS_DIR, f"{writer_id}.json")
+
+
+def load_classes(root: str, writer_id: str) -> List[str]:
+    try:
+        with open(classes_path(root, writer_id), "r", encoding="utf-8") as f:
+            return list(json.load(f))
+    except FileNotFoundError:
+        return []
+
+
+def _column_rows(path: str, name: str, dtype: str) -> int:
+    try:
+        return os.path.getsize(os.path.join(path, column_file(name, dtype))) // np.dtype(dtype).itemsize
+    except FileNotFoundError:
+        return 0
+
+
+def repair_partition(path: str) -> int:
+    """Cut every column back to the shortest one, so rows stay aligned after an interrupted
+    flush. Returns the partition's row count."""
+    rows = min(_column_rows(path, name, dtype) for name, dtype in COLUMNS)
+    for name, dtype in COLUMNS:
+        file = os.path.join(path, column_file(name, dtype))
+        if os.path.exists(file) and os.path.getsize(file) > rows * np.dtype(dtype).itemsize:
+            with open(file, "r+b") as f:
+                f.truncate(rows * np.dtype(dtype).itemsize)
+    return rows
+
+
+def _translate(cls: np.ndarray, table: np.ndarray) -> np.ndarray:
+    """Map writer codes through table; NO_CLASS rows (and codes the table lacks) stay NO_CLASS."""
+    out = np.full(cls.shape, NO_CLASS, dtype=np.int16)
+    known = (cls >= 0) & (cls < table.shape[0])
+    out[known] = table[cls[known]]
+    return out
+
+
+class EventStore:
+    """Read side. Column arrays are memmaps (or slices of them) until a filter copies them."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        # Store-wide class table; each writer's codes are translated into it while scanning
+        self.classes: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def partitions(self, start: Optional[float] = None, end: Optional[float] = None) -> List[Tuple[int, str, str]]:
+        """(hour, segment path, writer id) of every writer segment overlapping [start, end)."""
+        parts = []
+        for name in sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []:
+            hour = partition_hour(name)
+            if hour is None:
+                continue
+            if start is not None and (hour + 1) * 3600 <= start:
+                continue
+            if end is not None and hour * 3600 >= end:
+                continue
+            folder = os.path.join(self.root, name)
+            for writer in sorted(os.listdir(folder)):
+                if os.path.isdir(os.path.join(folder, writer)):
+                    parts.append((hour, os.path.join(folder, writer), writer))
+        return parts
+
+    def _class_map(self, writer_id: str) -> np.ndarray:
+        """Writer class code -> store-wide code; re-read on every scan as live writers add names."""
+        names = load_classes(self.root, writer_id)
+        for name in names:
+            if name not in self._codes:
+                self._codes[name] = len(self.classes)
+                self.classes.append(name)
+        return np.array([self._codes[name] for name in names], dtype=np.int16)
+
+    def _open(self, path: str, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+        rows = min(_column_rows(path, name, dtype) for name, dtype in COLUMNS)
+        dtypes = dict(COLUMNS)
+        out = {}
+        for name in columns:
+            if rows == 0:
+                out[name] = np.zeros(0, dtype=dtypes[name])
+            else:
+                out[name] = np.memmap(os.path.join(path, column_file(name, dtypes[name])), dtype=dtypes[name], mode="r", shape=(rows,))
+        return out
+
+    def scan(self, start: Optional[float] = None, end: Optional[float] = None,
+             columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """Columns of all rows with start <= ts < end, in partition order."""
+        names = list(columns) if columns is not None else [name for name, _ in COLUMNS]
+        need = names if "ts" in names else names + ["ts"]
+        chunks: Dict[str, List[np.ndarray]] = {name: [] for name in names}
+        maps: Dict[str, np.ndarray] = {}
+        for hour, path, writer in self.partitions(start, end):
+            cols = self._open(path, need)
+            if "cls" in cols:
+                if writer not in maps:
+                    maps[writer] = self._class_map(writer)
+                cols["cls"] = _translate(cols["cls"], maps[writer])
+            # Only partitions cut by the range need a row filter
+            inner = (start is None or hour * 3600 >= start) and (end is None or (hour + 1) * 3600 <= end)
+            if inner:
+                for name in names:
+                    chunks[name].append(cols[name])
+                continue
+            ts = cols["ts"]
+            keep = np.ones(ts.shape[0], dtype=bool)
+            if start is not None:
+                keep &= ts >= start
+            if end is not None:
+                keep &= ts < end
+            for name in names:
+                chunks[name].append(cols[name][keep])
+        dtypes = dict(COLUMNS)
+        return {name: np.concatenate(parts) if parts else np.zeros(0, dtype=dtypes[name]) for name, parts in chunks.items()}
+
+    def class_codes(self, names: Iterable[str]) -> np.ndarray:
+        wanted = {n.strip().lower() for n in names}
+        return np.array([i for i, c in enumerate(self.classes) if c.lower() in wanted], dtype=np.int16)
+
+    def peak_hours(self, start: Optional[float] = None, end: Optional[float] = None,
+                   classes: Optional[Iterable[str]] = None, min_conf: float = 0.0,
+                   utc_offset_s: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Detections per node and local hour of day. Returns (nodes, counts[len(nodes), 24])."""
+        cols = self.scan(start, end, ("ts", "node", "cls", "conf"))
+        keep = cols["cls"] >= 0
+        if classes is not None:
+            keep &= np.isin(cols["cls"], self.class_codes(classes))
+        if min_conf > 0:
+            keep &= cols["conf"] >= min_conf
+        if utc_offset_s is None:
+            utc_offset_s = time.localtime().tm_gmtoff
+        hour = (((cols["ts"][keep] + utc_offset_s) // 3600) % 24).astype(np.int64)
+        nodes, inverse = np.unique(cols["node"][keep], return_inverse=True)
+        counts = np.bincount(inverse * 24 + hour, minlength=nodes.shape[0] * 24).reshape(nodes.shape[0], 24)
+        return nodes, counts
+
+    def preemptions(self, start: Optional[float] = None, end: Optional[float] = None) -> List[Dict]:
+        """GREEN intervals per node from the signal rows: node, start, end (None while still
+        green) and duration_s."""
+        cols = self.scan(start, end, ("ts", "node", "cls", "signal"))
+        rows = (cols["cls"] == NO_CLASS) & (cols["signal"] >= 0)
+        ts, node, sig = cols["ts"][rows], cols["node"][rows], cols["signal"][rows]
+        order = np.lexsort((ts, node))
+        ts, node, sig = ts[order], node[order], sig[order]
+        same = np.zeros(ts.shape[0], dtype=bool)
+        same[1:] = node[1:] == node[:-1]
+        prev = np.full(ts.shape[0], -1, dtype=np.int8)
+        prev[1:] = sig[:-1]
+        prev[~same] = -1
+        rises = np.flatnonzero((sig == SIGNAL_GREEN) & (prev != SIGNAL_GREEN))
+        falls = np.flatnonzero((sig == SIGNAL_RED) & (prev == SIGNAL_GREEN))
+        # Green and red alternate within a node, so a rise ends at the next fall if it is the same node
+        nxt = np.searchsorted(falls, rises)
+        out = []
+        for r, k in zip(rises.tolist(), nxt.tolist()):
+            f = falls[k] if k < falls.shape[0] and node[falls[k]] == node[r] else None
+            t_end = float(ts[f]) if f is not None else None
+            out.append({"node": int(node[r]), "start": float(ts[r]), "end": t_end,
+                        "duration_s": (t_end if t_end is not None else time.time()) - float(ts[r])})
+        return out
+
+    def summary(self) -> Dict:
+        cols = self.scan(columns=("ts", "node", "cls"))
+        det = cols["cls"] >= 0
+        per_class = np.bincount(cols["cls"][det].astype(np.int64), minlength=len(self.classes)) if det.any() else []
+        return {
+            "rows": int(cols["ts"].shape[0]),
+            "detections": int(det.sum()),
+            "signal_rows": int((~det).sum()),
+            "nodes": np.unique(cols["node"]).tolist(),
+            "first": float(cols["ts"].min()) if cols["ts"].size else None,
+            "last": float(cols["ts"].max()) if cols["ts"].size else None,
+            "partitions": len({hour for hour, _, _ in self.partitions()}),
+            "writers": len({writer for _, _, writer in self.partitions()}),
+            "classes": {self.classes[i]: int(n) for i, n in enumerate(per_class) if n},
+        }
+
+
+def add_store_args(p) -> None:
+    p.add_argument("--store", type=str, default=None, help="Append every detection and signal change to this event store directory (see event_store.py)")
+
+
+def parse_time(text: Optional[str]) -> Optional[float]:
+    """ISO date/time in local time (e.g. 2026-10-17 or 2026-10-17T08:00) to unix seconds."""
+    return datetime.fromisoformat(text).timestamp() if text else None
+
+
+def _fmt(ts: Optional[float]) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts is not None else "-"
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Query the detection/signal event store")
+    p.add_argument("root", help="Store directory written with --store")
+    p.add_argument("query", choices=["summary", "peak-hours", "preemptions"])
+    p.add_argument("--since", type=str, default=None, help="Start time, ISO format in local time")
+    p.add_argument("--until", type=str, default=None, help="End time, ISO format in local time")
+    p.add_argument("--classes", type=str, default=None, help="Comma-separated classes counted by peak-hours (default: all)")
+    p.add_argument("--min-conf", type=float, default=0.0, help="Minimum confidence counted by peak-hours")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    store = EventStore(args.root)
+    start, end = parse_time(args.since), parse_time(args.until)
+    t0 = time.perf_counter()
+    if args.query == "summary":
+        s = store.summary()
+        s["first"], s["last"] = _fmt(s["first"]), _fmt(s["last"])
+        print(json.dumps(s, indent=1))
+    elif args.query == "peak-hours":
+        classes = [c for c in args.classes.split(",") if c.strip()] if args.classes else None
+        nodes, counts = store.peak_hours(start, end, classes, args.min_conf)
+        print(f"{'node':>6}  {'peak hour':>9}  {'count':>8}  {'total':>9}")
+        for node, row in zip(nodes.tolist(), counts):
+            peak = int(row.argmax())
+            print(f"{node:>6}  {peak:>6}:00  {int(row[peak]):>8}  {int(row.sum()):>9}")
+    else:
+        spans = store.preemptions(start, end)
+        for s in spans:
+            print(f"node {s['node']:>4}  {_fmt(s['start'])} -> {_fmt(s['end'])}  {s['duration_s']:8.1f} s")
+        if spans:
+            d = np.array([s["duration_s"] for s in spans])
+            print(f"{len(spans)} preemptions, median {np.median(d):.1f} s, p95 {np.percentile(d, 95):.1f} s, total {d.sum():.0f} s")
+    print(f"({(time.perf_counter() - t0) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""CPU inference backends behind load_yolo / try_load_yolo.
+
+The PyTorch ``YOLO`` object stays the reference. For GPU-less roadside units the same
+checkpoint can be exported to ONNX (run by ONNX Runtime) or OpenVINO, optionally with INT8
+post-training quantization calibrated on the dataset's validation images. Exported models
+are loaded back through ``ultralytics.YOLO`` so callers keep the exact same call interface
+(``model(frame, verbose=False)[0].boxes``).
+
+Usage:
+  python inference_backends.py export --weights best.pt --backend openvino --int8
+  python inference_backends.py compare --weights best.pt --backends torch onnx openvino --int8
+"""
+import argparse
+import os
+from typing import Dict, List, Optional
+
+from dataset import DEFAULT_DATA_YAML, letterbox, split_images
+
+BACKENDS = ["torch", "onnx", "openvino"]
+
+
+def exported_path(weights: str, backend: str, int8: bool = False) -> str:
+    stem = os.path.splitext(weights)[0]
+    if backend == "onnx":
+        return f"{stem}_int8.onnx" if int8 else f"{stem}.onnx"
+    if backend == "openvino":
+        # ultralytics names the INT8 OpenVINO export directory *_int8_openvino_model
+        return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    return weights
+
+
+def _is_fresh(artifact: str, weights: str) -> bool:
+    return os.path.exists(artifact) and os.path.getmtime(artifact) >= os.path.getmtime(weights)
+
+
+def quantize_onnx_int8(fp32_path: str, data_yaml: str = DEFAULT_DATA_YAML, imgsz: int = 640,
+                       max_images: int = 200) -> str:
+    """Static INT8 quantization with ONNX Runtime, calibrated on the validation split."""
+    import cv2
+    import numpy as np
+    import onnx  # type: ignore
+    import onnxruntime as ort  # type: ignore
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static  # type: ignore
+
+    images = split_images(data_yaml, "val")[:max_images]
+    if not images:
+        raise RuntimeError(f"No validation images found for calibration via {data_yaml}")
+    input_name = ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class ValReader(CalibrationDataReader):
+        def __init__(self) -> None:
+            self._it = iter(images)
+
+        def get_next(self):
+            for path in self._it:
+                img = cv2.imread(path)
+                if img is None:
+                    continue
+                boxed, _, _ = letterbox(img, imgsz)
+                # Same preprocessing as ultralytics: BGR->RGB, HWC->CHW, 0..1
+                blob = boxed[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+                return {input_name: np.ascontiguousarray(blob)}
+            return None
+
+    int8_path = os.path.splitext(fp32_path)[0] + "_int8.onnx"
+    quantize_static(
+        fp32_path,
+        int8_path,
+        ValReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+    # Keep the class names / stride metadata ultralytics needs to load the model back
+    src, dst = onnx.load(fp32_path), onnx.load(int8_path)
+    del dst.metadata_props[:]
+    dst.metadata_props.extend(src.metadata_props)
+    onnx.save(dst, int8_path)
+    return int8_path
+
+
+def export_model(weights: str, backend: str, int8: bool = False, data_yaml: str = DEFAULT_DATA_YAML,
+                 imgsz: int = 640, force: bool = False) -> str:
+    """Export weights for backend and return the artifact path; reused while newer than weights."""
+    if backend == "torch":
+        return weights
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {BACKENDS}")
+    target = exported_path(weights, backend, int8)
+    if not force and _is_fresh(target, weights):
+        return target
+
+    from ultralytics import YOLO  # type: ignore
+
+    model = YOLO(weights)
+    if backend == "onnx":
+        fp32 = exported_path(weights, "onnx")
+        if force or not _is_fresh(fp32, weights):
+            fp32 = model.export(format="onnx", imgsz=imgsz, dynamic=False, simplify=True)
+        return quantize_onnx_int8(fp32, data_yaml, imgsz) if int8 else fp32
+    # OpenVINO runs its own NNCF calibration on the data.yaml val split when int8=True
+    kwargs = {"data": data_yaml} if int8 else {}
+    return model.export(format="openvino", imgsz=imgsz, int8=int8, **kwargs)
+
+
+def load_backend(weights: str, backend: str = "torch", int8: bool = False,
+                 data_yaml: str = DEFAULT_DATA_YAML, imgsz: int = 640) -> Optional[object]:
+    """Load weights on the requested backend; returns an object with the ``YOLO`` call interface."""
+    try:
+        from ultralytics import YOLO  # type: ignore
+    except Exception:
+        return None
+    try:
+        return YOLO(export_model(weights, backend, int8, data_yaml, imgsz), task="detect")
+    except Exception as e:
+        print(f"Backend {backend}{' int8' if int8 else ''} unavailable ({e}); using PyTorch.")
+        try:
+            return YOLO(weights)
+        except Exception:
+            return None
+
+
+def with_backend(model: Optional[object], backend: str = "torch", int8: bool = False,
+                 data_yaml: str = DEFAULT_DATA_YAML, imgsz: int = 640) -> Optional[object]:
+    """Swap an already loaded PyTorch model onto another backend (no-op for 'torch')."""
+    if model is None or backend == "torch":
+        return model
+    weights = getattr(model, "ckpt_path", None)
+    if not weights or not os.path.exists(weights):
+        print("Cannot export model without a local checkpoint; staying on PyTorch.")
+        return model
+    return load_backend(weights, backend, int8, data_yaml, imgsz) or model
+
+
+def compare_backends(weights: str, backends: List[str], int8: bool = False,
+                     data_yaml: str = DEFAULT_DATA_YAML, imgsz: int = 640) -> List[Dict]:
+    """Validate every backend on the val split; mAP and per-image latency relative to PyTorch."""
+    rows: List[Dict] = []
+    variants = [("torch", False)] + [(b, q) for b in backends if b != "torch" for q in ([False, True] if int8 else [False])]
+    for backend, quant in variants:
+        model = load_backend(weights, backend, quant, data_yaml, imgsz)
+        if model is None:
+            continue
+        metrics = model.val(data=data_yaml, imgsz=imgsz, batch=1, device="cpu", plots=False, verbose=False)  # type: ignore[attr-defined]
+        rows.append({
+            "backend": backend + (" int8" if quant else ""),
+            "map50": float(metrics.box.map50),
+            "map50_95": float(metrics.box.map),
+            "inference_ms": float(metrics.speed.get("inference", 0.0)),
+        })
+    if rows and rows[0]["backend"] == "torch":
+        ref = rows[0]
+        for r in rows:
+            r["d_map50"] = r["map50"] - ref["map50"]
+            r["speedup"] = ref["inference_ms"] / r["inference_ms"] if r["inference_ms"] else 0.0
+    return rows
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Export / compare CPU inference backends for the emergency model")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    export = sub.add_parser("export", help="Export (and optionally quantize) a checkpoint")
+    compare = sub.add_parser("compare", help="Report mAP and latency deltas against PyTorch")
+    for s in (export, compare):
+        s.add_argument("--weights", type=str, required=True, help="PyTorch checkpoint (.pt)")
+        s.add_argument("--data", type=str, default=DEFAULT_DATA_YAML, help="Dataset yaml used for INT8 calibration / validation")
+        s.add_argument("--imgsz", type=int, default=640)
+        s.add_argument("--int8", action="store_true", help="INT8 post-training quantization")
+    export.add_argument("--backend", choices=BACKENDS[1:], required=True)
+    export.add_argument("--force", action="store_true", help="Re-export even if an up-to-date artifact exists")
+    compare.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.cmd == "export":
+        print(export_model(args.weights, args.backend, args.int8, args.data, args.imgsz, force=args.force))
+        return
+    rows = compare_backends(args.weights, args.backends, args.int8, args.data, args.imgsz)
+    print(f"{'backend':<16}{'mAP50':>8}{'mAP50-95':>10}{'ms/img':>9}{'dmAP50':>9}{'speedup':>9}")
+    for r in rows:
+        print(f"{r['backend']:<16}{r['map50']:>8.3f}{r['map50_95']:>10.3f}{r['inference_ms']:>9.1f}"
+              f"{r.get('d_map50', 0.0):>+9.3f}{r.get('speedup', 1.0):>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
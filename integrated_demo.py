@@ -1,40 +1,49 @@
 import argparse
-import base64
-import os
-from typing import List, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
 import cv2
+import numpy as np
 import tkinter as tk
 from tkinter import filedialog, messagebox
 
+from detect_server import add_detect_key_arg, connect_detector
+from detections import Detections, extract_detections, target_mask
+from event_bus import EmergencyEvent, EventBus, LatencyTracker, add_bus_key_arg, connect_bus
+from event_store import SIGNAL_GREEN, SIGNAL_RED, EventWriter, add_store_args
+from inference_backends import BACKENDS, with_backend
+from metrics import StageMetrics, add_metrics_args, start_exporters
+from model_registry import MODEL_CANDIDATES, BackgroundLoader, load_model
+from overlay import draw_boxes as draw_box_group
+from roi_tiling import TiledDetector, add_roi_args, draw_zones, roi_from_args
+from siren_detector import AudioStream, FusedDecision, fuse
+from tracking import FrameVoter, parse_k_of_n
 
-def load_yolo(model_path: Optional[str]):
-    try:
-        from ultralytics import YOLO  # type: ignore
-    except Exception:
-        return None
+JOB_POLL_MS = 15  # how often the Tk thread checks for finished detection jobs
 
-    if model_path and os.path.exists(model_path):
-        try:
-            return YOLO(model_path)
-        except Exception:
-            return None
 
-    # Try some small public models as a convenience (may not include an ambulance class)
-    for ckpt in ["yolo11n.pt", "yolov10n.pt", "yolov8n.pt"]:
-        try:
-            return YOLO(ckpt)
-        except Exception:
-            continue
-    return None
+def load_yolo(model_path: Optional[str], backend: str = "torch", int8: bool = False):
+    # Falls back to small public models (may not include an ambulance class); the one that
+    # resolves is remembered so later launches skip the failed candidates
+    return with_backend(load_model(MODEL_CANDIDATES, model_path), backend, int8)
 
 
 def cv_to_photoimage(frame) -> tk.PhotoImage:
-    ok, buf = cv2.imencode('.png', frame)
-    if not ok:
-        raise RuntimeError("Failed to encode image for Tk")
-    data_b64 = base64.b64encode(buf.tobytes())
-    return tk.PhotoImage(data=data_b64)
+    """Hand an RGB uint8 array to Tk as binary PPM: a tiny header plus the raw pixel buffer,
+    with no PNG encode or base64 round-trip."""
+    h, w = frame.shape[:2]
+    if frame.ndim == 2:
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
+    header = f"P6 {w} {h} 255\n".encode("ascii")
+    return tk.PhotoImage(width=w, height=h, data=header + np.ascontiguousarray(frame).tobytes(), format="PPM")
+
+
+def draw_boxes(img, dets: Detections) -> None:
+    texts = [f"{label.lower() or 'obj'} {conf_v:.2f}" for label, conf_v in zip(dets.labels.tolist(), dets.conf.tolist())]
+    draw_box_group(img, dets.xyxy.astype(np.int32), (0, 255, 0), 2, texts)
 
 
 class TrafficPanel:
@@ -66,20 +75,77 @@ class TrafficPanel:
         self.red.itemconfig(1, fill="#f00")
         self.state_lbl.config(text="RED")
 
+    def follow(self, bus: EventBus, node: int) -> None:
+        """Actuate from emergency events for node on the bus; every actuation is echoed back
+        as an "actuated" event carrying the full trace."""
+        self.bus = bus
+        bus.subscribe(self._on_event, node=node)
+
+    def _on_event(self, event: EmergencyEvent) -> None:
+        if threading.current_thread() is not threading.main_thread():
+            self.frame.after(0, self._on_event, event)  # from a remote bus: hop onto the Tk thread
+            return
+        if event.active:
+            self.set_green()
+        else:
+            self.set_red()
+        self.frame.update_idletasks()  # actuation means the light is drawn, not just configured
+        self.bus.publish(event.actuated())
+
 
 class IntegratedApp:
-    def __init__(self, root: tk.Tk, model_path: Optional[str], target_classes: List[str], conf_threshold: float = 0.75) -> None:
+    def __init__(self, root: tk.Tk, model_path: Optional[str], target_classes: List[str], conf_threshold: float = 0.75,
+                 backend: str = "torch", int8: bool = False, confirm_k: int = 1, confirm_n: int = 1,
+                 bus: Optional[EventBus] = None, node: int = 1, metrics: Optional[StageMetrics] = None,
+                 roi: Optional[dict] = None, detect_server: Optional[str] = None, siren: Optional[str] = None,
+                 store: Optional[EventWriter] = None, detect_key: Optional[str] = None) -> None:
         self.root = root
         self.root.title("Integrated Detection + Traffic Signal Demo")
-        self.model = load_yolo(model_path)
+        # Model loads and warms up in the background while the window opens; with a detection
+        # server, the shared workers there do the inference instead
+        self.model = None
+        if detect_server:
+            self._model_loader = BackgroundLoader(lambda: connect_detector(detect_server, key=detect_key)).start()
+        else:
+            self._model_loader = BackgroundLoader(lambda: load_yolo(model_path, backend, int8)).start()
         self.target_classes = [c.strip().lower() for c in target_classes if c.strip()]
         self.conf_threshold = conf_threshold
+        # GREEN needs k positive runs out of the last n (1/1 = decide on the single image)
+        self.voter = FrameVoter(confirm_k, confirm_n)
+        # Decisions go out as events; the signal panel (or any other controller) subscribes
+        self.bus = bus if bus is not None else EventBus()
+        self.node = node
+        self.latency = LatencyTracker()
+        self.metrics = metrics or StageMetrics("integrated")
+        # Lane / stop-line zones (roi_from_args); detection then runs on tiles inside them
+        self.roi = roi
+        self.tiler: Optional[TiledDetector] = None
+        # Siren audio (WAV file or "mic"); its confidence is fused with the visual one
+        self.siren = AudioStream(siren).start() if siren else None
+        self.decision = FusedDecision(self.voter, conf_threshold)
+        if self.siren is not None and not self.decision.siren_can_trigger:
+            print(f"Warning: --conf {conf_threshold} is at or above the siren's weight ({self.decision.audio_weight}); "
+                  "the siren alone can never turn the signal GREEN.")
+        # Detections and decisions are appended to the event store for later queries
+        self.store = store
         # Cap preview size so the signal panel stays visible
         self.max_preview_w = 640
         self.max_preview_h = 480
         self.current_img_bgr = None
         self.current_img_disp: Optional[tk.Label] = None
         self.photo_ref: Optional[tk.PhotoImage] = None
+        # Scaled previews of the image on screen, keyed by (scale, interpolation), so zoom and
+        # fit toggles re-use earlier renders; cleared whenever a different image is shown
+        self._preview_src = None
+        self._preview_cache: "OrderedDict[tuple, tk.PhotoImage]" = OrderedDict()
+        self._preview_cache_size = 8
+        # One worker: the model is not safe to call from several threads at once. Jobs carry
+        # the generation they were submitted in; loading a new image bumps it. Finished jobs
+        # are picked up by polling on the Tk thread, which never touches Tk from the worker.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="detect")
+        self._jobs: List[Tuple[Future, int, EmergencyEvent]] = []
+        self._job_gen = 0
+        self._polling_jobs = False
 
         top = tk.Frame(root)
         top.pack(fill=tk.X, padx=10, pady=8)
@@ -91,12 +157,23 @@ class IntegratedApp:
         tk.Button(top, text="Run Detection", command=self._run_detection).pack(side=tk.LEFT, padx=(8, 0))
         # Fit-to-window toggle
         self.fit_to_window = tk.BooleanVar(value=True)
-        tk.Checkbutton(top, text="Fit to window", variable=self.fit_to_window).pack(side=tk.LEFT, padx=(12, 0))
+        tk.Checkbutton(top, text="Fit to window", variable=self.fit_to_window, command=self._refresh_preview).pack(side=tk.LEFT, padx=(12, 0))
         # Zoom slider (percentage)
         tk.Label(top, text="Zoom:").pack(side=tk.LEFT, padx=(12, 4))
         self.zoom_var = tk.DoubleVar(value=100.0)
-        zoom = tk.Scale(top, from_=50, to=200, orient=tk.HORIZONTAL, showvalue=True, variable=self.zoom_var, length=140)
+        zoom = tk.Scale(top, from_=50, to=200, orient=tk.HORIZONTAL, showvalue=True, variable=self.zoom_var, length=140,
+                        command=lambda _v: self._refresh_preview())
         zoom.pack(side=tk.LEFT)
+        self.model_status = tk.Label(top, text="Model: loading...", font=("Segoe UI", 9))
+        self.model_status.pack(side=tk.LEFT, padx=(12, 0))
+        self.job_status = tk.Label(top, text="In flight: 0  Queued: 0", font=("Segoe UI", 9))
+        self.job_status.pack(side=tk.LEFT, padx=(12, 0))
+        self.latency_status = tk.Label(top, text="Frame->green: --", font=("Segoe UI", 9))
+        self.latency_status.pack(side=tk.LEFT, padx=(12, 0))
+        self.siren_status = tk.Label(top, text="Siren: off" if siren is None else "Siren: --", font=("Segoe UI", 9))
+        self.siren_status.pack(side=tk.LEFT, padx=(12, 0))
+        self.metrics_status = tk.Label(root, text="", font=("Segoe UI", 9), anchor="w")
+        self.metrics_status.pack(fill=tk.X, padx=10)
 
         info = tk.Label(
             root,
@@ -120,12 +197,29 @@ class IntegratedApp:
 
         self.panel = TrafficPanel(body)
         self.panel.set_red()
+        self.panel.follow(self.bus, node)
+        self.bus.subscribe(self._on_actuated, node=node, kind="actuated")
+
+        self.root.after(100, self._poll_model_loader)
+        if self.siren is not None:
+            self.root.after(100, self._poll_siren)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
+    def _poll_model_loader(self) -> None:
+        if not self._model_loader.done():
+            self.root.after(100, self._poll_model_loader)
+            return
+        self.model = self._model_loader.get()
         if self.model is None:
+            self.model_status.config(text="Model: unavailable")
             messagebox.showwarning(
                 "YOLO not available",
                 "Ultralytics not installed or model not found. You can still load an image to show,"
                 " but detections won't run until YOLO is available.")
+        else:
+            if self.roi:
+                self.tiler = TiledDetector(self.model, **self.roi)
+            self.model_status.config(text="Model: ready")
 
     def _browse(self) -> None:
         fname = filedialog.askopenfilename(
@@ -140,13 +234,21 @@ class IntegratedApp:
             self._load_image(fname)
 
     def _load_image(self, path: str) -> None:
+        t = time.perf_counter()
         img = cv2.imread(path)
+        self.metrics.lap("read", t)
         if img is None:
             messagebox.showerror("Error", f"Failed to load image: {path}")
             return
+        self._cancel_stale_jobs()
         self.current_img_bgr = img
         self._update_preview(img)
-        self.panel.set_red()
+        self.decision.clear()
+        # A new image starts from RED; through the bus like every other signal change, so the
+        # panel, remote subscribers and the latency tracker all see it
+        event = EmergencyEvent(self.node, False, source="integrated_demo", label="new image").stamp("capture").stamp("decision")
+        self._record(event)
+        self.bus.publish(event)
 
     def _get_available_preview_size(self) -> tuple[int, int]:
         # Estimate available space for the preview image
@@ -178,13 +280,23 @@ class IntegratedApp:
             zoom_factor = max(0.1, min(self.zoom_var.get() / 100.0, 3.0))
             scale = max(min(base_scale * zoom_factor, 3.0), 0.1)
 
-        if abs(scale - 1.0) > 1e-3:
-            new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
-            interp = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
-            bgr_img = cv2.resize(bgr_img, (new_w, new_h), interpolation=interp)
-
-        rgb = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB)
-        photo = cv_to_photoimage(rgb)
+        interp = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+        if bgr_img is not self._preview_src:
+            self._preview_src = bgr_img
+            self._preview_cache.clear()
+        key = (round(scale, 3), interp)
+        photo = self._preview_cache.get(key)
+        if photo is None:
+            if abs(scale - 1.0) > 1e-3:
+                new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+                bgr_img = cv2.resize(bgr_img, (new_w, new_h), interpolation=interp)
+            rgb = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB)
+            photo = cv_to_photoimage(rgb)
+            self._preview_cache[key] = photo
+            if len(self._preview_cache) > self._preview_cache_size:
+                self._preview_cache.popitem(last=False)
+        else:
+            self._preview_cache.move_to_end(key)
         self.photo_ref = photo  # keep reference to avoid GC
         if self.current_img_disp is None:
             self.current_img_disp = tk.Label(self.preview, image=photo)
@@ -192,6 +304,10 @@ class IntegratedApp:
         else:
             self.current_img_disp.config(image=photo)
 
+    def _refresh_preview(self) -> None:
+        if self._preview_src is not None:
+            self._update_preview(self._preview_src)
+
     def _run_detection(self) -> None:
         path = self.path_var.get().strip()
         if not path:
@@ -203,45 +319,126 @@ class IntegratedApp:
                 return
 
         if self.model is None:
+            if not self._model_loader.done():
+                messagebox.showinfo("Model loading", "The YOLO model is still loading; try again in a moment.")
+                return
             messagebox.showwarning("YOLO not available", "Detections cannot run without a YOLO model.")
             return
 
+        # Inference runs on the worker thread; the Tk main loop keeps handling input
         img = self.current_img_bgr.copy()
+        gen = self._job_gen
+        event = EmergencyEvent(self.node, False, source="integrated_demo").stamp("capture")
+        future = self._executor.submit(self._detect_job, self.tiler or self.model, img, event, time.perf_counter())
+        self._jobs.append((future, gen, event))
+        self._update_job_status()
+        if not self._polling_jobs:
+            self._polling_jobs = True
+            self.root.after(JOB_POLL_MS, self._poll_jobs)
+
+    def _poll_jobs(self) -> None:
+        for job in [j for j in self._jobs if j[0].done()]:
+            self._finish_detection(*job)
+        if self._jobs:
+            self.root.after(JOB_POLL_MS, self._poll_jobs)
+        else:
+            self._polling_jobs = False
+
+    def _detect_job(self, model, img, event: EmergencyEvent, t_submit: float):
+        t = self.metrics.lap("queue", t_submit)
+        if isinstance(model, TiledDetector):
+            dets = model.detect(img)
+        else:
+            results = model(img, verbose=False)[0]  # type: ignore[operator]
+            dets = extract_detections(results, getattr(model, 'names', None))
+        event.stamp("inference")
+        t = self.metrics.lap("inference", t)
+        if self.store is not None:
+            self.store.append_detections(self.node, dets)
+        hits = target_mask(dets, self.target_classes, 0.0)
+        visual_conf = float(dets.conf[hits].max()) if hits.any() else 0.0
+        t = self.metrics.lap("postprocess", t)
+        if isinstance(model, TiledDetector):
+            draw_zones(img, model)
+        draw_boxes(img, dets)
+        self.metrics.lap("draw", t)
+        return img, visual_conf
+
+    def _finish_detection(self, future: Future, gen: int, event: EmergencyEvent) -> None:
+        self._jobs = [j for j in self._jobs if j[0] is not future]
+        self._update_job_status()
+        if future.cancelled() or gen != self._job_gen:
+            return  # a newer image was loaded after this job was submitted
         try:
-            results = self.model(img, verbose=False)[0]  # type: ignore[operator]
-            names = getattr(self.model, 'names', None)
+            img, visual_conf = future.result()
         except Exception as e:
             messagebox.showerror("Detection Error", str(e))
             return
 
-        detected_target = False
-        if hasattr(results, 'boxes'):
-            for box in results.boxes:  # type: ignore[attr-defined]
-                xyxy = getattr(box, 'xyxy', None)
-                cls = getattr(box, 'cls', None)
-                conf = getattr(box, 'conf', None)
-                if xyxy is None:
-                    continue
-                x1, y1, x2, y2 = map(int, xyxy[0].tolist())
-                cls_id = int(cls[0]) if cls is not None else -1
-                conf_v = float(conf[0]) if conf is not None else 0.0
-                label = None
-                if names and 0 <= cls_id < len(names):
-                    label = str(names[cls_id]).lower()
-
-                color = (0, 255, 0)
-                cv2.rectangle(img, (x1, y1), (x2, y2), color, 2)
-                cv2.putText(img, f"{label or 'obj'} {conf_v:.2f}", (x1, max(20, y1 - 8)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-
-                if label and self.target_classes:
-                    if label in self.target_classes and conf_v >= self.conf_threshold:
-                        detected_target = True
-        
+        t = time.perf_counter()
+        event.conf = self.decision.on_image(visual_conf, self.siren.confidence if self.siren is not None else 0.0)
+        event.active = self.decision.active
+        event.stamp("decision")
+        self._record(event)
         self._update_preview(img)
-        if detected_target:
-            self.panel.set_green()
-        else:
-            self.panel.set_red()
+        self.bus.publish(event)
+        self.metrics.lap("tk_update", t)
+        self.metrics_status.config(text=self.metrics.summary_line(("read", "queue", "inference", "postprocess", "draw", "tk_update")))
+
+    def _poll_siren(self) -> None:
+        """Audio runs continuously, so a siren can turn the signal GREEN (or release it)
+        between image runs. Only the audio is re-evaluated here; the image side stays at
+        the voter's last decision, so --confirm k/n still holds."""
+        det = self.siren.detector  # type: ignore[union-attr]
+        if det is not None:
+            self.siren_status.config(text=f"Siren: {det.confidence:.2f} {det.kind}".rstrip())
+            if self.decision.on_audio(det.confidence):
+                active = self.decision.active
+                conf = fuse(0.0, det.confidence)
+                event = EmergencyEvent(self.node, active, source="siren", label=f"siren:{det.kind}" if det.kind else "siren",
+                                       conf=conf).stamp("capture", det.updated).stamp("decision")
+                self._record(event)
+                self.bus.publish(event)
+        self.root.after(100, self._poll_siren)
+
+    def _record(self, event: EmergencyEvent) -> None:
+        if self.store is not None:
+            self.store.append_state(self.node, SIGNAL_GREEN if event.active else SIGNAL_RED, conf=event.conf)
+
+    def _on_actuated(self, event: EmergencyEvent) -> None:
+        if threading.current_thread() is not threading.main_thread():
+            self.root.after(0, self._on_actuated, event)  # from a remote bus: hop onto the Tk thread
+            return
+        lat = self.latency.record(event)
+        self.latency_status.config(text=f"Frame->green: {lat.get('total', 0.0):.1f} ms")
+
+    def _cancel_stale_jobs(self) -> None:
+        """Invalidate every submitted job; queued ones are cancelled, the running one is ignored."""
+        self._job_gen += 1
+        for f, _, _ in self._jobs:
+            f.cancel()
+        self._update_job_status()
+
+    @property
+    def in_flight(self) -> int:
+        return sum(1 for f, _, _ in self._jobs if f.running())
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for f, _, _ in self._jobs if not f.running() and not f.done())
+
+    def _update_job_status(self) -> None:
+        self._jobs = [j for j in self._jobs if not j[0].cancelled()]
+        self.job_status.config(text=f"In flight: {self.in_flight}  Queued: {self.queue_depth}")
+
+    def close(self) -> None:
+        if self.siren is not None:
+            self.siren.stop()
+        self._cancel_stale_jobs()
+        self._executor.shutdown(wait=False)
+        if self.store is not None:
+            self.store.close()
+        self.root.destroy()
 
 
 def parse_args():
@@ -249,13 +446,34 @@ def parse_args():
     p.add_argument("--model", type=str, default=None, help="Path to YOLO model .pt (recommended: custom model with 'ambulance' class)")
     p.add_argument("--classes", type=str, default="emergency", help="Comma-separated target class names to trigger green signal (default: 'emergency')")
     p.add_argument("--conf", type=float, default=0.75, help="Confidence threshold required to trigger green (default: 0.75)")
+    p.add_argument("--backend", choices=BACKENDS, default="torch", help="Inference backend; onnx/openvino export the model on first use (default: torch)")
+    p.add_argument("--int8", action="store_true", help="Use INT8 post-training quantization with the onnx/openvino backend")
+    p.add_argument("--detect-server", type=str, default=None, help="HOST:PORT of a running detect_server.py to use instead of loading a model here")
+    add_detect_key_arg(p)
+    p.add_argument("--confirm", type=str, default="1/1", help="Require k positive detections out of the last n runs before GREEN, as k/n (default: 1/1)")
+    p.add_argument("--bus", type=str, default=None, help="HOST:PORT of a running event bus (e.g. demo_dashboard --bus-listen) to publish decisions on")
+    add_bus_key_arg(p)
+    p.add_argument("--node", type=int, default=1, help="Intersection this detector reports for (default: 1)")
+    p.add_argument("--siren", type=str, default=None, help="Siren audio fused with the visual confidence: a WAV file (looped in real time) or 'mic'")
+    add_roi_args(p)
+    add_metrics_args(p)
+    add_store_args(p)
     return p.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
     classes = [c.strip() for c in args.classes.split(",")]
+    confirm_k, confirm_n = parse_k_of_n(args.confirm)
 
+    metrics = StageMetrics("integrated")
+    dumper = start_exporters(metrics, args)
     root = tk.Tk()
-    app = IntegratedApp(root, model_path=args.model, target_classes=classes, conf_threshold=args.conf)
+    app = IntegratedApp(root, model_path=args.model, target_classes=classes, conf_threshold=args.conf,
+                        backend=args.backend, int8=args.int8, confirm_k=confirm_k, confirm_n=confirm_n,
+                        bus=connect_bus(args.bus, args.bus_key), node=args.node, metrics=metrics, roi=roi_from_args(args),
+                        detect_server=args.detect_server, detect_key=args.detect_key, siren=args.siren,
+                        store=EventWriter(args.store) if args.store else None)
     root.mainloop()
+    if dumper is not None:
+        dumper.stop()
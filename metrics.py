@@ -0,0 +1,280 @@
+"""Low-overhead per-stage timing for the detection loops.
+
+Loops take laps with ``time.perf_counter()`` (monotonic) and record each stage into a
+fixed-bucket histogram, so recording costs a bisect and two increments and memory never
+grows. Snapshots can be served as Prometheus text (``serve_prometheus``), dumped to JSON
+periodically (``JsonDumper``), drawn on frames (``draw_hud``), and combined with an optional
+sampling profiler that shows where a slow stage spends its time.
+
+Typical loop:
+    t = time.perf_counter()
+    frame = read()
+    t = metrics.lap("read", t)
+    results = model(frame)
+    t = metrics.lap("inference", t)
+"""
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+
+# Upper bounds in ms; the last bucket catches everything slower
+BUCKETS_MS: Tuple[float, ...] = (0.25, 0.5, 1, 2, 5, 10, 20, 33, 50, 100, 200, 500, 1000, 2000, float("inf"))
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "total", "count", "max")
+
+    def __init__(self, bounds: Sequence[float] = BUCKETS_MS) -> None:
+        self.bounds = tuple(bounds)
+        self.counts = [0] * len(self.bounds)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.total += ms
+        self.count += 1
+        if ms > self.max:
+            self.max = ms
+
+    def quantile(self, q: float) -> float:
+        """Bucket-interpolated estimate of the q-quantile in ms."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, n in zip(self.bounds, self.counts):
+            if n and seen + n >= rank:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+            lower = bound
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class StageMetrics:
+    def __init__(self, name: str = "detect", fps_window: float = 1.0) -> None:
+        """
+        name: value of the "app" label in exported metrics
+        fps_window: seconds over which the frames-per-second gauge is averaged
+        """
+        self.name = name
+        self.stages: Dict[str, Histogram] = {}
+        self.started = time.monotonic()
+        self.frames = 0
+        self.fps = 0.0
+        self.profiler: Optional["SamplingProfiler"] = None
+        self._fps_window = fps_window
+        self._fps_t0 = time.perf_counter()
+        self._fps_frames = 0
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, ms: float) -> None:
+        with self._lock:
+            hist = self.stages.get(stage)
+            if hist is None:
+                hist = self.stages[stage] = Histogram()
+            hist.observe(ms)
+
+    def lap(self, stage: str, t0: float) -> float:
+        """Record perf_counter() - t0 under stage; returns the new timestamp for the next lap."""
+        t1 = time.perf_counter()
+        self.observe(stage, (t1 - t0) * 1000.0)
+        return t1
+
+    def frame_done(self, t_start: float) -> None:
+        """End of one loop iteration started at t_start: records "frame" and updates fps."""
+        now = self.lap("frame", t_start)
+        self.frames += 1
+        self._fps_frames += 1
+        if now - self._fps_t0 >= self._fps_window:
+            self.fps = self._fps_frames / (now - self._fps_t0)
+            self._fps_t0, self._fps_frames = now, 0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stages = {
+                name: {
+                    "count": h.count, "mean_ms": round(h.mean, 3), "p50_ms": round(h.quantile(0.5), 3),
+                    "p95_ms": round(h.quantile(0.95), 3), "p99_ms": round(h.quantile(0.99), 3), "max_ms": round(h.max, 3),
+                    "buckets": {("+Inf" if b == float("inf") else str(b)): c for b, c in zip(h.bounds, h.counts)},
+                }
+                for name, h in self.stages.items()
+            }
+        snap = {"app": self.name, "uptime_s": round(time.monotonic() - self.started, 1), "frames": self.frames,
+                "fps": round(self.fps, 2), "stages": stages}
+        if self.profiler is not None:
+            snap["profile"] = self.profiler.top()
+        return snap
+
+    def to_prometheus(self) -> str:
+        app = self.name
+        lines = [
+            "# HELP smart_traffic_stage_ms Time spent per loop stage in milliseconds",
+            "# TYPE smart_traffic_stage_ms histogram",
+        ]
+        with self._lock:
+            for stage, h in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, n in zip(h.bounds, h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f'smart_traffic_stage_ms_bucket{{app="{app}",stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'smart_traffic_stage_ms_sum{{app="{app}",stage="{stage}"}} {h.total:.3f}')
+                lines.append(f'smart_traffic_stage_ms_count{{app="{app}",stage="{stage}"}} {h.count}')
+        lines += [
+            "# TYPE smart_traffic_fps gauge",
+            f'smart_traffic_fps{{app="{app}"}} {self.fps:.2f}',
+            "# TYPE smart_traffic_frames_total counter",
+            f'smart_traffic_frames_total{{app="{app}"}} {self.frames}',
+        ]
+        return "\n".join(lines) + "\n"
+
+    def summary_line(self, stages: Optional[Sequence[str]] = None) -> str:
+        """One-line HUD text: fps plus p50 of each stage."""
+        parts = [f"{self.fps:.1f} FPS"] if self.frames else []
+        with self._lock:  # observe() may add a stage from another thread
+            for s in stages or [s for s in self.stages if s != "frame"]:
+                h = self.stages.get(s)
+                if h is not None and h.count:
+                    parts.append(f"{s} {h.quantile(0.5):.1f}")
+        return "  ".join(parts) + ("  (p50 ms)" if len(parts) > 1 else "")
+
+
+def draw_hud(frame, metrics: StageMetrics, stages: Optional[Sequence[str]] = None) -> None:
+    """FPS and per-stage p50 latency in the bottom-left corner of frame."""
+    text = metrics.summary_line(stages)
+    if not text:
+        return
+    h = frame.shape[0]
+    (tw, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+    cv2.rectangle(frame, (6, h - th - 16), (18 + tw, h - 6), (0, 0, 0), -1)
+    cv2.putText(frame, text, (12, h - 11), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1, cv2.LINE_AA)
+
+
+def serve_prometheus(metrics: StageMetrics, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /metrics.json on a daemon thread. Loopback by
+    default: the JSON includes profiler stack paths."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802 (http.server naming)
+            if self.path.startswith("/metrics.json"):
+                body, ctype = json.dumps(metrics.snapshot()).encode("utf-8"), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, ctype = metrics.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass  # scrapes would flood the console
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class JsonDumper:
+    """Write metrics.snapshot() to path every interval seconds (atomically replaced)."""
+
+    def __init__(self, metrics: StageMetrics, path: str, interval: float = 10.0) -> None:
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "JsonDumper":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def dump(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.metrics.snapshot(), f, indent=1)
+        os.replace(tmp, self.path)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.dump()
+
+
+class SamplingProfiler:
+    """Samples one thread's stack every interval seconds and counts the innermost frames.
+
+    Costs nothing on the sampled thread beyond the GIL hand-off; turn it on when a stage
+    regresses to see which functions it is spending time in.
+    """
+
+    def __init__(self, thread: Optional[threading.Thread] = None, interval: float = 0.005, depth: int = 3) -> None:
+        self.thread_id = (thread or threading.current_thread()).ident
+        self.interval = interval
+        self.depth = depth
+        self.samples: Counter = Counter()
+        self.total = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> "SamplingProfiler":
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame, limit=self.depth)
+            key = " <- ".join(f"{os.path.basename(fs.filename)}:{fs.lineno} {fs.name}" for fs in reversed(stack))
+            with self._lock:
+                self.samples[key] += 1
+                self.total += 1
+
+    def top(self, n: int = 10) -> List[Dict]:
+        with self._lock:  # the sampler thread inserts new stacks while exporters read
+            common, total = self.samples.most_common(n), self.total
+        return [{"stack": k, "share": round(v / total, 3)} for k, v in common] if total else []
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def add_metrics_args(p) -> None:
+    p.add_argument("--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port (/metrics, /metrics.json)")
+    p.add_argument("--metrics-host", type=str, default="127.0.0.1", help="Address to serve metrics on; 0.0.0.0 exposes them to the network (default: 127.0.0.1)")
+    p.add_argument("--metrics-json", type=str, default=None, help="Periodically dump per-stage metrics to this JSON file")
+    p.add_argument("--profile", action="store_true", help="Sample the main loop's stack and include the hottest frames in the metrics")
+
+
+def start_exporters(metrics: StageMetrics, args) -> Optional[JsonDumper]:
+    """Start whatever add_metrics_args options asked for; returns the JSON dumper to stop at exit."""
+    if args.profile:
+        metrics.profiler = SamplingProfiler().start()
+    if args.metrics_port:
+        serve_prometheus(metrics, args.metrics_port, args.metrics_host)
+        print(f"Metrics on http://{args.metrics_host}:{args.metrics_port}/metrics")
+    return JsonDumper(metrics, args.metrics_json).start() if args.metrics_json else None
@@ -0,0 +1,149 @@
+"""Model resolution cache and background loading for faster startup.
+
+``try_load_yolo``/``load_yolo`` walk a list of candidate checkpoints, and every failed
+candidate can cost a download attempt or a slow exception. The registry remembers which
+checkpoint resolved last time so the next launch loads it directly. ``BackgroundLoader``
+imports ultralytics, loads the model and runs one warm-up inference on a worker thread so
+the window and capture device can open in the meantime.
+"""
+import json
+import os
+import threading
+from typing import Callable, Optional, Sequence
+
+# Small public checkpoints tried in order when no explicit model is given
+MODEL_CANDIDATES = [
+    "yolo11n.pt",  # 2024+
+    "yolov10n.pt", # mid-2024
+    "yolov8n.pt",  # widely available
+]
+
+# Override with SMART_TRAFFIC_MODEL_REGISTRY to keep the cache somewhere else
+REGISTRY_PATH = os.environ.get(
+    "SMART_TRAFFIC_MODEL_REGISTRY",
+    os.path.join(os.path.expanduser("~"), ".cache", "smart_traffic", "model_registry.json"),
+)
+
+
+def _read_registry(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _write_registry(path: str, data: dict) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except Exception:
+        pass  # the cache is an optimization only
+
+
+def _key(candidates: Sequence[str]) -> str:
+    return "|".join(candidates)
+
+
+def cached_checkpoint(candidates: Sequence[str], registry_path: str = REGISTRY_PATH) -> Optional[str]:
+    """Checkpoint that resolved last time for this candidate list, if it is still on disk."""
+    path = _read_registry(registry_path).get(_key(candidates))
+    return path if path and os.path.exists(path) else None
+
+
+def remember_checkpoint(candidates: Sequence[str], checkpoint: str, registry_path: str = REGISTRY_PATH) -> None:
+    data = _read_registry(registry_path)
+    data[_key(candidates)] = checkpoint
+    _write_registry(registry_path, data)
+
+
+def forget_checkpoint(candidates: Sequence[str], registry_path: str = REGISTRY_PATH) -> None:
+    data = _read_registry(registry_path)
+    if data.pop(_key(candidates), None) is not None:
+        _write_registry(registry_path, data)
+
+
+def _resolved_path(model, ckpt: str) -> str:
+    # ultralytics downloads bare names into the working directory; store an absolute path
+    path = getattr(model, "ckpt_path", None) or ckpt
+    return os.path.abspath(path) if os.path.exists(path) else ckpt
+
+
+def load_model(candidates: Sequence[str], model_path: Optional[str] = None,
+               registry_path: str = REGISTRY_PATH) -> Optional[object]:
+    """Load model_path if it exists, else the cached checkpoint, else the first candidate that loads."""
+    try:
+        from ultralytics import YOLO  # type: ignore
+    except Exception:
+        return None
+
+    if model_path and os.path.exists(model_path):
+        try:
+            return YOLO(model_path)
+        except Exception:
+            return None
+
+    cached = cached_checkpoint(candidates, registry_path)
+    if cached:
+        try:
+            return YOLO(cached)
+        except Exception:
+            forget_checkpoint(candidates, registry_path)
+
+    for ckpt in candidates:
+        try:
+            model = YOLO(ckpt)
+        except Exception:
+            continue
+        remember_checkpoint(candidates, _resolved_path(model, ckpt), registry_path)
+        return model
+    return None
+
+
+def warm_up(model, imgsz: int = 640) -> None:
+    """One dummy inference so graph setup and allocations don't land on the first real frame."""
+    try:
+        import numpy as np
+
+        model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False)  # type: ignore[operator]
+    except Exception:
+        pass
+
+
+class BackgroundLoader:
+    """Load (and warm up) a model on a daemon thread; ``get()`` blocks until it is ready.
+
+    The warm-up runs on the loader thread before ``get()`` returns, so the model is never
+    called from two threads at once.
+    """
+
+    def __init__(self, load_fn: Callable[[], Optional[object]], warmup_imgsz: Optional[int] = 640) -> None:
+        self._load_fn = load_fn
+        self._warmup_imgsz = warmup_imgsz
+        self._model: Optional[object] = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "BackgroundLoader":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        try:
+            model = self._load_fn()
+            if model is not None and self._warmup_imgsz:
+                warm_up(model, self._warmup_imgsz)
+            self._model = model
+        finally:
+            self._done.set()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[object]:
+        self._done.wait(timeout)
+        return self._model
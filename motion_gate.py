@@ -0,0 +1,112 @@
+"""Cheap motion gate in front of the detector.
+
+Most of the time an intersection camera sees a static scene, so running the model on every
+frame is wasted work. ``MotionGate`` compares a small blurred grayscale copy of each frame
+against the last frame that was sent to the model, optionally only inside configured
+regions. Inference runs when enough pixels changed, or when ``max_skip_s`` has passed since
+the last inference.
+"""
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+Region = Tuple[float, float, float, float]  # x1, y1, x2, y2 as fractions of the frame
+
+
+class MotionGate:
+    def __init__(
+        self,
+        regions: Optional[Sequence[Region]] = None,
+        pixel_threshold: int = 25,
+        min_changed_fraction: float = 0.005,
+        max_skip_s: float = 1.0,
+        work_width: int = 160,
+        method: str = "diff",
+    ) -> None:
+        """
+        regions: fractional rectangles to watch (default: whole frame)
+        pixel_threshold: per-pixel gray-level change that counts as motion ("diff" method)
+        min_changed_fraction: fraction of watched pixels that must change to run inference
+        max_skip_s: force a full inference at least this often, even on a static scene
+        work_width: frames are downscaled to this width before comparison
+        method: "diff" (frame differencing) or "mog2" (background subtraction)
+        """
+        self.regions = list(regions) if regions else [(0.0, 0.0, 1.0, 1.0)]
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.max_skip_s = max_skip_s
+        self.work_width = work_width
+        self.method = method
+        self._mask: Optional[np.ndarray] = None
+        self._reference: Optional[np.ndarray] = None
+        self._candidate: Optional[np.ndarray] = None
+        self._last_run = 0.0
+        self._subtractor = cv2.createBackgroundSubtractorMOG2(history=200, detectShadows=False) if method == "mog2" else None
+        self.frames = 0
+        self.inferred = 0
+        self.last_changed_fraction = 0.0
+
+    def _prepare(self, frame) -> np.ndarray:
+        h, w = frame.shape[:2]
+        scale = self.work_width / float(w)
+        small = cv2.resize(frame, (self.work_width, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def _region_mask(self, shape: Tuple[int, int]) -> np.ndarray:
+        if self._mask is None or self._mask.shape != shape:
+            h, w = shape
+            mask = np.zeros(shape, dtype=bool)
+            for x1, y1, x2, y2 in self.regions:
+                mask[int(y1 * h):int(np.ceil(y2 * h)), int(x1 * w):int(np.ceil(x2 * w))] = True
+            self._mask = mask
+        return self._mask
+
+    def changed_fraction(self, frame) -> float:
+        gray = self._prepare(frame)
+        mask = self._region_mask(gray.shape)
+        if self._subtractor is not None:
+            moving = self._subtractor.apply(gray) > 0
+        elif self._reference is None or self._reference.shape != gray.shape:
+            moving = np.ones(gray.shape, dtype=bool)
+        else:
+            moving = cv2.absdiff(gray, self._reference) > self.pixel_threshold
+        self._candidate = gray
+        watched = int(mask.sum())
+        return float(np.count_nonzero(moving & mask)) / watched if watched else 0.0
+
+    def should_infer(self, frame, now: Optional[float] = None) -> bool:
+        """True if this frame should go to the model; otherwise reuse the last detections."""
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        self.last_changed_fraction = self.changed_fraction(frame)
+        run = (
+            self.last_changed_fraction >= self.min_changed_fraction
+            or now - self._last_run >= self.max_skip_s
+        )
+        if run:
+            # Compare future frames against what the model last saw, so slow drift still
+            # accumulates into a trigger instead of being absorbed frame by frame
+            self._reference = self._candidate
+            self._last_run = now
+            self.inferred += 1
+        return run
+
+    @property
+    def skip_ratio(self) -> float:
+        return 1.0 - self.inferred / self.frames if self.frames else 0.0
+
+
+def parse_regions(spec: Optional[str]) -> List[Region]:
+    """Parse 'x1,y1,x2,y2;x1,y1,x2,y2' (fractions of the frame) into regions."""
+    if not spec:
+        return []
+    regions: List[Region] = []
+    for part in spec.split(";"):
+        vals = [float(v) for v in part.split(",")]
+        if len(vals) != 4:
+            raise ValueError(f"Region needs 4 values x1,y1,x2,y2: {part!r}")
+        regions.append((vals[0], vals[1], vals[2], vals[3]))
+    return regions
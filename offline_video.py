@@ -0,0 +1,335 @@
+"""Headless offline processing of long recordings.
+
+The video is split into seek-aligned chunks of frames that are processed by a pool of
+worker processes, each with its own model. Workers send back only compact detections.
+The parent consumes chunks in order. It writes the detections timeline and runs the k-of-n
+emergency vote over the whole recording, so chunk boundaries don't split an event. If
+annotated output is requested, it decodes the source once more, draws the boxes and hands
+the frames to a background encoder thread.
+
+Usage:
+  python offline_video.py incident.mp4 --model best.pt --classes emergency --workers 8
+  python offline_video.py day.mp4 --model best.pt --stride 3 --out-video day_annotated.mp4 \\
+      --timeline day_detections.jsonl --events day_events.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from detections import Detections
+from tracking import FrameVoter, parse_k_of_n
+
+# Per-process state for pool workers
+_worker_model = None
+_worker_cfg: Dict = {}
+
+
+@dataclass
+class FrameResult:
+    frame: int
+    dets: Detections
+    hit: bool  # a target class above the confidence threshold
+
+
+def probe(path: str) -> Tuple[int, float, Tuple[int, int]]:
+    """(frame count, fps, (width, height)) of a video file."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open video {path!r}")
+    try:
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0) or 30.0
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    finally:
+        cap.release()
+    if frames <= 0:
+        raise SystemExit(f"{path!r} does not report a frame count; offline mode needs a seekable file")
+    return frames, fps, size
+
+
+def plan_chunks(total_frames: int, chunk_frames: int, stride: int = 1) -> List[Tuple[int, int]]:
+    """[start, end) frame ranges; starts are multiples of stride so inferred frames line up
+    with a single sequential pass."""
+    chunk_frames = max(stride, chunk_frames - chunk_frames % stride)
+    return [(s, min(s + chunk_frames, total_frames)) for s in range(0, total_frames, chunk_frames)]
+
+
+def seek(cap: cv2.VideoCapture, frame: int, preroll: int = 60) -> int:
+    """Position cap so the next read returns `frame`; returns the frame it landed on.
+
+    Some backends snap to a keyframe instead of the requested frame. If the position that
+    comes back is past the target, seek `preroll` frames earlier and decode forward.
+    """
+    if frame <= 0:
+        return 0
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+    pos = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    if pos > frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, frame - preroll))
+        pos = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    while pos < frame and cap.grab():
+        pos += 1
+    return pos
+
+
+def _init_worker(model_path: Optional[str], backend: str, int8: bool, target_classes: List[str], conf: float,
+                 threads: int) -> None:
+    global _worker_model, _worker_cfg
+    from inference_backends import with_backend
+    from model_registry import MODEL_CANDIDATES, load_model
+
+    # N processes each using every core would oversubscribe the CPU
+    cv2.setNumThreads(1)
+    try:
+        import torch  # type: ignore
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = with_backend(load_model(MODEL_CANDIDATES, model_path), backend, int8)
+    _worker_cfg = {"classes": target_classes, "conf": conf}
+
+
+def _process_chunk(job: Tuple[str, int, int, int, int]) -> List[FrameResult]:
+    from detections import extract_detections, target_mask
+
+    path, start, end, stride, batch = job
+    if _worker_model is None:
+        raise RuntimeError("model unavailable in worker")
+    names = getattr(_worker_model, "names", None)
+    cap = cv2.VideoCapture(path)
+    out: List[FrameResult] = []
+    try:
+        pos = seek(cap, start)
+        frames: List[np.ndarray] = []
+        idxs: List[int] = []
+
+        def flush() -> None:
+            for idx, results in zip(idxs, _worker_model(frames, verbose=False)):  # type: ignore[operator]
+                dets = extract_detections(results, names)
+                hit = bool(target_mask(dets, _worker_cfg["classes"], _worker_cfg["conf"]).any())
+                out.append(FrameResult(idx, dets, hit))
+            frames.clear()
+            idxs.clear()
+
+        while pos < end:
+            if (pos - start) % stride:
+                if not cap.grab():  # skipped frames are demuxed but never converted to BGR
+                    break
+            else:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                frames.append(frame)
+                idxs.append(pos)
+                if len(frames) >= batch:
+                    flush()
+            pos += 1
+        if frames:
+            flush()
+    finally:
+        cap.release()
+    return out
+
+
+class EncoderThread:
+    """Owns the VideoWriter; frames are handed over through a bounded queue so encoding
+    overlaps with decoding and drawing on the caller's thread."""
+
+    def __init__(self, path: str, fps: float, size: Tuple[int, int], fourcc: str = "mp4v", depth: int = 64) -> None:
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.writer.isOpened():
+            raise SystemExit(f"Could not open {path!r} for writing")
+        self.queue: "queue.Queue[Optional[np.ndarray]]" = queue.Queue(maxsize=depth)
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            self.writer.write(frame)
+            self.written += 1
+        self.writer.release()
+
+    def write(self, frame: np.ndarray) -> None:
+        self.queue.put(frame)  # blocks when the encoder falls behind, bounding memory
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self._thread.join()
+
+
+class EventTimeline:
+    """k-of-n emergency vote over inferred frames, collapsed into [start, end] intervals."""
+
+    def __init__(self, fps: float, k: int, n: int) -> None:
+        self.fps = fps
+        self.voter = FrameVoter(k, n)
+        self.events: List[Dict] = []
+        self._open: Optional[Dict] = None
+
+    def observe(self, r: FrameResult) -> bool:
+        active = self.voter.observe(r.hit)
+        if active:
+            conf = float(r.dets.conf.max()) if len(r.dets) else 0.0
+            if self._open is None:
+                self._open = {"start_frame": r.frame, "end_frame": r.frame, "peak_conf": conf}
+                self.events.append(self._open)
+            self._open["end_frame"] = r.frame
+            self._open["peak_conf"] = round(max(self._open["peak_conf"], conf), 4)
+        else:
+            self._open = None
+        return active
+
+    def to_json(self) -> List[Dict]:
+        return [dict(e, start_s=round(e["start_frame"] / self.fps, 2), end_s=round(e["end_frame"] / self.fps, 2))
+                for e in self.events]
+
+
+def _ordered_results(pool: ProcessPoolExecutor, jobs: List[Tuple], ahead: int) -> Iterator[List[FrameResult]]:
+    """Chunk results in order, keeping at most `ahead` chunks submitted at a time so a 24 h
+    recording doesn't queue thousands of futures up front."""
+    pending = []
+    it = iter(jobs)
+    for job in it:
+        pending.append(pool.submit(_process_chunk, job))
+        if len(pending) >= ahead:
+            break
+    while pending:
+        yield pending.pop(0).result()
+        job = next(it, None)
+        if job is not None:
+            pending.append(pool.submit(_process_chunk, job))
+
+
+def process_video(path: str, model_path: Optional[str] = None, target_classes: Optional[List[str]] = None,
+                  conf: float = 0.5, backend: str = "torch", int8: bool = False, workers: int = 0,
+                  chunk_seconds: float = 60.0, stride: int = 1, batch: int = 8, confirm: str = "3/5",
+                  timeline_path: Optional[str] = None, events_path: Optional[str] = None,
+                  out_video: Optional[str] = None) -> Dict:
+    from batch_detect import ResultWriter
+    from detect_demo import draw_banner, draw_detection_boxes
+    from model_registry import MODEL_CANDIDATES, load_model
+
+    total, fps, size = probe(path)
+    # Resolve the checkpoint once here, so workers load a known path and a missing model
+    # fails before the pool starts rather than inside every chunk
+    model = load_model(MODEL_CANDIDATES, model_path)
+    if model is None:
+        raise SystemExit("Ultralytics not installed or model not found; offline processing needs YOLO.")
+    model_path = getattr(model, "ckpt_path", None) or model_path
+    del model
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    chunks = plan_chunks(total, int(chunk_seconds * fps), stride)
+    jobs = [(path, s, e, stride, batch) for s, e in chunks]
+    k, n = parse_k_of_n(confirm)
+    timeline = EventTimeline(fps, k, n)
+    writer = ResultWriter(timeline_path) if timeline_path else None
+    encoder = EncoderThread(out_video, fps, size) if out_video else None
+    source = cv2.VideoCapture(path) if encoder else None
+    stats = {"frames": total, "chunks": len(chunks), "inferred": 0, "workers": workers}
+
+    t0 = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    threads = max(1, (os.cpu_count() or 2) // workers)
+    dets, active, next_frame = Detections.empty(), False, 0
+
+    def annotate_until(frame_idx: int) -> None:
+        """Decode, draw and queue source frames up to (not including) frame_idx."""
+        nonlocal next_frame
+        while next_frame < frame_idx:
+            ok, frame = source.read()  # type: ignore[union-attr]
+            if not ok:
+                next_frame = frame_idx  # short file: frame count was an estimate
+                return
+            draw_detection_boxes(frame, dets)
+            if active:
+                draw_banner(frame, "EMERGENCY VEHICLE DETECTED", color=(0, 0, 255))
+            encoder.write(frame)  # type: ignore[union-attr]
+            next_frame += 1
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(model_path, backend, int8, target_classes or ["emergency"], conf, threads)) as pool:
+        for results in _ordered_results(pool, jobs, ahead=workers * 2):
+            for r in results:
+                stats["inferred"] += 1
+                active_now = timeline.observe(r)
+                if writer is not None and (len(r.dets) or active_now != active):
+                    writer.write({
+                        "frame": r.frame, "t": round(r.frame / fps, 3), "emergency": active_now, "target_hit": r.hit,
+                        "boxes": [{"xyxy": [round(v, 1) for v in box], "label": label, "conf": round(c, 4)}
+                                  for box, label, c in zip(r.dets.xyxy.tolist(), r.dets.labels.tolist(), r.dets.conf.tolist())],
+                    })
+                if encoder is not None:
+                    # Frames between inferred ones keep showing the latest detections
+                    annotate_until(r.frame)
+                    dets = r.dets
+                active = active_now
+    if encoder is not None:
+        annotate_until(total)
+
+    if encoder is not None:
+        encoder.close()
+        source.release()  # type: ignore[union-attr]
+        stats["written"] = encoder.written
+    if writer is not None:
+        writer.close()
+    events = timeline.to_json()
+    if events_path:
+        with open(events_path, "w", encoding="utf-8") as f:
+            json.dump(events, f, indent=1)
+    elapsed = time.perf_counter() - t0
+    stats.update(events=len(events), seconds=round(elapsed, 2),
+                 realtime_factor=round((total / fps) / elapsed, 1) if elapsed > 0 else 0.0)
+    return stats
+
+
+def add_offline_args(p) -> None:
+    p.add_argument("--workers", type=int, default=0, help="Worker processes (default: CPU count - 1)")
+    p.add_argument("--chunk-seconds", type=float, default=60.0, help="Length of each chunk handed to a worker (default: 60)")
+    p.add_argument("--stride", type=int, default=1, help="Run the model on every Nth frame (default: 1)")
+    p.add_argument("--batch", type=int, default=8, help="Frames per model call inside a worker (default: 8)")
+
+
+def parse_args():
+    from inference_backends import BACKENDS
+
+    p = argparse.ArgumentParser(description="Headless parallel detection over a recorded video")
+    p.add_argument("video", type=str)
+    p.add_argument("--model", type=str, default=None, help="Path to YOLO model .pt")
+    p.add_argument("--backend", choices=BACKENDS, default="torch")
+    p.add_argument("--int8", action="store_true")
+    p.add_argument("--classes", type=str, default="emergency", help="Comma-separated target class names (default: 'emergency')")
+    p.add_argument("--conf", type=float, default=0.5, help="Confidence threshold for a target hit (default: 0.5)")
+    p.add_argument("--confirm", type=str, default="3/5", help="An emergency event needs k of the last n inferred frames, as k/n (default: 3/5)")
+    add_offline_args(p)
+    p.add_argument("--timeline", type=str, default=None, help="Per-frame detections (.jsonl or .parquet)")
+    p.add_argument("--events", type=str, default=None, help="Emergency intervals as JSON")
+    p.add_argument("--out-video", type=str, default=None, help="Annotated output video (.mp4)")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    classes = [c.strip() for c in args.classes.split(",") if c.strip()]
+    stats = process_video(args.video, args.model, classes, args.conf, args.backend, args.int8, args.workers,
+                          args.chunk_seconds, args.stride, args.batch, args.confirm,
+                          args.timeline, args.events, args.out_video)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
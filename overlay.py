@@ -0,0 +1,43 @@
+"""Overlay drawing shared by the detection demos.
+
+``draw_banner`` blends only the banner strip instead of copying and blending the whole
+frame, and ``draw_boxes`` draws all boxes of one style with a single ``cv2.polylines`` call
+instead of one ``cv2.rectangle`` per detection.
+"""
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+Color = Tuple[int, int, int]
+
+
+@lru_cache(maxsize=32)
+def _solid_strip(h: int, w: int, color: Color) -> np.ndarray:
+    strip = np.empty((h, w, 3), dtype=np.uint8)
+    strip[:] = color
+    return strip
+
+
+def draw_banner(frame, text: str, color: Color = (0, 0, 255), height: int = 51, alpha: float = 0.35) -> None:
+    """Translucent strip across the top of frame with text on it; only the strip is touched."""
+    h = min(height, frame.shape[0])
+    roi = frame[:h]
+    cv2.addWeighted(_solid_strip(h, frame.shape[1], tuple(color)), alpha, roi, 1 - alpha, 0, dst=roi)
+    cv2.putText(frame, text, (12, 32), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2, cv2.LINE_AA)
+
+
+def draw_boxes(frame, boxes: np.ndarray, color: Color, thickness: int = 2, labels: Optional[Sequence[str]] = None,
+               label_scale: float = 0.6) -> None:
+    """Draw (N, 4) integer xyxy boxes of one style in a single call, with optional labels
+    placed above each box like the demos always did."""
+    if len(boxes) == 0:
+        return
+    b = np.asarray(boxes, dtype=np.int32)
+    # Each box as a closed 4-point polyline, the same path cv2.rectangle draws
+    corners = np.stack([b[:, [0, 1]], b[:, [2, 1]], b[:, [2, 3]], b[:, [0, 3]]], axis=1)
+    cv2.polylines(frame, list(corners), True, color, thickness)
+    if labels is not None:
+        for (x1, y1), label in zip(b[:, :2].tolist(), labels):
+            cv2.putText(frame, label, (x1, max(20, y1 - 8)), cv2.FONT_HERSHEY_SIMPLEX, label_scale, color, 2)
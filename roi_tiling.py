@@ -0,0 +1,292 @@
+"""Per-camera lane and stop-line zones, with tiled inference inside them.
+
+Sending a whole 4K frame to the model lets its letterbox shrink it to 640 px, so a distant
+ambulance ends up a few pixels wide, and the sky and sidewalks are paid for too. Instead,
+each camera lists the polygons that matter (approach lanes, stop-line zones). The bounding
+rectangle of every zone is cut into overlapping model-sized tiles at native resolution. The
+tiles go through the model as one batch. Boxes are shifted back into frame coordinates, kept
+only if their ground point (bottom centre) lies in a zone, and de-duplicated across tiles
+with class-aware NMS.
+
+Config file (JSON), polygon points as fractions of the frame. Where zones overlap, the one
+listed first wins, so list stop-line zones before the approach lanes that contain them:
+  {
+    "cam_north": {
+      "tile": 640, "overlap": 0.2,
+      "zones": [
+        {"name": "stop line", "kind": "stopline", "polygon": [[0.1, 0.85], [0.9, 0.85], [0.9, 1.0], [0.1, 1.0]]},
+        {"name": "northbound", "kind": "approach", "polygon": [[0.35, 0.3], [0.6, 0.3], [0.9, 1.0], [0.1, 1.0]]}
+      ]
+    }
+  }
+"""
+import json
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from detections import Detections, extract_detections
+
+Rect = Tuple[int, int, int, int]  # x1, y1, x2, y2 in pixels, exclusive end
+
+ZONE_KINDS = ("approach", "stopline")
+ZONE_COLORS = {"approach": (255, 200, 0), "stopline": (0, 0, 255)}
+SEAM_MARGIN = 2.0  # pixels from a tile edge at which a box counts as cut by it
+
+
+@dataclass(frozen=True)
+class Zone:
+    name: str
+    kind: str  # one of ZONE_KINDS
+    polygon: Tuple[Tuple[float, float], ...]  # fractions of the frame
+
+    def pixels(self, w: int, h: int) -> np.ndarray:
+        """(K, 2) int32 polygon in pixel coordinates of a w x h frame."""
+        pts = np.asarray(self.polygon, dtype=np.float64) * (w, h)
+        return np.round(pts).astype(np.int32)
+
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """Fractional bounding rectangle, the same form as motion_gate regions."""
+        pts = np.asarray(self.polygon, dtype=np.float64)
+        x1, y1 = pts.min(axis=0)
+        x2, y2 = pts.max(axis=0)
+        return float(x1), float(y1), float(x2), float(y2)
+
+
+def load_roi_config(path: str, camera: Optional[str] = None) -> Tuple[List[Zone], Dict]:
+    """Zones and tiling options (tile, overlap) for one camera of the config file. camera may
+    be omitted when the file describes a single camera."""
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if camera is None:
+        if len(config) != 1:
+            raise ValueError(f"{path} describes cameras {sorted(config)}; pick one with --camera")
+        camera = next(iter(config))
+    if camera not in config:
+        raise ValueError(f"Camera {camera!r} not found in {path} (have {sorted(config)})")
+    entry = config[camera]
+    zones: List[Zone] = []
+    for z in entry.get("zones", []):
+        kind = z.get("kind", "approach")
+        if kind not in ZONE_KINDS:
+            raise ValueError(f"Zone {z.get('name')!r}: kind must be one of {ZONE_KINDS}, got {kind!r}")
+        poly = tuple((float(x), float(y)) for x, y in z["polygon"])
+        if len(poly) < 3:
+            raise ValueError(f"Zone {z.get('name')!r} needs at least 3 polygon points")
+        zones.append(Zone(str(z.get("name", f"zone{len(zones) + 1}")), kind, poly))
+    if not zones:
+        raise ValueError(f"Camera {camera!r} in {path} has no zones")
+    options = {k: entry[k] for k in ("tile", "overlap") if k in entry}
+    return zones, options
+
+
+def tile_starts(length: int, tile: int, overlap: float) -> List[int]:
+    """Start offsets of windows of size tile covering [0, length) with at least overlap * tile
+    shared between neighbours, spread evenly so the last window ends exactly at length."""
+    if length <= tile:
+        return [0]
+    step = max(1, int(tile * (1.0 - overlap)))
+    n = math.ceil((length - tile) / step) + 1
+    return np.round(np.linspace(0, length - tile, n)).astype(int).tolist()
+
+
+def plan_tiles(rect: Rect, tile: int, overlap: float) -> List[Rect]:
+    x1, y1, x2, y2 = rect
+    w, h = x2 - x1, y2 - y1
+    return [
+        (x1 + sx, y1 + sy, x1 + sx + min(tile, w), y1 + sy + min(tile, h))
+        for sy in tile_starts(h, tile, overlap)
+        for sx in tile_starts(w, tile, overlap)
+    ]
+
+
+def nms(xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, iou_threshold: float = 0.5,
+        tile_ids: Optional[np.ndarray] = None, tile_rects: Optional[np.ndarray] = None,
+        on_seam: Optional[np.ndarray] = None, seam_iou: float = 0.5) -> Tuple[np.ndarray, np.ndarray]:
+    """Class-aware greedy NMS across tiles, highest confidence first.
+
+    Returns the kept indices and their boxes. A vehicle cut by tile edges shows up as
+    fragments from several tiles, which overlap by area rather than by IoU. Given each box's
+    tile, the tile rectangles and whether a box touches a seam (a tile edge inside the frame),
+    two boxes from different tiles are the same object when, cropped to the region both tiles
+    see, they agree with seam_iou. The kept box grows into the union of its group, and the
+    search repeats until no further fragment joins. Boxes from the same tile are never merged,
+    since the model has already separated those.
+    """
+    n = xyxy.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 4), dtype=np.float32)
+    order = np.argsort(-conf, kind="stable")
+    b = xyxy[order].astype(np.float32)
+    c = cls[order]
+    merging = tile_ids is not None and tile_rects is not None
+    if merging:
+        t = tile_ids[order]
+        rects = tile_rects.astype(np.float32)
+        seam = on_seam[order] if on_seam is not None else np.ones(n, dtype=bool)
+    area = (b[:, 2] - b[:, 0]).clip(0) * (b[:, 3] - b[:, 1]).clip(0)
+
+    def iou_with(box: np.ndarray, others: np.ndarray) -> np.ndarray:
+        iw = (np.minimum(box[..., 2], others[:, 2]) - np.maximum(box[..., 0], others[:, 0])).clip(0)
+        ih = (np.minimum(box[..., 3], others[:, 3]) - np.maximum(box[..., 1], others[:, 1])).clip(0)
+        inter = iw * ih
+        a = (box[..., 2] - box[..., 0]).clip(0) * (box[..., 3] - box[..., 1]).clip(0)
+        o = (others[:, 2] - others[:, 0]).clip(0) * (others[:, 3] - others[:, 1]).clip(0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.nan_to_num(inter / (a + o - inter))
+
+    def clip(boxes: np.ndarray, region: np.ndarray) -> np.ndarray:
+        return np.concatenate([np.maximum(boxes[:, :2], region[:, :2]), np.minimum(boxes[:, 2:], region[:, 2:])], axis=1)
+
+    suppressed = np.zeros(n, dtype=bool)
+    keep: List[int] = []
+    boxes: List[np.ndarray] = []
+    for i in range(n):
+        if suppressed[i]:
+            continue
+        suppressed[i] = True
+        same = c == c[i]
+        members = [i]
+        if merging:
+            frontier = [i]
+            while frontier:
+                k = frontier.pop()
+                cand = np.flatnonzero(same & ~suppressed & (t != t[k]) & (seam | seam[k]))
+                if cand.size == 0:
+                    continue
+                # Region seen by both tiles; a cut object looks the same there from either side
+                shared = clip(rects[t[cand]], rects[np.full(cand.size, t[k])])
+                agree = iou_with(clip(b[k][None].repeat(cand.size, 0), shared), clip(b[cand], shared)) > seam_iou
+                # Members of one tile stay distinct objects
+                joined = [j for j in cand[agree].tolist() if t[j] not in {t[m] for m in members}]
+                suppressed[joined] = True
+                members.extend(joined)
+                frontier.extend(joined)
+        box = np.concatenate([b[members, :2].min(axis=0), b[members, 2:].max(axis=0)])
+        suppressed |= (iou_with(box, b) > iou_threshold) & same
+        keep.append(i)
+        boxes.append(box)
+    return order[keep], np.stack(boxes)
+
+
+class _Layout:
+    """Tiles and zone lookup for one frame size."""
+
+    def __init__(self, zones: Sequence[Zone], w: int, h: int, tile: int, overlap: float) -> None:
+        # zone_map[y, x] is the index of the first listed zone covering that pixel, or -1
+        self.zone_map = np.full((h, w), -1, dtype=np.int16)
+        self.polygons = [z.pixels(w, h) for z in zones]
+        for i in reversed(range(len(zones))):
+            cv2.fillPoly(self.zone_map, [self.polygons[i]], i)
+        covered = self.zone_map >= 0
+        tiles = set()
+        for poly in self.polygons:
+            x, y, bw, bh = cv2.boundingRect(poly)
+            rect = (max(0, x), max(0, y), min(w, x + bw), min(h, y + bh))
+            for t in plan_tiles(rect, tile, overlap):
+                if covered[t[1]:t[3], t[0]:t[2]].any():
+                    tiles.add(t)
+        self.tiles: List[Rect] = sorted(tiles, key=lambda t: (t[1], t[0]))
+        self.offsets = np.array([[x1, y1, x1, y1] for x1, y1, _, _ in self.tiles], dtype=np.float32).reshape(-1, 4)
+        # Per tile, which of its left / top / right / bottom edges lie inside the frame (seams)
+        self.seams = np.array([[x1 > 0, y1 > 0, x2 < w, y2 < h] for x1, y1, x2, y2 in self.tiles], dtype=bool).reshape(-1, 4)
+        self.rects = np.array(self.tiles, dtype=np.float32).reshape(-1, 4)
+        self.sizes = np.array([[x2 - x1, y2 - y1] for x1, y1, x2, y2 in self.tiles], dtype=np.float32).reshape(-1, 2)
+
+
+class TiledDetector:
+    def __init__(self, model: object, zones: Sequence[Zone], tile: int = 640, overlap: float = 0.2,
+                 iou_threshold: float = 0.5, names=None) -> None:
+        """
+        model: callable like ultralytics YOLO, accepting a list of images
+        zones: regions to search; detections outside every zone are dropped
+        tile: tile edge in frame pixels (640 runs the model at native resolution)
+        overlap: fraction of a tile shared with its neighbour, so objects on a seam are whole in one tile
+        iou_threshold: cross-tile NMS threshold
+        """
+        self.model = model
+        self.zones = list(zones)
+        self.tile = tile
+        self.overlap = overlap
+        self.iou_threshold = iou_threshold
+        self.names = names if names is not None else getattr(model, "names", None)
+        self._layouts: Dict[Tuple[int, int], _Layout] = {}
+        self.zone_ids = np.zeros(0, dtype=np.int16)  # zone index per box of the last detect()
+
+    def layout(self, frame) -> _Layout:
+        h, w = frame.shape[:2]
+        lay = self._layouts.get((w, h))
+        if lay is None:
+            lay = self._layouts[(w, h)] = _Layout(self.zones, w, h, self.tile, self.overlap)
+        return lay
+
+    def detect(self, frame) -> Detections:
+        """Run the model on the zone tiles of frame and merge the boxes in frame coordinates."""
+        lay = self.layout(frame)
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in lay.tiles]
+        results = self.model(crops, verbose=False)  # type: ignore[operator]
+        parts = [extract_detections(r, self.names) for r in results]
+        counts = [len(d) for d in parts]
+        if not sum(counts):
+            self.zone_ids = np.zeros(0, dtype=np.int16)
+            return Detections.empty()
+        local = np.concatenate([d.xyxy for d in parts])
+        tile_ids = np.repeat(np.arange(len(parts)), counts)
+        xyxy = local + lay.offsets[tile_ids]
+        # A box reaching a seam of its tile may be a fragment of an object cut by that edge
+        size = lay.sizes[tile_ids]
+        edges = np.stack([local[:, 0] <= SEAM_MARGIN, local[:, 1] <= SEAM_MARGIN,
+                          local[:, 2] >= size[:, 0] - SEAM_MARGIN, local[:, 3] >= size[:, 1] - SEAM_MARGIN], axis=1)
+        on_seam = (edges & lay.seams[tile_ids]).any(axis=1)
+        dets = Detections(xyxy, np.concatenate([d.cls for d in parts]), np.concatenate([d.conf for d in parts]),
+                          np.concatenate([d.labels for d in parts]))
+        # Ground point of each box decides which zone a vehicle is in
+        h, w = lay.zone_map.shape
+        gx = ((xyxy[:, 0] + xyxy[:, 2]) * 0.5).astype(np.int32).clip(0, w - 1)
+        gy = xyxy[:, 3].astype(np.int32).clip(0, h - 1)
+        zone_ids = lay.zone_map[gy, gx]
+        inside = zone_ids >= 0
+        dets, zone_ids = dets.select(inside), zone_ids[inside]
+        keep, boxes = nms(dets.xyxy, dets.conf, dets.cls, self.iou_threshold,
+                          tile_ids=tile_ids[inside], tile_rects=lay.rects, on_seam=on_seam[inside])
+        self.zone_ids = zone_ids[keep]
+        dets = dets.select(keep)
+        dets.xyxy = boxes
+        return dets
+
+    def kind_mask(self, kind: str) -> np.ndarray:
+        """Which boxes of the last detect() are in a zone of this kind."""
+        kinds = np.array([z.kind == kind for z in self.zones], dtype=bool)
+        return kinds[self.zone_ids] if self.zone_ids.size else np.zeros(0, dtype=bool)
+
+    def polygons(self, frame) -> List[np.ndarray]:
+        return self.layout(frame).polygons
+
+
+def draw_zones(frame, tiler: TiledDetector) -> None:
+    """Outline the zones the tiled detector searches, one colour per kind."""
+    for kind, color in ZONE_COLORS.items():
+        polys = [p for p, z in zip(tiler.polygons(frame), tiler.zones) if z.kind == kind]
+        if polys:
+            cv2.polylines(frame, polys, True, color, 1)
+
+
+def add_roi_args(p) -> None:
+    p.add_argument("--roi-config", type=str, default=None, help="JSON file of per-camera lane/stop-line polygons; only tiles inside them are sent to the model")
+    p.add_argument("--camera", type=str, default=None, help="Camera entry to use from --roi-config (default: the only one)")
+    p.add_argument("--tile", type=int, default=None, help="Tile size in frame pixels for --roi-config (default: config value or 640)")
+    p.add_argument("--tile-overlap", type=float, default=None, help="Overlap between neighbouring tiles (default: config value or 0.2)")
+
+
+def roi_from_args(args) -> Optional[Dict]:
+    """TiledDetector keyword arguments (zones, tile, overlap) for the add_roi_args options,
+    or None when no ROI config was given."""
+    if not args.roi_config:
+        return None
+    zones, options = load_roi_config(args.roi_config, args.camera)
+    tile = args.tile or int(options.get("tile", 640))
+    overlap = args.tile_overlap if args.tile_overlap is not None else float(options.get("overlap", 0.2))
+    return {"zones": zones, "tile": tile, "overlap": overlap}
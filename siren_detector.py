@@ -0,0 +1,377 @@
+"""Streaming acoustic siren detection, fused with the camera's emergency decision.
+
+The README's RSU measures siren frequencies and alerts when they fall in the yelp or wail
+range. This is the same idea on a microphone (or a WAV file). Samples go into a ring buffer.
+Every hop, the complete frames are windowed and transformed with a single ``np.fft.rfft``
+call over the whole block. Each frame is reduced to a few numbers:
+  - the share of energy in the siren band (500-1800 Hz by default)
+  - how far the strongest band bin stands above the band median (a siren is one loud tone)
+  - the frequency of that bin
+Those go into a second ring covering the last ``window_s`` seconds. Confidence is the
+fraction of tonal in-band frames over the last ``attack_s`` of that ring, scaled by how far
+the tone has swept across the whole ring. A siren
+sweeps several hundred Hz; a horn or reversing beeper holds one pitch. The sweep rate
+separates yelp (several cycles per second) from wail (one cycle every few seconds).
+
+Confidence updates every hop (32 ms at 16 kHz), so the audio path typically raises an alert
+seconds before the vehicle is in view. ``fuse`` combines it with the visual confidence.
+
+Usage:
+  python siren_detector.py clip.wav                 # timeline of siren confidence
+  python siren_detector.py --synth yelp --seconds 6 # synthetic check, no file needed
+  python siren_detector.py --mic                    # live, needs the sounddevice package
+"""
+import argparse
+import threading
+import time
+import wave
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+YELP_MIN_RATE_HZ = 1.5  # sweep cycles per second above which a siren counts as yelp
+
+
+class SirenDetector:
+    def __init__(self, sample_rate: int = 16000, band: Tuple[float, float] = (500.0, 1800.0), window_s: float = 2.0,
+                 attack_s: float = 0.5, frame_s: float = 0.064, peak_ratio: float = 8.0, band_share: float = 0.3, min_sweep_hz: float = 150.0,
+                 silence_rms: float = 1e-3) -> None:
+        """
+        sample_rate: Hz of the samples passed to feed()
+        band: siren fundamental range in Hz (yelp and wail both sweep inside it)
+        window_s: seconds of pitch track used for the sweep range and yelp/wail rate
+        attack_s: confidence is the tonal share of the last attack_s seconds, so it rises and
+            falls this quickly
+        frame_s: FFT frame length (rounded to a power of two); the hop is half of it
+        peak_ratio: band peak power over band median power for a frame to count as tonal
+        band_share: minimum share of the frame's energy inside the band
+        min_sweep_hz: frequency range the tone has to sweep before confidence rises
+        silence_rms: frames quieter than this (samples in -1..1) are ignored
+        """
+        self.sample_rate = sample_rate
+        self.frame = 1 << max(6, int(round(np.log2(sample_rate * frame_s))))
+        self.hop = self.frame // 2
+        self.peak_ratio = peak_ratio
+        self.band_share = band_share
+        self.min_sweep_hz = min_sweep_hz
+        self.silence_rms = silence_rms
+        self._window = np.hanning(self.frame).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.frame, 1.0 / sample_rate)
+        self._band = (freqs >= band[0]) & (freqs <= band[1])
+        self._band_freqs = freqs[self._band]
+        self._audible = (freqs >= 100.0) & (freqs <= 5000.0)
+        # Sample ring: unprocessed tail plus room for one feed() block, grown on demand
+        self._samples = np.zeros(self.frame * 4, dtype=np.float32)
+        self._fill = 0
+        # Feature ring: one entry per hop over the confidence window
+        n = max(4, int(round(window_s * sample_rate / self.hop)))
+        self._recent = max(3, min(n, int(round(attack_s * sample_rate / self.hop))))
+        self._tonal = np.zeros(n, dtype=bool)
+        self._peak_hz = np.zeros(n, dtype=np.float32)
+        self._pos = 0
+        self._seen = 0
+        self.confidence = 0.0
+        self.kind = ""  # "yelp", "wail" or "" when no siren
+        self.mean_hz = 0.0  # average siren frequency over the window, as the RSU reports it
+        self.updated = 0.0  # time.monotonic() of the last confidence update
+
+    def feed(self, samples: np.ndarray) -> float:
+        """Append mono samples (float in -1..1 or int16) and update confidence for every
+        complete hop. Returns the current confidence in 0..1."""
+        x = np.asarray(samples)
+        if x.dtype == np.int16:
+            x = x.astype(np.float32) / 32768.0
+        x = x.astype(np.float32, copy=False).reshape(-1)
+        need = self._fill + x.size
+        if need > self._samples.size:
+            grown = np.zeros(max(need, self._samples.size * 2), dtype=np.float32)
+            grown[:self._fill] = self._samples[:self._fill]
+            self._samples = grown
+        self._samples[self._fill:need] = x
+        self._fill = need
+        if self._fill < self.frame:
+            return self.confidence
+        count = (self._fill - self.frame) // self.hop + 1
+        frames = np.lib.stride_tricks.sliding_window_view(self._samples[:self._fill], self.frame)[::self.hop][:count]
+        self._push(*self._features(frames))
+        # Keep the samples the next frame still needs at the front of the ring
+        used = count * self.hop
+        rest = self._fill - used
+        self._samples[:rest] = self._samples[used:self._fill]
+        self._fill = rest
+        self._update()
+        return self.confidence
+
+    def _features(self, frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Tonal-in-band flag and peak frequency per frame, all frames in one FFT call."""
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2
+        band = power[:, self._band]
+        peak_idx = band.argmax(axis=1)
+        peak = band[np.arange(band.shape[0]), peak_idx]
+        median = np.median(band, axis=1) + 1e-12
+        share = band.sum(axis=1) / (power[:, self._audible].sum(axis=1) + 1e-12)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        tonal = (peak / median >= self.peak_ratio) & (share >= self.band_share) & (rms >= self.silence_rms)
+        return tonal, self._band_freqs[peak_idx].astype(np.float32)
+
+    def _push(self, tonal: np.ndarray, peak_hz: np.ndarray) -> None:
+        n = self._tonal.shape[0]
+        if tonal.shape[0] >= n:
+            tonal, peak_hz = tonal[-n:], peak_hz[-n:]
+        idx = (self._pos + np.arange(tonal.shape[0])) % n
+        self._tonal[idx] = tonal
+        self._peak_hz[idx] = peak_hz
+        self._pos = int((self._pos + tonal.shape[0]) % n)
+        self._seen = min(n, self._seen + tonal.shape[0])
+
+    def _update(self) -> None:
+        self.updated = time.monotonic()
+        n = self._tonal.shape[0]
+        order = (self._pos + np.arange(n)) % n  # oldest first
+        tonal = self._tonal[order][-self._seen:]
+        hz = self._peak_hz[order][-self._seen:][tonal]
+        if hz.size < 3:
+            self.confidence, self.kind, self.mean_hz = 0.0, "", 0.0
+            return
+        sweep = float(np.percentile(hz, 95) - np.percentile(hz, 5))
+        sweep_score = min(1.0, max(0.0, (sweep - self.min_sweep_hz) / (2.0 * self.min_sweep_hz)))
+        self.confidence = float(tonal[-self._recent:].mean()) * sweep_score
+        self.mean_hz = float(hz.mean())
+        if self.confidence <= 0.0:
+            self.kind = ""
+            return
+        # Direction reversals of the (lightly smoothed) pitch track give the sweep rate
+        smooth = np.convolve(hz, np.ones(3) / 3.0, mode="valid")
+        steps = np.sign(np.diff(smooth))
+        steps = steps[steps != 0]
+        reversals = int(np.count_nonzero(steps[1:] != steps[:-1]))
+        seconds = hz.size * self.hop / self.sample_rate
+        self.kind = "yelp" if reversals / 2.0 / seconds >= YELP_MIN_RATE_HZ else "wail"
+
+
+def fuse(visual_conf: float, audio_conf: float, audio_weight: float = 0.9) -> float:
+    """Emergency confidence from both senses, as a noisy-OR: either one alone can carry it
+    past the threshold, and two moderate ones reinforce each other. Audio alone tops out at
+    audio_weight, so a siren by itself never passes a threshold above that."""
+    return 1.0 - (1.0 - visual_conf) * (1.0 - audio_weight * audio_conf)
+
+
+class FusedDecision:
+    """GREEN/RED from k-of-n voted image runs plus the continuous siren confidence.
+
+    Each image run votes with its fused confidence. Between runs only the audio part is
+    re-evaluated: the siren alone can raise or hold GREEN, but the last image's visual
+    confidence never bypasses the voter.
+    """
+
+    def __init__(self, voter, threshold: float, audio_weight: float = 0.9) -> None:
+        """
+        voter: tracking.FrameVoter (anything with observe(bool) -> bool)
+        threshold: fused confidence needed for GREEN (--conf)
+        audio_weight: trust in the siren; also the most the siren alone can reach
+        """
+        self.voter = voter
+        self.threshold = threshold
+        self.audio_weight = audio_weight
+        self.voted = False  # the voter's decision after the last image run
+        self.active = False
+
+    @property
+    def siren_can_trigger(self) -> bool:
+        """False when the threshold is out of reach of even a certain siren."""
+        return self.threshold < self.audio_weight
+
+    def _audio_only(self, audio_conf: float) -> bool:
+        return fuse(0.0, audio_conf, self.audio_weight) >= self.threshold
+
+    def on_image(self, visual_conf: float, audio_conf: float = 0.0) -> float:
+        """Record an image run; returns the fused confidence it voted with."""
+        conf = fuse(visual_conf, audio_conf, self.audio_weight)
+        self.voted = self.voter.observe(conf >= self.threshold)
+        self.active = self.voted or self._audio_only(audio_conf)
+        return conf
+
+    def on_audio(self, audio_conf: float) -> bool:
+        """Re-evaluate with a new siren confidence; True when the decision changed."""
+        active = self.voted or self._audio_only(audio_conf)
+        changed = active != self.active
+        self.active = active
+        return changed
+
+    def clear(self) -> None:
+        """A new image is on screen: nothing has been voted for it yet, and earlier images'
+        votes must not count towards it."""
+        self.voter.reset()
+        self.voted = False
+        self.active = False
+
+
+def read_wav(path: str) -> Tuple[np.ndarray, int]:
+    """Mono float32 samples in -1..1 and the sample rate of a PCM WAV file."""
+    with wave.open(path, "rb") as w:
+        sr, width, channels = w.getframerate(), w.getsampwidth(), w.getnchannels()
+        raw = w.readframes(w.getnframes())
+    if width == 1:
+        x = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        x = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        x = (b[:, 0].astype(np.int32) | (b[:, 1].astype(np.int32) << 8) | (b[:, 2].astype(np.int8).astype(np.int32) << 16)) / 8388608.0
+    elif width == 4:
+        x = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"{path}: unsupported sample width {width}")
+    x = np.asarray(x, dtype=np.float32).reshape(-1, channels).mean(axis=1)
+    return x, sr
+
+
+def synth_siren(kind: str, seconds: float, sample_rate: int = 16000, noise: float = 0.05, seed: int = 0) -> np.ndarray:
+    """Test signal: a yelp or wail sweep between 650 and 1500 Hz with a few harmonics over
+    white noise; "noise" gives noise only and "horn" a steady 440 Hz tone."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    rng = np.random.default_rng(seed)
+    x = noise * rng.standard_normal(t.size)
+    if kind in ("yelp", "wail"):
+        rate = 4.0 if kind == "yelp" else 0.25
+        f = 1075.0 + 425.0 * np.sin(2 * np.pi * rate * t)
+        phase = 2 * np.pi * np.cumsum(f) / sample_rate
+        x += 0.5 * np.sin(phase) + 0.15 * np.sin(2 * phase) + 0.08 * np.sin(3 * phase)
+    elif kind == "horn":
+        x += 0.5 * np.sin(2 * np.pi * 440.0 * t) + 0.2 * np.sin(2 * np.pi * 880.0 * t)
+    return x.astype(np.float32)
+
+
+def blocks(samples: np.ndarray, sample_rate: int, block_s: float = 0.02) -> Iterator[np.ndarray]:
+    size = max(1, int(sample_rate * block_s))
+    for start in range(0, samples.size, size):
+        yield samples[start:start + size]
+
+
+class AudioStream:
+    """Feeds a SirenDetector from a WAV file (played back in real time, looping) or the
+    default microphone on a daemon thread; on_update gets the detector after each block."""
+
+    def __init__(self, source: str, detector_kwargs: Optional[dict] = None, block_s: float = 0.02,
+                 on_update: Optional[Callable[[SirenDetector], None]] = None) -> None:
+        self.source = source
+        self.block_s = block_s
+        self.on_update = on_update
+        self._detector_kwargs = detector_kwargs or {}
+        self.detector: Optional[SirenDetector] = None
+        self._stop = threading.Event()
+
+    def start(self) -> "AudioStream":
+        if self.source == "mic":
+            self._start_mic()
+        else:
+            samples, sr = read_wav(self.source)
+            self.detector = SirenDetector(sr, **self._detector_kwargs)
+            threading.Thread(target=self._play, args=(samples, sr), daemon=True).start()
+        return self
+
+    def _play(self, samples: np.ndarray, sr: int) -> None:
+        next_t = time.perf_counter()
+        while not self._stop.is_set():
+            for block in blocks(samples, sr, self.block_s):
+                if self._stop.is_set():
+                    return
+                self._feed(block)
+                next_t += block.size / sr
+                delay = next_t - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def _start_mic(self, sample_rate: int = 16000) -> None:
+        try:
+            import sounddevice as sd  # type: ignore
+        except ImportError:
+            raise SystemExit("Microphone input needs the sounddevice package (pip install sounddevice)")
+        self.detector = SirenDetector(sample_rate, **self._detector_kwargs)
+        stream = sd.InputStream(samplerate=sample_rate, channels=1, dtype="float32",
+                                blocksize=int(sample_rate * self.block_s), callback=lambda data, *_: self._feed(data[:, 0]))
+        stream.start()
+        self._mic = stream
+
+    def _feed(self, block: np.ndarray) -> None:
+        self.detector.feed(block)  # type: ignore[union-attr]
+        if self.on_update is not None:
+            self.on_update(self.detector)  # type: ignore[arg-type]
+
+    @property
+    def confidence(self) -> float:
+        return self.detector.confidence if self.detector is not None else 0.0
+
+    def stop(self) -> None:
+        self._stop.set()
+        mic = getattr(self, "_mic", None)
+        if mic is not None:
+            mic.stop()
+            mic.close()
+
+
+def scan(samples: np.ndarray, sample_rate: int, threshold: float = 0.5, block_s: float = 0.02,
+         **detector_kwargs) -> Tuple[List[Tuple[float, float, str]], float]:
+    """Run the detector over a whole recording as if streamed. Returns (start_s, end_s, kind)
+    intervals with confidence >= threshold, and the processing time per audio second."""
+    det = SirenDetector(sample_rate, **detector_kwargs)
+    intervals: List[Tuple[float, float, str]] = []
+    start: Optional[float] = None
+    kind = ""
+    t = 0.0
+    t0 = time.perf_counter()
+    for block in blocks(samples, sample_rate, block_s):
+        conf = det.feed(block)
+        t += block.size / sample_rate
+        if conf >= threshold:
+            if start is None:
+                start = t
+            kind = det.kind or kind  # settles once a few sweep cycles are in the window
+        elif start is not None:
+            intervals.append((start, t, kind))
+            start, kind = None, ""
+    if start is not None:
+        intervals.append((start, t, kind))
+    cost = (time.perf_counter() - t0) / max(t, 1e-9)
+    return intervals, cost
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Detect emergency sirens in audio (WAV file, synthetic signal or microphone)")
+    p.add_argument("wav", nargs="?", help="PCM WAV file to scan")
+    p.add_argument("--synth", choices=["yelp", "wail", "horn", "noise"], default=None, help="Scan a synthetic signal instead of a file")
+    p.add_argument("--seconds", type=float, default=6.0, help="Length of the --synth signal (default: 6)")
+    p.add_argument("--mic", action="store_true", help="Listen on the default microphone and print confidence live")
+    p.add_argument("--threshold", type=float, default=0.5, help="Confidence that counts as a siren (default: 0.5)")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.mic:
+        stream = AudioStream("mic").start()
+        try:
+            while True:
+                time.sleep(0.25)
+                det = stream.detector
+                print(f"\rsiren {det.confidence:4.2f} {det.kind:<4} {det.mean_hz:6.0f} Hz", end="", flush=True)  # type: ignore[union-attr]
+        except KeyboardInterrupt:
+            stream.stop()
+        return
+    if args.synth:
+        sr = 16000
+        samples = synth_siren(args.synth, args.seconds, sr)
+    elif args.wav:
+        samples, sr = read_wav(args.wav)
+    else:
+        raise SystemExit("Pass a WAV file, --synth KIND or --mic.")
+    intervals, cost = scan(samples, sr, args.threshold)
+    for start, end, kind in intervals:
+        print(f"{start:7.2f}s - {end:7.2f}s  {kind}")
+    if not intervals:
+        print("No siren found.")
+    print(f"{samples.size / sr:.1f} s of audio at {sr} Hz, {cost * 1000:.2f} ms CPU per audio second")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""Asyncio ingestion of roadside distance telemetry.
+
+arduino_code.ino prints one line per reading (``Node 1 Distance: 123.40``) at 9600 baud.
+``TelemetryService`` reads any number of such streams at once (serial ports, TCP
+connections, or sensors connecting to a listening socket), parses whole read chunks with
+one regex pass instead of a readline per reading, keeps only the newest reading per node,
+and applies the pending readings to ``IntersectionState`` in batches.
+
+Sensors that can send binary use a fixed 10-byte frame instead of text:
+``<magic 0xA5, node u16, seq u16, distance f32, checksum u8>`` (little endian, checksum is
+the low byte of the sum of the first 9 bytes). The sequence number lets the service count
+frames lost on the wire.
+
+Per node it reports readings, drops (bad lines / frames, sequence gaps), readings
+superseded before a batch was applied, ingest lag (receive -> applied) and the age of the
+newest reading.
+
+Usage:
+  python telemetry.py serve --source /dev/ttyUSB0 --source tcp://10.0.0.5:9000#3
+  python telemetry.py serve --listen 0.0.0.0:9000 --binary
+  python telemetry.py fake-sensors --connect 127.0.0.1:9000 --nodes 300 --rate 10 --binary
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import struct
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from traffic_model import IntersectionState, apply_distance
+
+LINE_RE = re.compile(rb"Node (\d+) Distance: *(-?\d+(?:\.\d*)?)[ \t]*\r?$", re.MULTILINE)
+FRAME = struct.Struct("<BHHfB")
+FRAME_MAGIC = 0xA5
+READ_SIZE = 1 << 16
+
+
+def encode_frame(node: int, seq: int, distance_cm: float) -> bytes:
+    head = struct.pack("<BHHf", FRAME_MAGIC, node, seq & 0xFFFF, distance_cm)
+    return head + bytes((sum(head) & 0xFF,))
+
+
+@dataclass
+class NodeStats:
+    readings: int = 0
+    dropped: int = 0
+    superseded: int = 0
+    last_seq: int = -1
+    last_recv: float = 0.0
+    lag_max_ms: float = 0.0
+    lag_sum_ms: float = 0.0
+    applied: int = 0
+
+
+class TelemetryService:
+    def __init__(self, states: Optional[Dict[int, IntersectionState]] = None, batch_interval: float = 0.02,
+                 on_batch: Optional[Callable[[List[int]], None]] = None) -> None:
+        """
+        states: node id -> state to update; unknown node ids get a new state ("Node <id>")
+        batch_interval: seconds between applying pending readings to the states
+        on_batch: called with the node ids updated by each batch (e.g. to repaint them)
+        """
+        self.states: Dict[int, IntersectionState] = states if states is not None else {}
+        self.batch_interval = batch_interval
+        self.on_batch = on_batch
+        self.stats: Dict[int, NodeStats] = {}
+        self.stream_errors = 0  # unparseable lines / bad frames not attributable to a node
+        self._pending: Dict[int, Tuple[float, float]] = {}  # node -> (distance, receive time)
+        self._streams: List[asyncio.Task] = []
+
+    # -- parsing -------------------------------------------------------------------------
+    def _node_stats(self, node: int) -> NodeStats:
+        st = self.stats.get(node)
+        if st is None:
+            st = self.stats[node] = NodeStats()
+        return st
+
+    def _accept(self, node: int, distance: float, now: float) -> None:
+        st = self._node_stats(node)
+        st.readings += 1
+        st.last_recv = now
+        if node in self._pending:
+            st.superseded += 1
+        self._pending[node] = (distance, now)
+
+    def feed_text(self, buf: bytes, node_offset: int = 0, now: Optional[float] = None) -> int:
+        """Parse complete lines in buf; returns how many bytes were consumed."""
+        end = buf.rfind(b"\n") + 1
+        if not end:
+            return 0
+        now = time.monotonic() if now is None else now
+        matched = 0
+        for node, dist in LINE_RE.findall(buf, 0, end):
+            self._accept(int(node) + node_offset, float(dist), now)
+            matched += 1
+        # Reading-shaped lines the regex rejected (garbled, "nan", ...); other chatter is ignored
+        self.stream_errors += max(0, buf.count(b"Node ", 0, end) - matched)
+        return end
+
+    def feed_binary(self, buf: bytes, node_offset: int = 0, now: Optional[float] = None) -> int:
+        """Parse complete frames in buf, resyncing on the magic byte; returns bytes consumed."""
+        now = time.monotonic() if now is None else now
+        pos, n, size = 0, len(buf), FRAME.size
+        while n - pos >= size:
+            if buf[pos] != FRAME_MAGIC:
+                nxt = buf.find(FRAME_MAGIC, pos + 1)
+                self.stream_errors += 1
+                pos = n if nxt < 0 else nxt
+                continue
+            magic, node, seq, dist, check = FRAME.unpack_from(buf, pos)
+            if sum(buf[pos:pos + size - 1]) & 0xFF != check:
+                self.stream_errors += 1
+                pos += 1
+                continue
+            node += node_offset
+            st = self._node_stats(node)
+            if st.last_seq >= 0:
+                gap = (seq - st.last_seq - 1) & 0xFFFF
+                if gap < 0x8000:  # ignore duplicates / reordering
+                    st.dropped += gap
+            st.last_seq = seq
+            self._accept(node, dist, now)
+            pos += size
+        return pos
+
+    # -- streams -------------------------------------------------------------------------
+    async def consume(self, reader: asyncio.StreamReader, binary: bool = False, node_offset: int = 0) -> None:
+        feed = self.feed_binary if binary else self.feed_text
+        carry = b""
+        while True:
+            chunk = await reader.read(READ_SIZE)
+            if not chunk:
+                return
+            buf = carry + chunk if carry else chunk
+            used = feed(buf, node_offset)
+            carry = buf[used:]
+            if len(carry) > READ_SIZE:  # no line ending / frame in a whole read: garbage
+                self.stream_errors += 1
+                carry = b""
+
+    async def _serve_stream(self, reader: asyncio.StreamReader, writer: Optional[asyncio.StreamWriter],
+                            binary: bool, node_offset: int) -> None:
+        try:
+            await self.consume(reader, binary, node_offset)
+        except (ConnectionError, OSError):
+            self.stream_errors += 1
+        finally:
+            if writer is not None:
+                writer.close()
+
+    async def add_source(self, spec: str, binary: bool = False) -> None:
+        """Open one source and start consuming it.
+
+        spec: "tcp://host:port", "serial:///dev/ttyUSB0?baud=9600", "COM3", or a device / pty
+        path. A "#N" suffix adds N to every node id from that source, so several Arduinos that
+        all print Node 1..3 map onto distinct intersections.
+        """
+        url = urlsplit(spec if "://" in spec else f"serial://{spec}")
+        offset = int(url.fragment or 0)
+        if url.scheme == "tcp":
+            reader, writer = await asyncio.open_connection(url.hostname, url.port)
+        elif url.scheme == "serial":
+            path = (url.netloc + url.path) or url.path
+            baud = int(parse_qs(url.query).get("baud", ["9600"])[0])
+            reader, writer = await open_serial(path, baud)
+        else:
+            raise ValueError(f"Unsupported telemetry source: {spec!r}")
+        self._streams.append(asyncio.ensure_future(self._serve_stream(reader, writer, binary, offset)))
+
+    async def listen(self, host: str, port: int, binary: bool = False) -> asyncio.AbstractServer:
+        """Accept sensor connections; each connection is one stream."""
+        return await asyncio.start_server(
+            lambda r, w: self._serve_stream(r, w, binary, 0), host, port, limit=READ_SIZE)
+
+    def close(self) -> None:
+        for task in self._streams:
+            task.cancel()
+        self._streams.clear()
+
+    # -- batching --------------------------------------------------------------------------
+    def apply_pending(self, now: Optional[float] = None) -> List[int]:
+        """Apply the newest pending reading of every node; returns the updated node ids."""
+        if not self._pending:
+            return []
+        now = time.monotonic() if now is None else now
+        pending, self._pending = self._pending, {}
+        for node, (dist, recv) in pending.items():
+            st = self.states.get(node)
+            if st is None:
+                st = self.states[node] = IntersectionState(name=f"Node {node}", distance_cm=dist, green_on=False)
+            apply_distance(st, dist)
+            ns = self.stats[node]
+            lag = (now - recv) * 1000.0
+            ns.applied += 1
+            ns.lag_sum_ms += lag
+            ns.lag_max_ms = max(ns.lag_max_ms, lag)
+        nodes = list(pending)
+        if self.on_batch is not None:
+            self.on_batch(nodes)
+        return nodes
+
+    async def run(self, duration: Optional[float] = None) -> None:
+        """Apply batches every batch_interval until cancelled (or for duration seconds)."""
+        t_end = None if duration is None else time.monotonic() + duration
+        while t_end is None or time.monotonic() < t_end:
+            await asyncio.sleep(self.batch_interval)
+            self.apply_pending()
+
+    def report(self, now: Optional[float] = None) -> Dict[int, Dict[str, float]]:
+        now = time.monotonic() if now is None else now
+        return {
+            node: {
+                "readings": s.readings,
+                "dropped": s.dropped,
+                "superseded": s.superseded,
+                "lag_mean_ms": round(s.lag_sum_ms / s.applied, 2) if s.applied else 0.0,
+                "lag_max_ms": round(s.lag_max_ms, 2),
+                "age_s": round(now - s.last_recv, 2) if s.readings else float("inf"),
+            }
+            for node, s in sorted(self.stats.items())
+        }
+
+
+async def open_serial(path: str, baud: int = 9600) -> Tuple[asyncio.StreamReader, Optional[asyncio.StreamWriter]]:
+    """Serial port as an asyncio stream: pyserial-asyncio when installed, else a raw
+    non-blocking read pipe (POSIX ttys and ptys; the baud rate is left as configured)."""
+    try:
+        import serial_asyncio  # type: ignore
+    except ImportError:
+        serial_asyncio = None
+    if serial_asyncio is not None:
+        return await serial_asyncio.open_serial_connection(url=path, baudrate=baud)
+    if os.name == "nt":
+        raise SystemExit("Serial sources on Windows need pyserial-asyncio (pip install pyserial-asyncio)")
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=READ_SIZE)
+    fd = os.open(path, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, "rb", buffering=0))
+    return reader, None
+
+
+def format_report(report: Dict[int, Dict[str, float]], limit: int = 20) -> str:
+    lines = [f"{'node':>6}{'readings':>10}{'dropped':>9}{'superseded':>12}{'lag ms':>9}{'max ms':>9}{'age s':>8}"]
+    worst = sorted(report.items(), key=lambda kv: (-kv[1]["dropped"], -kv[1]["lag_max_ms"]))[:limit]
+    for node, r in sorted(worst):
+        lines.append(f"{node:>6}{r['readings']:>10}{r['dropped']:>9}{r['superseded']:>12}"
+                     f"{r['lag_mean_ms']:>9.2f}{r['lag_max_ms']:>9.2f}{r['age_s']:>8.2f}")
+    return "\n".join(lines)
+
+
+async def fake_sensors(host: str, port: int, nodes: int, rate: float, binary: bool, duration: float,
+                       per_connection: int = 3, loss: float = 0.0, seed: int = 0) -> int:
+    """Stand-in for a fleet of Arduinos: one TCP connection per `per_connection` nodes, each
+    node sending `rate` readings/s of a vehicle approaching and passing. Returns frames sent."""
+    rng = random.Random(seed)
+    sent = 0
+
+    async def sensor_box(first: int, count: int) -> None:
+        nonlocal sent
+        _, writer = await asyncio.open_connection(host, port)
+        dist = [rng.uniform(30.0, 400.0) for _ in range(count)]
+        seq = [0] * count
+        t_end = time.monotonic() + duration
+        while time.monotonic() < t_end:
+            out = []
+            for i in range(count):
+                dist[i] = dist[i] - rng.uniform(1.0, 8.0) if dist[i] > 5.0 else rng.uniform(200.0, 400.0)
+                seq[i] += 1
+                if rng.random() < loss:
+                    continue
+                node = first + i
+                out.append(encode_frame(node, seq[i], dist[i]) if binary else f"Node {node} Distance: {dist[i]:.2f}\r\n".encode())
+            writer.write(b"".join(out))
+            sent += len(out)
+            await writer.drain()
+            await asyncio.sleep(1.0 / rate)
+        writer.close()
+
+    await asyncio.gather(*(sensor_box(first, min(per_connection, nodes - first + 1))
+                           for first in range(1, nodes + 1, per_connection)))
+    return sent
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Roadside distance telemetry ingestion")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    serve = sub.add_parser("serve", help="Ingest telemetry and print per-node lag / drop counters")
+    serve.add_argument("--source", action="append", default=[], help="Stream to read (tcp://host:port, serial path or COM port; '#N' offsets node ids); repeatable")
+    serve.add_argument("--listen", type=str, default=None, help="HOST:PORT to accept sensor connections on")
+    serve.add_argument("--binary", action="store_true", help="Streams use the binary frame format instead of text lines")
+    serve.add_argument("--batch-ms", type=float, default=20.0, help="Batch interval for state updates (default: 20 ms)")
+    serve.add_argument("--report-every", type=float, default=5.0, help="Seconds between reports (default: 5)")
+    serve.add_argument("--duration", type=float, default=None, help="Stop after this many seconds")
+    fake = sub.add_parser("fake-sensors", help="Simulate many sensors sending to a listening service")
+    fake.add_argument("--connect", type=str, default="127.0.0.1:9000", help="HOST:PORT of the service")
+    fake.add_argument("--nodes", type=int, default=300)
+    fake.add_argument("--rate", type=float, default=10.0, help="Readings per node per second (default: 10)")
+    fake.add_argument("--binary", action="store_true")
+    fake.add_argument("--loss", type=float, default=0.0, help="Fraction of readings to drop (exercises drop counters)")
+    fake.add_argument("--duration", type=float, default=30.0)
+    return p.parse_args()
+
+
+def _host_port(spec: str) -> Tuple[str, int]:
+    host, port = spec.rsplit(":", 1)
+    return host, int(port)
+
+
+async def _serve(args) -> None:
+    svc = TelemetryService(batch_interval=args.batch_ms / 1000.0)
+    if args.listen:
+        await svc.listen(*_host_port(args.listen), binary=args.binary)
+    for spec in args.source:
+        await svc.add_source(spec, binary=args.binary)
+    if not args.listen and not args.source:
+        raise SystemExit("Nothing to read; pass --source and/or --listen.")
+    batches = asyncio.ensure_future(svc.run(args.duration))
+    while not batches.done():
+        await asyncio.wait([batches], timeout=args.report_every)
+        green = sum(st.green_on for st in svc.states.values())
+        print(f"{len(svc.stats)} nodes, {green} GREEN, {svc.stream_errors} stream errors")
+        print(format_report(svc.report()), flush=True)
+    svc.close()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.cmd == "serve":
+        asyncio.run(_serve(args))
+        return
+    host, port = _host_port(args.connect)
+    sent = asyncio.run(fake_sensors(host, port, args.nodes, args.rate, args.binary, args.duration, loss=args.loss))
+    print(f"sent {sent:,} readings", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
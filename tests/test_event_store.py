@@ -0,0 +1,27 @@
+import numpy as np
+
+from detections import Detections
+from event_store import SIGNAL_GREEN, SIGNAL_RED, EventStore, EventWriter
+
+
+def _dets(labels):
+    n = len(labels)
+    return Detections(np.zeros((n, 4), np.float32), np.zeros(n, np.int64), np.full(n, 0.9, np.float32), np.array(labels))
+
+
+def test_writers_sharing_a_root_keep_their_classes(tmp_path):
+    a, b = EventWriter(str(tmp_path)), EventWriter(str(tmp_path))
+    a.append_detections(1, _dets(["car", "car"]), ts=1.76e9)
+    b.append_detections(2, _dets(["ambulance"]), ts=1.76e9)
+    a.close()
+    b.close()
+    assert EventStore(str(tmp_path)).summary()["classes"] == {"car": 2, "ambulance": 1}
+
+
+def test_preemptions_pair_green_with_next_red(tmp_path):
+    w = EventWriter(str(tmp_path))
+    w.append_state(3, SIGNAL_GREEN, ts=1.76e9)
+    w.append_state(3, SIGNAL_RED, ts=1.76e9 + 8)
+    w.close()
+    spans = EventStore(str(tmp_path)).preemptions()
+    assert [(s["node"], s["duration_s"]) for s in spans] == [(3, 8.0)]
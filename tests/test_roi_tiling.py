@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+
+from roi_tiling import TiledDetector, Zone, nms
+
+WHOLE_FRAME = [Zone("all", "approach", ((0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0)))]
+
+
+class _Boxes:
+    def __init__(self, xyxy):
+        self.xyxy = xyxy
+        self.cls = np.zeros(len(xyxy))
+        self.conf = np.full(len(xyxy), 0.9, dtype=np.float32)
+
+
+class _Result:
+    def __init__(self, xyxy):
+        self.boxes = _Boxes(xyxy)
+
+
+class BlobModel:
+    """One box per white blob of each crop, like a detector that only sees what the tile shows."""
+
+    names = {0: "car"}
+
+    def __call__(self, crops, verbose=False):
+        out = []
+        for crop in crops:
+            n, _, stats, _ = cv2.connectedComponentsWithStats((crop[:, :, 0] > 128).astype(np.uint8))
+            xyxy = np.array([[x, y, x + w, y + h] for x, y, w, h, _ in stats[1:]], dtype=np.float32).reshape(-1, 4)
+            out.append(_Result(xyxy))
+        return out
+
+
+def test_vehicle_on_tile_corner_is_one_box():
+    # 1152 px with 640 px tiles and 20% overlap: tiles start at 0 and 512, so no tile holds
+    # a 200 px object across the shared corner; four tiles each see a different fragment
+    frame = np.zeros((1152, 1152, 3), dtype=np.uint8)
+    frame[480:680, 380:580] = 255
+    tiler = TiledDetector(BlobModel(), WHOLE_FRAME, tile=640, overlap=0.2)
+    dets = tiler.detect(frame)
+    assert len(dets) == 1
+    np.testing.assert_allclose(dets.xyxy[0], [380, 480, 580, 680])
+
+
+def test_neighbours_across_a_seam_stay_apart():
+    frame = np.zeros((1152, 1152, 3), dtype=np.uint8)
+    frame[500:600, 450:560] = 255
+    frame[500:600, 580:700] = 255
+    dets = TiledDetector(BlobModel(), WHOLE_FRAME, tile=640, overlap=0.2).detect(frame)
+    assert sorted(dets.xyxy[:, 0].tolist()) == [450, 580]
+
+
+def test_same_tile_boxes_are_not_merged():
+    xyxy = np.array([[0, 0, 100, 100], [10, 10, 50, 50]], dtype=np.float32)
+    rects = np.array([[0, 0, 640, 640]], dtype=np.float32)
+    keep, _ = nms(xyxy, np.array([0.5, 0.9]), np.array([0, 0]), tile_ids=np.array([0, 0]), tile_rects=rects)
+    assert sorted(keep.tolist()) == [0, 1]
+    keep, _ = nms(xyxy, np.array([0.5, 0.9]), np.array([0, 0]))
+    assert len(keep) == 2
@@ -0,0 +1,49 @@
+from siren_detector import FusedDecision
+from tracking import FrameVoter
+
+
+def test_confirm_k_of_n_holds_with_silent_siren():
+    decision = FusedDecision(FrameVoter(2, 3), threshold=0.75)
+    decision.on_image(0.9, audio_conf=0.0)
+    assert not decision.active  # one positive image out of the needed two
+    # Polling a silent siren must not promote the single image to GREEN
+    assert not decision.on_audio(0.0)
+    assert not decision.active
+    decision.on_image(0.9, audio_conf=0.0)
+    assert decision.active
+    # ... nor drop the voter-confirmed GREEN on the next poll
+    assert not decision.on_audio(0.0)
+    assert decision.active
+
+
+def test_siren_alone_raises_and_releases_between_images():
+    decision = FusedDecision(FrameVoter(2, 3), threshold=0.75)
+    decision.on_image(0.1, audio_conf=0.0)
+    assert decision.on_audio(0.95) and decision.active
+    assert decision.on_audio(0.0) and not decision.active
+
+
+def test_image_vote_uses_fused_confidence():
+    decision = FusedDecision(FrameVoter(1, 1), threshold=0.75)
+    # Neither sense reaches the threshold alone, together they do
+    decision.on_image(0.5, audio_conf=0.6)
+    assert decision.voted and decision.active
+    decision.clear()
+    assert not decision.active
+
+
+def test_clear_forgets_earlier_votes():
+    decision = FusedDecision(FrameVoter(2, 3), threshold=0.75)
+    decision.on_image(0.9)
+    decision.clear()
+    # The vote for the previous image must not complete k-of-n for the new one
+    decision.on_image(0.9)
+    assert not decision.active
+
+
+def test_siren_alone_is_capped_by_audio_weight():
+    decision = FusedDecision(FrameVoter(1, 1), threshold=0.95)
+    assert not decision.siren_can_trigger
+    decision.on_audio(1.0)
+    assert not decision.active
+    assert FusedDecision(FrameVoter(1, 1), threshold=0.75).siren_can_trigger
@@ -0,0 +1,180 @@
+"""Lightweight SORT-style tracking and temporal emergency confirmation.
+
+``IoUTracker`` keeps track IDs across detector runs with greedy IoU matching and a
+constant-velocity motion model, so the detector can run every Nth frame while boxes are
+extrapolated in between. ``EmergencyConfirmer`` turns per-track evidence into a decision
+that needs k positive observations out of the last n, instead of trusting one frame.
+"""
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from detections import Detections
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes."""
+    if a.size == 0 or b.size == 0:
+        return np.zeros((a.shape[0], b.shape[0]), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0).astype(np.float32)
+
+
+@dataclass
+class Track:
+    track_id: int
+    box: np.ndarray  # xyxy float32
+    cls: int
+    label: str
+    conf: float
+    velocity: np.ndarray = field(default_factory=lambda: np.zeros(4, dtype=np.float32))  # px per frame
+    hits: int = 1
+    misses: int = 0  # detector runs without a match
+    frames_since_update: int = 0
+
+
+class IoUTracker:
+    def __init__(self, iou_threshold: float = 0.3, max_misses: int = 3, smoothing: float = 0.6) -> None:
+        """
+        iou_threshold: minimum IoU between a predicted track and a detection to match them
+        max_misses: detector runs a track may go unmatched before it is dropped
+        smoothing: weight of the new detection when blending it into the track box
+        """
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.smoothing = smoothing
+        self.tracks: List[Track] = []
+        self._next_id = 1
+
+    def predict(self) -> None:
+        """Advance every track one frame along its velocity (used between detector runs)."""
+        for t in self.tracks:
+            t.box = t.box + t.velocity
+            t.frames_since_update += 1
+
+    def update(self, dets: Detections) -> List[Track]:
+        """Match a fresh detector result against the predicted tracks; returns matched/new tracks."""
+        self.predict()
+        boxes = np.array([t.box for t in self.tracks], dtype=np.float32).reshape(-1, 4)
+        iou = iou_matrix(boxes, dets.xyxy)
+        if iou.size:
+            # Never match across classes
+            iou[np.array([t.cls for t in self.tracks])[:, None] != dets.cls[None, :]] = 0.0
+
+        matched_tracks, matched_dets = set(), set()
+        # Greedy assignment by descending IoU; good enough at intersection densities
+        for flat in np.argsort(-iou, axis=None):
+            ti, di = divmod(int(flat), iou.shape[1])
+            if iou[ti, di] < self.iou_threshold:
+                break
+            if ti in matched_tracks or di in matched_dets:
+                continue
+            matched_tracks.add(ti)
+            matched_dets.add(di)
+            t = self.tracks[ti]
+            new_box = dets.xyxy[di]
+            steps = max(1, t.frames_since_update)
+            observed_velocity = (new_box - (t.box - t.velocity * steps)) / steps
+            t.velocity = (self.smoothing * observed_velocity + (1 - self.smoothing) * t.velocity).astype(np.float32)
+            t.box = (self.smoothing * new_box + (1 - self.smoothing) * t.box).astype(np.float32)
+            t.conf = float(dets.conf[di])
+            t.hits += 1
+            t.misses = 0
+            t.frames_since_update = 0
+
+        for ti, t in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                t.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        fresh: List[Track] = [t for t in self.tracks if t.frames_since_update == 0]
+        for di in range(len(dets)):
+            if di in matched_dets:
+                continue
+            t = Track(self._next_id, dets.xyxy[di].astype(np.float32), int(dets.cls[di]), str(dets.labels[di]), float(dets.conf[di]))
+            self._next_id += 1
+            self.tracks.append(t)
+            fresh.append(t)
+        return fresh
+
+    def to_detections(self, max_frames_since_update: Optional[int] = None) -> Detections:
+        """Current track boxes as Detections, in the order of ``tracks`` / ``track_ids``."""
+        tracks = self.tracks
+        if max_frames_since_update is not None:
+            tracks = [t for t in tracks if t.frames_since_update <= max_frames_since_update]
+        if not tracks:
+            return Detections.empty()
+        return Detections(
+            np.array([t.box for t in tracks], dtype=np.float32),
+            np.array([t.cls for t in tracks], dtype=np.int64),
+            np.array([t.conf for t in tracks], dtype=np.float32),
+            np.array([t.label for t in tracks], dtype=str),
+        )
+
+    @property
+    def track_ids(self) -> List[int]:
+        return [t.track_id for t in self.tracks]
+
+
+class EmergencyConfirmer:
+    """Per-track k-of-n vote on 'this is a target class above the confidence threshold'."""
+
+    def __init__(self, target_classes: Iterable[str], conf_threshold: float, k: int = 3, n: int = 5) -> None:
+        self.target_classes = [c.lower() for c in target_classes]
+        self.conf_threshold = conf_threshold
+        self.k = k
+        self.n = n
+        self._votes: Dict[int, Deque[bool]] = {}
+
+    def observe(self, tracker: IoUTracker, updated: List[Track]) -> bool:
+        """Record one detector run; returns True if any live track is confirmed."""
+        seen = set()
+        for t in updated:
+            vote = t.label.lower() in self.target_classes and t.conf >= self.conf_threshold
+            self._votes.setdefault(t.track_id, deque(maxlen=self.n)).append(vote)
+            seen.add(t.track_id)
+        live = set(tracker.track_ids)
+        for tid in list(self._votes):
+            if tid not in live:
+                del self._votes[tid]
+            elif tid not in seen:
+                self._votes[tid].append(False)  # missed this run
+        return self.confirmed()
+
+    def confirmed_ids(self) -> List[int]:
+        return [tid for tid, votes in self._votes.items() if sum(votes) >= self.k]
+
+    def confirmed(self) -> bool:
+        return bool(self.confirmed_ids())
+
+
+class FrameVoter:
+    """k-of-n vote over whole-frame decisions, for callers without per-box tracks."""
+
+    def __init__(self, k: int = 1, n: int = 1) -> None:
+        self.k = k
+        self._votes: Deque[bool] = deque(maxlen=n)
+
+    def observe(self, positive: bool) -> bool:
+        self._votes.append(bool(positive))
+        return sum(self._votes) >= self.k
+
+    def reset(self) -> None:
+        self._votes.clear()
+
+
+def parse_k_of_n(spec: str) -> tuple:
+    """'3/5' -> (3, 5)"""
+    k, n = (int(v) for v in spec.split("/"))
+    if not 1 <= k <= n:
+        raise ValueError(f"Expected k/n with 1 <= k <= n, got {spec!r}")
+    return k, n
@@ -0,0 +1,46 @@
+"""Intersection state and the distance-threshold signal rule shared by the dashboard,
+the simulator and the telemetry service."""
+from dataclasses import dataclass
+
+# Same thresholds as arduino_code.ino: GREEN once the vehicle is closer than 20 cm,
+# back to RED once it has passed the stop line (<= 10 cm)
+GREEN_DISTANCE_CM = 20.0
+CLEAR_DISTANCE_CM = 10.0
+
+
+@dataclass
+class IntersectionState:
+    name: str
+    distance_cm: float
+    green_on: bool
+    # Once vehicle has passed (<10cm), mark cleared to prevent re-green flicker
+    cleared: bool = False
+
+
+def should_go_green(st: IntersectionState) -> bool:
+    return st.distance_cm < GREEN_DISTANCE_CM and not st.green_on and not st.cleared
+
+
+def should_clear(st: IntersectionState) -> bool:
+    return st.distance_cm <= CLEAR_DISTANCE_CM and st.green_on and not st.cleared
+
+
+def approach_step(distance_cm: float) -> float:
+    """Per-tick movement used by the dashboard: faster when far, slower when near."""
+    return 8.0 if distance_cm > 80 else 4.0 if distance_cm > 40 else 2.0
+
+
+def apply_distance(st: IntersectionState, distance_cm: float) -> bool:
+    """Apply one sensor reading to st with the same rule as the dashboard; returns True if
+    the signal changed. A reading back above the GREEN threshold after a pass starts a new
+    cycle, so the next vehicle can preempt the node again."""
+    st.distance_cm = distance_cm
+    if should_go_green(st):
+        st.green_on = True
+        return True
+    if should_clear(st):
+        st.green_on, st.cleared = False, True
+        return True
+    if st.cleared and distance_cm >= GREEN_DISTANCE_CM:
+        st.cleared = False
+    return False